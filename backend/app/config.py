@@ -24,19 +24,120 @@ def _get_secret(env_name: str, secret_name: str, default: str = "") -> str:
     return default
 
 
+def _get_map(env_name: str, default: str) -> dict[str, str]:
+    """Lee una env var con formato "clave=valor,clave=valor" como dict."""
+    pairs = (item.split("=", 1) for item in os.getenv(env_name, default).split(",") if "=" in item)
+    return {k.strip(): v.strip() for k, v in pairs}
+
+
 class Settings:
     # Glide API
     GLIDE_APP_ID: str = _get_secret("GLIDE_APP_ID", "glide_app_id")
     GLIDE_API_TOKEN: str = _get_secret("GLIDE_API_TOKEN", "glide_api_token")
+    GLIDE_MAX_CONNECTIONS: int = int(os.getenv("GLIDE_MAX_CONNECTIONS", "10"))
+    GLIDE_TIMEOUT_SECONDS: float = float(os.getenv("GLIDE_TIMEOUT_SECONDS", "30"))
+    GLIDE_HTTP2: bool = os.getenv("GLIDE_HTTP2", "true").lower() in ("1", "true", "yes")
+    # Snapshots en memoria de las tablas de tanques y documentos (0 = consultar Glide
+    # en cada lectura).
+    # POR QUÉ 60s: los usuarios tambien editan tanques desde la app de Glide; las
+    # escrituras de esta API se ven al instante (write-through), las externas tras el TTL.
+    GLIDE_TABLE_CACHE_TTL_SECONDS: float = float(os.getenv("GLIDE_TABLE_CACHE_TTL_SECONDS", "60"))
+    # Ventana en la que se juntan mutaciones concurrentes antes de enviarlas en un
+    # solo mutateTables (0 = enviar lo que ya este encolado, sin esperar).
+    GLIDE_MUTATION_LINGER_MS: float = float(os.getenv("GLIDE_MUTATION_LINGER_MS", "20"))
+    # Mirror SQLite de tanques y documentos, sincronizado en background cada
+    # GLIDE_MIRROR_SYNC_SECONDS (0 = desactivado; las lecturas van a Glide).
+    GLIDE_MIRROR_PATH: str = os.getenv("GLIDE_MIRROR_PATH", "/app/data/glide_mirror.sqlite3")
+    GLIDE_MIRROR_SYNC_SECONDS: float = float(os.getenv("GLIDE_MIRROR_SYNC_SECONDS", "0"))
+    # Antiguedad maxima del ultimo sync exitoso para leer del mirror; pasado ese
+    # limite se vuelve a leer de Glide (TTL) hasta que un sync funcione.
+    GLIDE_MIRROR_MAX_STALENESS_SECONDS: float = float(os.getenv("GLIDE_MIRROR_MAX_STALENESS_SECONDS", "600"))
 
     # OpenAI
     OPENAI_API_KEY: str = _get_secret("OPENAI_API_KEY", "openai_api_key")
     OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-5-mini")
     OPENAI_MAX_TOKENS: int = int(os.getenv("OPENAI_MAX_TOKENS", "16000"))
+    # POR QUÉ: Presupuesto por u1a_method (direct = TYPE_1). Un U-1A de 2 paginas
+    # necesita mucho menos razonamiento que un brute force de 12+ paginas escaneadas.
+    # OPENAI_MAX_TOKENS es el techo global; sin entrada para un metodo se usa el techo.
+    OPENAI_MAX_TOKENS_BY_METHOD: dict[str, str] = _get_map(
+        "OPENAI_MAX_TOKENS_BY_METHOD",
+        "direct=8000,text=12000,scanned=16000,brute_force=16000,retry_brute_force=16000",
+    )
+    # low | medium | high por u1a_method. Vacio = default del modelo
+    OPENAI_REASONING_BY_METHOD: dict[str, str] = _get_map("OPENAI_REASONING_BY_METHOD", "direct=low")
+    # Auto-ajuste de max tokens segun uso observado en el backlog
+    OPENAI_BUDGET_AUTOTUNE: bool = os.getenv("OPENAI_BUDGET_AUTOTUNE", "true").lower() in ("1", "true", "yes")
+    OPENAI_BUDGET_MIN_TOKENS: int = int(os.getenv("OPENAI_BUDGET_MIN_TOKENS", "4000"))
+    # json_schema (structured outputs estricto) | json_object | text (solo prompt)
+    OPENAI_RESPONSE_FORMAT: str = os.getenv("OPENAI_RESPONSE_FORMAT", "json_schema")
+    # Streaming: corta la llamada si la salida excede este largo o se degenera
+    OPENAI_STREAM: bool = os.getenv("OPENAI_STREAM", "true").lower() in ("1", "true", "yes")
+    OPENAI_STREAM_MAX_CHARS: int = int(os.getenv("OPENAI_STREAM_MAX_CHARS", "6000"))
+    # Cliente compartido: 0 conexiones = 2x MAX_CONCURRENT_EXTRACTIONS
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "0"))
+    OPENAI_KEEPALIVE_SECONDS: float = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "60"))
+    OPENAI_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "10"))
+    # POR QUE: 300s cubre extracciones con reasoning largo (16000 tokens) sin
+    # dejar colgado un slot del batch los 600s del default del SDK.
+    OPENAI_TIMEOUT_SECONDS: float = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "300"))
+    OPENAI_HTTP2: bool = os.getenv("OPENAI_HTTP2", "true").lower() in ("1", "true", "yes")
+    # Reintentos propios (rate_limiter.py) ante 429, 5xx y errores de conexion;
+    # el backoff respeta retry-after / x-ratelimit-reset-* hasta este maximo por espera
+    OPENAI_MAX_RETRIES: int = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+    OPENAI_RETRY_MAX_SECONDS: float = float(os.getenv("OPENAI_RETRY_MAX_SECONDS", "60"))
+    # Deadline por llamada (incluye espera de rate limit, reintentos y hedge). 0 = sin deadline
+    OPENAI_DEADLINE_SECONDS: float = float(os.getenv("OPENAI_DEADLINE_SECONDS", "240"))
+    OPENAI_DETECT_DEADLINE_SECONDS: float = float(os.getenv("OPENAI_DETECT_DEADLINE_SECONDS", "30"))
+    # POR QUÉ: Hedge = segunda llamada identica si la primera supera el percentil
+    # de duracion observado en el backlog; se usa la primera respuesta valida.
+    # Recorta la cola de latencia a cambio de tokens duplicados (medidos en el backlog).
+    OPENAI_HEDGE: bool = os.getenv("OPENAI_HEDGE", "false").lower() in ("1", "true", "yes")
+    OPENAI_HEDGE_PERCENTILE: float = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "95"))
+    OPENAI_HEDGE_MIN_SECONDS: float = float(os.getenv("OPENAI_HEDGE_MIN_SECONDS", "15"))
+    # Precios USD por millon de tokens para estimar costo (default: gpt-5-mini)
+    OPENAI_PRICE_INPUT_PER_MTOK: float = float(os.getenv("OPENAI_PRICE_INPUT_PER_MTOK", "0.25"))
+    OPENAI_PRICE_CACHED_INPUT_PER_MTOK: float = float(os.getenv("OPENAI_PRICE_CACHED_INPUT_PER_MTOK", "0.025"))
+    OPENAI_PRICE_OUTPUT_PER_MTOK: float = float(os.getenv("OPENAI_PRICE_OUTPUT_PER_MTOK", "2.00"))
+    # Costo de imagen en detail=high: base + tile * (tiles de 512px). Depende del modelo.
+    OPENAI_IMAGE_BASE_TOKENS: int = int(os.getenv("OPENAI_IMAGE_BASE_TOKENS", "85"))
+    OPENAI_IMAGE_TILE_TOKENS: int = int(os.getenv("OPENAI_IMAGE_TILE_TOKENS", "170"))
 
     # PDF processing
     PDF_DPI: int = int(os.getenv("PDF_DPI", "200"))
     MAX_PDF_SIZE_MB: int = int(os.getenv("MAX_PDF_SIZE_MB", "50"))
+    # Descargas por URL: cliente compartido, streaming a archivo temporal ("" = tmp del sistema)
+    DOWNLOAD_TIMEOUT_SECONDS: float = float(os.getenv("DOWNLOAD_TIMEOUT_SECONDS", "60"))
+    DOWNLOAD_MAX_CONNECTIONS: int = int(os.getenv("DOWNLOAD_MAX_CONNECTIONS", "10"))
+    DOWNLOAD_TMP_DIR: str = os.getenv("DOWNLOAD_TMP_DIR", "")
+    # POR QUÉ: "pdfium" lee el text page nativo (C++), mucho mas rapido que el
+    # layout analysis en Python de pdfplumber. "pdfplumber" queda como fallback.
+    PDF_TEXT_BACKEND: str = os.getenv("PDF_TEXT_BACKEND", "pdfium")
+    # POR QUÉ: OpenAI vision reduce cada imagen a ~768px de lado corto y cobra por
+    # tiles de 512px. Con true, cada pagina se renderiza a esa resolucion efectiva
+    # (PDF_DPI pasa a ser el maximo) en vez de renderizar 200 DPI que se descartan.
+    PDF_ADAPTIVE_DPI: bool = os.getenv("PDF_ADAPTIVE_DPI", "true").lower() in ("1", "true", "yes")
+    # POR QUÉ: Render y lectura de texto son CPU-bound y bloquean el event loop.
+    # Se ejecutan en un pool de procesos (0 = inline en el loop, comportamiento anterior).
+    PDF_WORKER_PROCESSES: int = int(
+        os.getenv("PDF_WORKER_PROCESSES", str(min(os.cpu_count() or 1, 4)))
+    )
+    # Maximo de workers que un mismo request usa en paralelo para renderizar sus paginas
+    # (brute force = 12+ paginas). Limita que un PDF grande acapare todo el pool.
+    PDF_RENDER_MAX_PARALLEL: int = int(os.getenv("PDF_RENDER_MAX_PARALLEL", "4"))
+    # Encoding de imagenes enviadas al LLM.
+    # FORMAT: png (lossless) | jpeg | webp. COLOR: rgb | gray | bitonal.
+    # QUALITY aplica a jpeg/webp; PNG_COMPRESS_LEVEL (0-9) a png: 1 codifica mucho
+    # mas rapido que el default 6 con archivos apenas mas grandes.
+    PDF_IMAGE_FORMAT: str = os.getenv("PDF_IMAGE_FORMAT", "png").lower()
+    PDF_IMAGE_COLOR: str = os.getenv("PDF_IMAGE_COLOR", "rgb").lower()
+    PDF_IMAGE_QUALITY: int = int(os.getenv("PDF_IMAGE_QUALITY", "85"))
+    PDF_PNG_COMPRESS_LEVEL: int = int(os.getenv("PDF_PNG_COMPRESS_LEVEL", "6"))
+    # Tipos de PDF (ej: "TYPE_2" o "TYPE_1,TYPE_2") cuyas paginas se recortan a su
+    # contenido antes de renderizar. Vacio = sin recorte (comparar via backlog).
+    PDF_ROI_CROP_TYPES: list[str] = [
+        t.strip() for t in os.getenv("PDF_ROI_CROP_TYPES", "").split(",") if t.strip()
+    ]
 
     # Batch processing
     # POR QUÉ: 5 concurrentes es el balance entre velocidad y no saturar OpenAI/memoria.
@@ -52,6 +153,14 @@ class Settings:
     BACKLOG_PATH: str = os.getenv("BACKLOG_PATH", "/app/data/extraction_backlog.jsonl")
     BACKLOG_MAX_ENTRIES: int = int(os.getenv("BACKLOG_MAX_ENTRIES", "1000"))
 
+    # Cache de imagenes de pagina (en el volumen /app/data, sobrevive reinicios). 0 = desactivado
+    PAGE_CACHE_DIR: str = os.getenv("PAGE_CACHE_DIR", "/app/data/page_cache")
+    PAGE_CACHE_MAX_MB: int = int(os.getenv("PAGE_CACHE_MAX_MB", "500"))
+
+    # Cache de resultados de extraccion (PDF + prompts + modelo). 0 = desactivado
+    RESULT_CACHE_DIR: str = os.getenv("RESULT_CACHE_DIR", "/app/data/result_cache")
+    RESULT_CACHE_TTL_HOURS: int = int(os.getenv("RESULT_CACHE_TTL_HOURS", "720"))
+
     # App
     APP_TITLE: str = "ASME Pressure Vessel Extractor"
     APP_VERSION: str = "2.1.0"
@@ -1,9 +1,13 @@
 """
 Logging estructurado de extracciones para analisis y auto-mejora.
 - Finalidad: Registra cada extraccion en un archivo JSONL con metadata del proceso
-  (tipo PDF, metodo U-1A, paginas enviadas, campos extraidos/null, retry, tiempo).
+  (tipo PDF, metodo U-1A, paginas enviadas, campos extraidos/null, retry, tiempo,
+  cache hit de resultados, encoding de imagen, bytes y tiles de 512px por pagina,
+  tokens de imagen estimados, llamadas al LLM con ttft/duracion/finish_reason,
+  tokens y costo estimado, deadline y hedge). El resumen agrega tokens y costo por
+  pdf_type y u1a_method, y cuantos hedges se lanzaron y cuantos tokens desperdiciaron.
   Permite analizar patrones de fallo y mejorar el pipeline iterativamente.
-- Consume: config.py (BACKLOG_PATH, BACKLOG_MAX_ENTRIES)
+- Consume: config.py (BACKLOG_PATH, BACKLOG_MAX_ENTRIES), llm_costs.py (add_usage)
 - Consumido por: service.py (log_extraction al final de extract_from_pdf),
   router.py (get_backlog, get_backlog_summary)
 """
@@ -14,6 +18,7 @@ from datetime import datetime, timezone
 from pathlib import Path
 
 from app.config import get_settings
+from app.features.extraction.llm_costs import add_usage, empty_usage
 
 logger = logging.getLogger(__name__)
 
@@ -88,20 +93,41 @@ def read_backlog(limit: int = 50, category: str | None = None) -> list[dict]:
 
 
 def get_backlog_summary() -> dict:
-    """Genera estadisticas del backlog: totales, por categoria, campos mas fallidos."""
+    """Genera estadisticas del backlog: totales, por categoria, campos mas fallidos,
+    cache hits, bytes promedio por pagina segun encoding de imagen, tiempos del LLM y
+    tokens/costo por pdf_type y u1a_method."""
+    empty = {
+        "total": 0, "cache_hits": 0, "by_category": {}, "top_null_fields": [],
+        "by_method": {}, "by_image_encoding": {}, "llm": {}, "cost": {},
+    }
     if not BACKLOG_PATH.exists():
-        return {"total": 0, "by_category": {}, "top_null_fields": [], "by_method": {}}
+        return empty
 
     try:
         lines = BACKLOG_PATH.read_text(encoding="utf-8").splitlines()
     except Exception as e:
         logger.warning("No se pudo leer el backlog: %s", e)
-        return {"total": 0, "by_category": {}, "top_null_fields": [], "by_method": {}}
+        return empty
 
     total = 0
+    cache_hits = 0
     by_category: dict[str, int] = {}
     by_method: dict[str, int] = {}
     null_field_counts: dict[str, int] = {}
+    # encoding → [paginas, bytes, tiles]
+    image_stats: dict[str, list[int]] = {}
+    llm_calls = 0
+    llm_ttfts: list[float] = []
+    llm_totals: list[float] = []
+    llm_aborted = 0
+    llm_deadline_exceeded = 0
+    # hedges lanzados, ganados por la copia, tokens de la copia perdedora
+    hedges = {"fired": 0, "won_by_hedge": 0, "wasted_tokens_estimate": 0}
+    finish_reasons: dict[str, int] = {}
+    cost_total = empty_usage()
+    # pdf_type / u1a_method → [extracciones, usage acumulado]
+    cost_by_type: dict[str, list] = {}
+    cost_by_method: dict[str, list] = {}
 
     for line in lines:
         if not line.strip():
@@ -121,11 +147,84 @@ def get_backlog_summary() -> dict:
         for field in entry.get("fields_null", []):
             null_field_counts[field] = null_field_counts.get(field, 0) + 1
 
+        # POR QUE: Un cache hit no envio imagenes; contarlo inflaria las
+        # estadisticas de encoding con paginas repetidas.
+        if entry.get("cache_hit"):
+            cache_hits += 1
+            continue
+
+        for call in entry.get("llm_calls", []):
+            llm_calls += 1
+            if call.get("ttft_seconds") is not None:
+                llm_ttfts.append(call["ttft_seconds"])
+            if call.get("total_seconds") is not None:
+                llm_totals.append(call["total_seconds"])
+            if call.get("aborted"):
+                llm_aborted += 1
+            if call.get("deadline_exceeded"):
+                llm_deadline_exceeded += 1
+            if call.get("hedge"):
+                hedges["fired"] += 1
+                hedges["won_by_hedge"] += call["hedge"].get("winner") == "hedge"
+                hedges["wasted_tokens_estimate"] += call["hedge"].get("wasted_tokens_estimate") or 0
+            reason = call.get("finish_reason") or ("aborted" if call.get("aborted") else "unknown")
+            finish_reasons[reason] = finish_reasons.get(reason, 0) + 1
+
+        calls = entry.get("llm_calls", [])
+        add_usage(cost_total, calls)
+        for groups, key in ((cost_by_type, entry.get("pdf_type") or "unknown"), (cost_by_method, method)):
+            group = groups.setdefault(key, [0, empty_usage()])
+            group[0] += 1
+            add_usage(group[1], calls)
+
+        image_bytes = entry.get("image_bytes")
+        if image_bytes:
+            stats = image_stats.setdefault(entry.get("image_encoding", "unknown"), [0, 0, 0])
+            stats[0] += len(image_bytes)
+            stats[1] += sum(image_bytes)
+            stats[2] += sum(entry.get("image_tiles", []))
+
     top_null = sorted(null_field_counts.items(), key=lambda x: x[1], reverse=True)[:10]
 
     return {
         "total": total,
+        "cache_hits": cache_hits,
         "by_category": by_category,
         "top_null_fields": [{"field": f, "count": c} for f, c in top_null],
         "by_method": by_method,
+        "by_image_encoding": {
+            enc: {
+                "pages": pages,
+                "avg_bytes_per_page": round(total_bytes / pages),
+                "avg_tiles_per_page": round(total_tiles / pages, 2),
+            }
+            for enc, (pages, total_bytes, total_tiles) in image_stats.items()
+        },
+        "llm": {
+            "calls": llm_calls,
+            "aborted": llm_aborted,
+            "deadline_exceeded": llm_deadline_exceeded,
+            "hedges": hedges,
+            "avg_ttft_seconds": round(sum(llm_ttfts) / len(llm_ttfts), 2) if llm_ttfts else None,
+            "avg_total_seconds": round(sum(llm_totals) / len(llm_totals), 2) if llm_totals else None,
+            "by_finish_reason": finish_reasons,
+        },
+        "cost": {
+            "total": cost_total,
+            "by_pdf_type": _cost_groups(cost_by_type),
+            "by_method": _cost_groups(cost_by_method),
+        },
+    }
+
+
+def _cost_groups(groups: dict[str, list]) -> dict[str, dict]:
+    """Usage acumulado por grupo con promedios por extraccion (sin cache hits)."""
+    return {
+        key: {
+            "extractions": n,
+            **usage,
+            "avg_tokens_per_extraction": round((usage["prompt_tokens"] + usage["completion_tokens"]) / n),
+            "avg_cost_usd_per_extraction": round(usage["cost_usd"] / n, 6),
+        }
+        for key, (n, usage) in groups.items()
     }
@@ -0,0 +1,189 @@
+"""
+Presupuesto de tokens, esfuerzo de razonamiento y latencia por tipo de documento.
+- Finalidad: Decide max_completion_tokens y reasoning_effort de cada llamada de
+  extraccion segun u1a_method (direct = TYPE_1, text, scanned, brute_force,
+  retry_brute_force). Parte de los valores de config y, con suficientes muestras
+  en el backlog, ajusta max tokens al p95 de completion_tokens observado con margen.
+  Si alguna de sus ultimas TUNE_TRUNCATION_WINDOW llamadas se corto por limite
+  (finish_reason=length), vuelve al techo global OPENAI_MAX_TOKENS.
+  Con los mismos datos calcula el percentil OPENAI_HEDGE_PERCENTILE de duracion
+  por metodo (y para la deteccion por vision): pasado ese tiempo llm_extractor
+  lanza una llamada duplicada (hedge). El backlog se lee en un thread
+  (asyncio.to_thread) para no bloquear el event loop.
+- Consume: config.py (OPENAI_MAX_TOKENS, OPENAI_MAX_TOKENS_BY_METHOD,
+  OPENAI_REASONING_BY_METHOD, OPENAI_BUDGET_*, OPENAI_HEDGE_*), backlog.py (read_backlog)
+- Consumido por: service.py (get_budget), llm_extractor.py (hedge_delay),
+  router.py (/llm/budgets)
+"""
+
+import asyncio
+import logging
+import math
+import time
+
+from app.config import get_settings
+from app.features.extraction.backlog import BACKLOG_MAX_ENTRIES, read_backlog
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# POR QUE: 20 muestras evitan ajustar por 2-3 documentos atipicos; 1.5x sobre el
+# p95 deja margen para el razonamiento variable de escaneados dificiles.
+TUNE_MIN_SAMPLES = 20
+TUNE_HEADROOM = 1.5
+TUNE_ROUND_TO = 500
+TUNE_REFRESH_SECONDS = 600
+# POR QUE: un truncado viejo no debe fijar el techo hasta que rote del backlog;
+# solo cuentan las ultimas llamadas de cada metodo.
+TUNE_TRUNCATION_WINDOW = 20
+
+_tuned: dict[str, dict] = {}
+# clave (budget_key o stage) → duracion en el percentil de hedge y muestras
+_latency: dict[str, dict] = {}
+_tuned_at = 0.0
+
+
+def _configured_tokens(key: str) -> int:
+    value = settings.OPENAI_MAX_TOKENS_BY_METHOD.get(key)
+    try:
+        return min(int(value), settings.OPENAI_MAX_TOKENS) if value else settings.OPENAI_MAX_TOKENS
+    except ValueError:
+        logger.warning("OPENAI_MAX_TOKENS_BY_METHOD invalido para %s: %r", key, value)
+        return settings.OPENAI_MAX_TOKENS
+
+
+def _percentile(values: list, pct: float):
+    """Percentil por rango mas cercano de una lista ya ordenada."""
+    return values[max(math.ceil(len(values) * pct / 100) - 1, 0)]
+
+
+def _tune_from_backlog() -> tuple[dict[str, dict], dict[str, dict]]:
+    """Calcula max tokens y latencia de hedge por metodo desde las llamadas del backlog."""
+    samples: dict[str, list[int]] = {}
+    truncated: dict[str, int] = {}
+    seen: dict[str, int] = {}
+    durations: dict[str, list[float]] = {}
+    # read_backlog retorna la entrada mas reciente primero; las llamadas se
+    # recorren tambien de la ultima a la primera.
+    for entry in read_backlog(limit=BACKLOG_MAX_ENTRIES):
+        for call in reversed(entry.get("llm_calls", [])):
+            # POR QUE: Solo llamadas completas; una abortada o cortada por deadline
+            # mide el corte, no la latencia real del modelo.
+            if call.get("total_seconds") and not call.get("aborted") and not call.get("deadline_exceeded"):
+                durations.setdefault(call.get("budget_key") or call.get("stage"), []).append(call["total_seconds"])
+            key = call.get("budget_key")
+            if not key:
+                continue
+            seen[key] = seen.get(key, 0) + 1
+            if call.get("finish_reason") == "length":
+                if seen[key] <= TUNE_TRUNCATION_WINDOW:
+                    truncated[key] = truncated.get(key, 0) + 1
+                continue
+            tokens = (call.get("usage") or {}).get("completion_tokens")
+            if tokens:
+                samples.setdefault(key, []).append(tokens)
+
+    tuned = {}
+    for key in set(samples) | set(truncated):
+        values = sorted(samples.get(key, []))
+        p95 = _percentile(values, 95) if values else None
+        if truncated.get(key):
+            tokens = settings.OPENAI_MAX_TOKENS
+        elif len(values) >= TUNE_MIN_SAMPLES:
+            tokens = math.ceil(p95 * TUNE_HEADROOM / TUNE_ROUND_TO) * TUNE_ROUND_TO
+            tokens = max(settings.OPENAI_BUDGET_MIN_TOKENS, min(tokens, settings.OPENAI_MAX_TOKENS))
+        else:
+            continue
+        tuned[key] = {
+            "max_completion_tokens": tokens,
+            "samples": len(values),
+            "truncated": truncated.get(key, 0),
+            "p95_completion_tokens": p95,
+        }
+
+    latency = {}
+    for key, values in durations.items():
+        if len(values) < TUNE_MIN_SAMPLES:
+            continue
+        values.sort()
+        latency[key] = {
+            "samples": len(values),
+            "p50_seconds": _percentile(values, 50),
+            "hedge_after_seconds": max(
+                _percentile(values, settings.OPENAI_HEDGE_PERCENTILE), settings.OPENAI_HEDGE_MIN_SECONDS,
+            ),
+        }
+    return tuned, latency
+
+
+async def _refresh_tuning() -> None:
+    """Recalcula el ajuste como mucho cada TUNE_REFRESH_SECONDS (lectura del backlog en un thread)."""
+    global _tuned, _latency, _tuned_at
+    now = time.monotonic()
+    if _tuned_at and now - _tuned_at < TUNE_REFRESH_SECONDS:
+        return
+    # Marcado antes de esperar: los requests concurrentes siguen con el ajuste anterior
+    _tuned_at = now
+    try:
+        tuned, latency = await asyncio.to_thread(_tune_from_backlog)
+    except Exception as e:
+        logger.warning("No se pudo ajustar presupuestos desde el backlog: %s", e)
+        return
+    for key, t in tuned.items():
+        if _tuned.get(key, {}).get("max_completion_tokens") != t["max_completion_tokens"]:
+            logger.info(
+                "Presupuesto %s ajustado: %d tokens (p95=%s, %d muestras, %d truncadas)",
+                key, t["max_completion_tokens"], t["p95_completion_tokens"], t["samples"], t["truncated"],
+            )
+    _tuned = tuned
+    _latency = latency
+
+
+async def get_budget(u1a_method: str) -> dict:
+    """Presupuesto para una llamada de extraccion.
+
+    Returns:
+        Dict con budget_key, max_completion_tokens, reasoning_effort (None = default
+        del modelo) y source ("config" o "tuned").
+    """
+    if settings.OPENAI_BUDGET_AUTOTUNE:
+        await _refresh_tuning()
+
+    tuned = _tuned.get(u1a_method) if settings.OPENAI_BUDGET_AUTOTUNE else None
+    return {
+        "budget_key": u1a_method,
+        "max_completion_tokens": tuned["max_completion_tokens"] if tuned else _configured_tokens(u1a_method),
+        "reasoning_effort": settings.OPENAI_REASONING_BY_METHOD.get(u1a_method) or None,
+        "source": "tuned" if tuned else "config",
+    }
+
+
+async def hedge_delay(key: str | None) -> float | None:
+    """Segundos tras los cuales duplicar una llamada lenta de este metodo/stage.
+
+    None = sin hedge (OPENAI_HEDGE apagado o menos de TUNE_MIN_SAMPLES duraciones).
+    """
+    if not settings.OPENAI_HEDGE or not key:
+        return None
+    await _refresh_tuning()
+    latency = _latency.get(key)
+    return latency["hedge_after_seconds"] if latency else None
+
+
+async def budget_overview() -> dict:
+    """Presupuesto vigente por metodo (config + ajuste) para /llm/budgets."""
+    if settings.OPENAI_BUDGET_AUTOTUNE or settings.OPENAI_HEDGE:
+        await _refresh_tuning()
+    keys = set(settings.OPENAI_MAX_TOKENS_BY_METHOD) | set(settings.OPENAI_REASONING_BY_METHOD) | set(_tuned)
+    return {
+        "autotune": settings.OPENAI_BUDGET_AUTOTUNE,
+        "ceiling": settings.OPENAI_MAX_TOKENS,
+        "budgets": {
+            key: {**await get_budget(key), "configured_max_tokens": _configured_tokens(key), "tuning": _tuned.get(key)}
+            for key in sorted(keys)
+        },
+        "deadline_seconds": settings.OPENAI_DEADLINE_SECONDS,
+        "detect_deadline_seconds": settings.OPENAI_DETECT_DEADLINE_SECONDS,
+        "hedge": settings.OPENAI_HEDGE,
+        "latency": _latency,
+    }
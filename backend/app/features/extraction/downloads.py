@@ -0,0 +1,175 @@
+"""
+Entrada de PDFs a archivo temporal: descargas desde URL (Glide) y uploads.
+- Finalidad: Un solo httpx.AsyncClient (keep-alive) para todas las descargas de
+  /extract-url y /batch/extract. Lee el body en streaming a un archivo temporal:
+  corta apenas Content-Length o los bytes leidos superan MAX_PDF_SIZE_MB, sin
+  tener el PDF completo en memoria. Los uploads de /extract se copian igual a un
+  archivo temporal. El pipeline abre el PDF por ruta (PdfDocumentSession).
+  Metricas de tiempo y bytes por descarga.
+- Consume: config.py (MAX_PDF_SIZE_MB, DOWNLOAD_TIMEOUT_SECONDS,
+  DOWNLOAD_MAX_CONNECTIONS, DOWNLOAD_TMP_DIR)
+- Consumido por: main.py (start/close en lifespan),
+  router.py (download_pdf, spool_upload, download_stats)
+"""
+
+import logging
+import tempfile
+import time
+from typing import IO
+
+import httpx
+from fastapi import UploadFile
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+_client: httpx.AsyncClient | None = None
+_stats = {
+    "downloads": 0, "bytes": 0, "seconds": 0.0, "max_seconds": 0.0,
+    "rejected_too_large": 0, "errors": 0,
+}
+
+
+class PDFTooLargeError(Exception):
+    """El PDF descargado excede MAX_PDF_SIZE_MB."""
+
+
+def start_download_client() -> None:
+    """Crea el cliente HTTP compartido para descargas (idempotente)."""
+    global _client
+    if _client is not None:
+        return
+    _client = httpx.AsyncClient(
+        timeout=settings.DOWNLOAD_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_connections=settings.DOWNLOAD_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.DOWNLOAD_MAX_CONNECTIONS,
+        ),
+    )
+
+
+async def close_download_client() -> None:
+    """Cierra el cliente compartido y sus conexiones."""
+    global _client
+    if _client is None:
+        return
+    await _client.aclose()
+    _client = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    if _client is None:
+        start_download_client()
+    return _client
+
+
+def _spool_file() -> IO[bytes]:
+    """Archivo temporal para un PDF entrante; se borra al cerrarlo."""
+    return tempfile.NamedTemporaryFile(
+        prefix="asme-", suffix=".pdf", dir=settings.DOWNLOAD_TMP_DIR or None,
+    )
+
+
+async def download_pdf(url: str) -> IO[bytes]:
+    """Descarga un PDF en streaming a un archivo temporal.
+
+    Uso: ``with await download_pdf(url) as pdf_file: ...`` — pdf_file.name es la
+    ruta para PdfDocumentSession; el archivo se borra al cerrarlo.
+
+    Raises:
+        PDFTooLargeError si Content-Length o los bytes leidos superan MAX_PDF_SIZE_MB.
+        httpx.TimeoutException, httpx.HTTPStatusError, httpx.RequestError.
+    """
+    max_size = settings.MAX_PDF_SIZE_MB * 1024 * 1024
+    start = time.perf_counter()
+    size = 0
+    tmp = _spool_file()
+
+    try:
+        async with _get_client().stream("GET", url) as response:
+            response.raise_for_status()
+
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > max_size:
+                raise PDFTooLargeError(
+                    f"Content-Length {declared} excede {settings.MAX_PDF_SIZE_MB}MB"
+                )
+
+            async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                # POR QUE: Content-Length puede faltar o mentir; el corte
+                # real es por bytes leidos, antes de escribir el chunk.
+                if size > max_size:
+                    raise PDFTooLargeError(f"Descarga supera {settings.MAX_PDF_SIZE_MB}MB")
+                tmp.write(chunk)
+        tmp.flush()
+    except PDFTooLargeError:
+        tmp.close()
+        _stats["rejected_too_large"] += 1
+        raise
+    except httpx.HTTPError:
+        tmp.close()
+        _stats["errors"] += 1
+        raise
+    except BaseException:
+        tmp.close()
+        raise
+
+    elapsed = time.perf_counter() - start
+    _stats["downloads"] += 1
+    _stats["bytes"] += size
+    _stats["seconds"] += elapsed
+    _stats["max_seconds"] = max(_stats["max_seconds"], elapsed)
+    logger.info(
+        "PDF descargado: %d bytes en %.2fs (%.1f MB/s)",
+        size, elapsed, size / 1024 / 1024 / elapsed if elapsed else 0.0,
+    )
+    tmp.seek(0)
+    return tmp
+
+
+async def spool_upload(upload: UploadFile) -> IO[bytes]:
+    """Copia un UploadFile a un archivo temporal propio, por chunks y con el mismo limite.
+
+    POR QUE: Starlette guarda uploads chicos en memoria (SpooledTemporaryFile) y
+    sin ruta en disco; PdfDocumentSession necesita una ruta para no cargar bytes.
+
+    Raises:
+        PDFTooLargeError si el archivo supera MAX_PDF_SIZE_MB.
+    """
+    max_size = settings.MAX_PDF_SIZE_MB * 1024 * 1024
+    size = 0
+    tmp = _spool_file()
+    try:
+        while chunk := await upload.read(DOWNLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                raise PDFTooLargeError(f"Upload supera {settings.MAX_PDF_SIZE_MB}MB")
+            tmp.write(chunk)
+        tmp.flush()
+    except BaseException:
+        tmp.close()
+        raise
+    tmp.seek(0)
+    return tmp
+
+
+def download_stats() -> dict:
+    """Contadores de descargas desde el arranque: cantidad, bytes, tiempos, rechazos."""
+    n = _stats["downloads"]
+    return {
+        "downloads": n,
+        "rejected_too_large": _stats["rejected_too_large"],
+        "errors": _stats["errors"],
+        "total_mb": round(_stats["bytes"] / 1024 / 1024, 2),
+        "avg_mb": round(_stats["bytes"] / n / 1024 / 1024, 2) if n else 0.0,
+        "avg_seconds": round(_stats["seconds"] / n, 2) if n else 0.0,
+        "max_seconds": round(_stats["max_seconds"], 2),
+        "avg_mb_per_second": (
+            round(_stats["bytes"] / 1024 / 1024 / _stats["seconds"], 2) if _stats["seconds"] else 0.0
+        ),
+    }
@@ -0,0 +1,101 @@
+"""
+Conteo de tokens y costo estimado de las llamadas al LLM.
+- Finalidad: Normaliza el usage de OpenAI (prompt, completion, reasoning, cached)
+  de cada llamada (extraccion, retry, deteccion de tipo por vision), calcula su
+  costo con los precios por millon de tokens de config y suma llamadas para una
+  extraccion, un job de batch o el backlog completo. Los reasoning tokens ya estan
+  incluidos en completion_tokens y los cached en prompt_tokens (asi factura OpenAI).
+- Consume: config.py (OPENAI_PRICE_*_PER_MTOK)
+- Consumido por: llm_extractor.py (normalize_usage, call_cost),
+  service.py (sum_usage), router.py (merge_usage por job),
+  backlog.py (add_usage por pdf_type y u1a_method)
+"""
+
+from app.config import get_settings
+
+settings = get_settings()
+
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "reasoning_tokens", "cached_tokens")
+
+
+def normalize_usage(usage) -> dict:
+    """Convierte el CompletionUsage del SDK en un dict plano con USAGE_FIELDS."""
+    prompt_details = getattr(usage, "prompt_tokens_details", None)
+    completion_details = getattr(usage, "completion_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "reasoning_tokens": getattr(completion_details, "reasoning_tokens", None) or 0,
+        "cached_tokens": getattr(prompt_details, "cached_tokens", None) or 0,
+    }
+
+
+def call_cost(usage: dict) -> float:
+    """Costo estimado en USD de una llamada segun su usage normalizado."""
+    cached = usage.get("cached_tokens", 0)
+    uncached = usage.get("prompt_tokens", 0) - cached
+    cost = (
+        uncached * settings.OPENAI_PRICE_INPUT_PER_MTOK
+        + cached * settings.OPENAI_PRICE_CACHED_INPUT_PER_MTOK
+        + usage.get("completion_tokens", 0) * settings.OPENAI_PRICE_OUTPUT_PER_MTOK
+    ) / 1_000_000
+    return round(cost, 6)
+
+
+def empty_usage() -> dict:
+    """Acumulador vacio para add_usage."""
+    return {
+        "calls": 0, "calls_without_usage": 0, **dict.fromkeys(USAGE_FIELDS, 0), "cost_usd": 0.0,
+        "estimated_cost_usd": 0.0,
+    }
+
+
+def add_usage(total: dict, calls: list[dict]) -> dict:
+    """Suma llamadas (metricas de llm_calls) sobre total, in place.
+
+    Una llamada sin usage (stream abortado antes del chunk final) se cuenta en
+    calls_without_usage: su costo real existe pero no se conoce; su
+    usage_estimate (cota inferior) se suma aparte en estimated_cost_usd. La copia
+    perdedora de un hedge (call["hedge"]) se suma como una llamada mas; si fue
+    cancelada sin usage, su wasted_usage_estimate se valoriza con call_cost y va
+    tambien a estimated_cost_usd.
+    """
+    for call in calls:
+        _add_call(total, call.get("usage"), call.get("cost_usd"))
+        estimate = call.get("usage_estimate")
+        if estimate and not call.get("usage"):
+            total["estimated_cost_usd"] = round(total["estimated_cost_usd"] + estimate["cost_usd"], 6)
+        hedge = call.get("hedge")
+        if hedge:
+            _add_call(total, hedge.get("wasted_usage"), hedge.get("wasted_cost_usd"))
+            wasted_estimate = hedge.get("wasted_usage_estimate")
+            if wasted_estimate and not hedge.get("wasted_usage"):
+                total["estimated_cost_usd"] = round(
+                    total["estimated_cost_usd"] + call_cost(wasted_estimate), 6,
+                )
+    return total
+
+
+def _add_call(total: dict, usage: dict | None, cost: float | None) -> None:
+    total["calls"] += 1
+    if not usage:
+        total["calls_without_usage"] += 1
+        return
+    for key in USAGE_FIELDS:
+        total[key] += usage.get(key, 0)
+    cost = cost if cost is not None else call_cost(usage)
+    total["cost_usd"] = round(total["cost_usd"] + cost, 6)
+
+
+def merge_usage(total: dict, other: dict) -> dict:
+    """Suma otro total (de sum_usage) sobre total, in place."""
+    for key in ("calls", "calls_without_usage", *USAGE_FIELDS):
+        total[key] += other.get(key, 0)
+    for key in ("cost_usd", "estimated_cost_usd"):
+        total[key] = round(total[key] + other.get(key, 0.0), 6)
+    return total
+
+
+def sum_usage(calls: list[dict]) -> dict:
+    """Total de tokens y costo de una lista de llamadas."""
+    return add_usage(empty_usage(), calls)
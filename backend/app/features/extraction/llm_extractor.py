@@ -1,35 +1,111 @@
 """
 Envio de imagenes de PDF al LLM vision y parseo de respuesta JSON.
 - Finalidad: Orquesta la llamada a OpenAI vision API (gpt-5-mini por default)
-  con imagenes base64, parsea el JSON resultante y genera warnings por campos faltantes.
-- Consume: prompts.py (textos de prompt), config.py (API key, modelo), schemas.py (ExtractionResult)
+  con imagenes base64 (data URL con el MIME type de cada PageImage), parsea el JSON
+  resultante y genera warnings por campos faltantes.
+  Structured outputs: la respuesta se restringe a un JSON schema estricto generado
+  desde ExtractionResult y se valida con model_validate_json (OPENAI_RESPONSE_FORMAT).
+  Modo streaming (OPENAI_STREAM): sigue el JSON a medida que llega, mide
+  time-to-first-token y corta temprano si la salida es degenerada.
+  Usa el cliente compartido de openai_client.py salvo que se inyecte otro.
+  Cada llamada registra tokens (usage normalizado) y costo estimado en metrics.
+  Las llamadas pasan por el scheduler de rate limits (rate_limiter.py) con su
+  costo estimado en tokens. Deadline por llamada (OPENAI_DEADLINE_SECONDS,
+  OPENAI_DETECT_DEADLINE_SECONDS) y hedge opcional: pasado el percentil de
+  duracion del backlog se lanza una copia y gana la primera respuesta valida.
+- Consume: prompts.py (textos de prompt), config.py (modelo), schemas.py (ExtractionResult),
+  pdf_to_images.py (PageImage), openai_client.py (get_openai_client),
+  llm_costs.py (normalize_usage, call_cost), rate_limiter.py (create_completion),
+  budgets.py (hedge_delay)
 - Consumido por: service.py (orquestacion de extraccion)
 """
 
+import asyncio
 import json
 import logging
+import time
+import typing
+from datetime import date
+from decimal import Decimal
 
 from openai import AsyncOpenAI
+from pydantic import ValidationError
 
 from app.config import get_settings
+from app.features.extraction.budgets import hedge_delay
+from app.features.extraction.llm_costs import call_cost, normalize_usage
+from app.features.extraction.openai_client import get_openai_client
+from app.features.extraction.pdf_to_images import PageImage
 from app.features.extraction.prompts import SYSTEM_PROMPT, TYPE_1_PROMPT, TYPE_2_PROMPT
+from app.features.extraction.rate_limiter import create_completion
 from app.schemas import ExtractionResult
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
-def _build_messages(images_b64: list[str], pdf_type: str) -> list[dict]:
+# Tipo Python de ExtractionResult → tipo JSON schema
+_JSON_TYPES = {str: "string", Decimal: "number", date: "string"}
+
+
+def _extraction_json_schema() -> dict:
+    """JSON schema estricto (structured outputs) generado desde ExtractionResult.
+
+    Todos los campos son requeridos y nullable ("null" = no encontrado), sin
+    propiedades extra. warnings no se le pide al LLM: se calcula aqui.
+    """
+    properties: dict[str, dict] = {}
+    for name, field in ExtractionResult.model_fields.items():
+        if name == "warnings":
+            continue
+        base = next(t for t in typing.get_args(field.annotation) if t is not type(None))
+        prop: dict = {"type": [_JSON_TYPES[base], "null"]}
+        if base is date:
+            prop["description"] = "Fecha en formato YYYY-MM-DD"
+        properties[name] = prop
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+EXTRACTION_RESPONSE_FORMATS = {
+    "json_schema": {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "asme_extraction",
+            "strict": True,
+            "schema": _extraction_json_schema(),
+        },
+    },
+    "json_object": {"type": "json_object"},
+    # Sin restriccion: depende de "SOLO JSON" en el prompt (comportamiento anterior)
+    "text": None,
+}
+
+
+def extraction_response_format() -> dict | None:
+    """response_format configurado para la llamada de extraccion."""
+    fmt = settings.OPENAI_RESPONSE_FORMAT
+    if fmt not in EXTRACTION_RESPONSE_FORMATS:
+        logger.warning("OPENAI_RESPONSE_FORMAT desconocido '%s', usando json_schema", fmt)
+        fmt = "json_schema"
+    return EXTRACTION_RESPONSE_FORMATS[fmt]
+
+
+def _build_messages(images: list[PageImage], pdf_type: str) -> list[dict]:
     """Construye mensajes para la API de OpenAI con imagenes."""
     prompt = TYPE_1_PROMPT if pdf_type == "TYPE_1" else TYPE_2_PROMPT
 
     content: list[dict] = [{"type": "text", "text": prompt}]
-    for img_b64 in images_b64:
+    for image in images:
         content.append(
             {
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/png;base64,{img_b64}",
+                    "url": image.data_url,
                     "detail": "high",
                 },
             }
@@ -41,6 +117,22 @@ def _build_messages(images_b64: list[str], pdf_type: str) -> list[dict]:
     ]
 
 
+def _estimate_request_tokens(messages: list[dict], image_tokens: int, max_completion_tokens: int) -> int:
+    """Tokens que OpenAI descuenta del TPM al admitir la llamada.
+
+    Texto a ~4 caracteres por token (sin las data URLs), imagenes segun sus tiles
+    y max_completion_tokens completo: el rate limit reserva el maximo pedido.
+    """
+    chars = 0
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            chars += len(content)
+        else:
+            chars += sum(len(part.get("text", "")) for part in content)
+    return chars // 4 + image_tokens + max_completion_tokens
+
+
 def _clean_json_response(text: str) -> str:
     """Limpia la respuesta del LLM para obtener JSON puro."""
     text = text.strip()
@@ -53,21 +145,25 @@ def _clean_json_response(text: str) -> str:
     return text.strip()
 
 
-async def detect_type_with_vision(image_b64: str) -> str:
+async def detect_type_with_vision(
+    image: PageImage,
+    client: AsyncOpenAI | None = None,
+    metrics: dict | None = None,
+) -> str:
     """Clasifica el tipo de PDF usando vision AI cuando la deteccion por texto falla.
 
     Envia la imagen de la pagina 1 al LLM y le pide clasificar como TYPE_1 o TYPE_2.
+    client=None usa el cliente compartido. metrics (opcional) recibe total_seconds,
+    finish_reason, usage, cost_usd, deadline_exceeded y hedge de la llamada.
 
     Returns:
         'TYPE_1' o 'TYPE_2'
 
     Raises:
-        RuntimeError si no se puede determinar.
+        RuntimeError si no se puede determinar o no responde dentro del deadline.
     """
-    if not settings.OPENAI_API_KEY:
-        raise RuntimeError("OPENAI_API_KEY no configurada")
-
-    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    client = client or get_openai_client()
+    metrics = metrics if metrics is not None else {}
 
     messages = [
         {
@@ -89,7 +185,7 @@ async def detect_type_with_vision(image_b64: str) -> str:
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/png;base64,{image_b64}",
+                        "url": image.data_url,
                         "detail": "low",
                     },
                 },
@@ -97,13 +193,31 @@ async def detect_type_with_vision(image_b64: str) -> str:
         },
     ]
 
-    response = await client.chat.completions.create(
-        model=settings.OPENAI_MODEL,
-        messages=messages,
-        max_completion_tokens=100,
-    )
+    # detail=low cuesta solo los tokens base, sin tiles
+    estimated = _estimate_request_tokens(messages, settings.OPENAI_IMAGE_BASE_TOKENS, 100)
 
-    answer = (response.choices[0].message.content or "").strip().upper()
+    async def attempt(attempt_metrics: dict) -> tuple[str, bool]:
+        start = time.perf_counter()
+        response = await create_completion(
+            client, estimated,
+            model=settings.OPENAI_MODEL,
+            messages=messages,
+            max_completion_tokens=100,
+        )
+        attempt_metrics["total_seconds"] = round(time.perf_counter() - start, 2)
+        attempt_metrics["finish_reason"] = response.choices[0].finish_reason
+        _record_usage(attempt_metrics, response.usage)
+        answer = (response.choices[0].message.content or "").strip().upper()
+        return answer, "TYPE_1" in answer or "TYPE_2" in answer
+
+    deadline = settings.OPENAI_DETECT_DEADLINE_SECONDS
+    try:
+        async with asyncio.timeout(deadline or None):
+            answer = await _hedged(attempt, await hedge_delay("detect"), metrics, estimated - 100)
+    except TimeoutError:
+        metrics["deadline_exceeded"] = True
+        metrics["total_seconds"] = deadline
+        raise RuntimeError(f"Vision AI no respondio en {deadline:g}s")
     logger.info("Vision type detection: answer=%s", answer)
 
     if "TYPE_1" in answer:
@@ -114,56 +228,366 @@ async def detect_type_with_vision(image_b64: str) -> str:
     raise RuntimeError(f"Vision AI no pudo clasificar el PDF: {answer}")
 
 
+async def _hedged(attempt, hedge_after: float | None, metrics: dict, prompt_tokens_estimate: int):
+    """Ejecuta attempt y, si no termino en hedge_after segundos, lanza una copia.
+
+    attempt(attempt_metrics) hace una llamada al LLM y retorna (resultado, valido).
+    Gana la primera copia que termina con un resultado valido; la otra se cancela.
+    Si ninguna es valida gana la primera que termino sin excepcion. Las metricas
+    del ganador se copian a metrics y las del perdedor quedan en metrics["hedge"]
+    (usage real si llego a recibirlo; si fue cancelado, wasted_tokens_estimate es
+    una cota inferior: prompt estimado + texto recibido, sin reasoning).
+
+    Returns:
+        El resultado del ganador (sin el flag de valido).
+    """
+    if not hedge_after:
+        result, _ = await attempt(metrics)
+        return result
+
+    primary_metrics: dict = {}
+    primary = asyncio.create_task(attempt(primary_metrics))
+    runs = {primary: ("primary", primary_metrics)}
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done:
+            metrics.update(primary_metrics)
+            return primary.result()[0]
+
+        logger.warning("LLM sin respuesta tras %.1fs, lanzando hedge", hedge_after)
+        hedge_metrics: dict = {}
+        hedge = asyncio.create_task(attempt(hedge_metrics))
+        runs[hedge] = ("hedge", hedge_metrics)
+        winner = None
+        pending = set(runs)
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((t for t in done if t.exception() is None and t.result()[1]), None)
+        if winner is None:
+            winner = next((t for t in runs if t.exception() is None), primary)
+    finally:
+        for task in runs:
+            task.cancel()
+        await asyncio.gather(*runs, return_exceptions=True)
+
+    name, winner_metrics = runs[winner]
+    _, loser_metrics = runs[hedge if winner is primary else primary]
+    wasted = loser_metrics.get("usage")
+    estimate = None
+    if not wasted:
+        estimate = {
+            "prompt_tokens": prompt_tokens_estimate,
+            "completion_tokens": loser_metrics.get("output_chars", 0) // 4,
+        }
+    counted = wasted or estimate
+    metrics.update(winner_metrics)
+    metrics["hedge"] = {
+        "after_seconds": round(hedge_after, 2),
+        "winner": name,
+        "wasted_usage": wasted,
+        "wasted_cost_usd": loser_metrics.get("cost_usd"),
+        # Solo si el perdedor fue cancelado sin usage; llm_costs lo suma en estimated_cost_usd
+        "wasted_usage_estimate": estimate,
+        "wasted_tokens_estimate": counted["prompt_tokens"] + counted["completion_tokens"],
+    }
+    logger.info("Hedge resuelto: gano %s", name)
+    return winner.result()[0]
+
+
+def _record_usage(metrics: dict, usage) -> None:
+    """Guarda en metrics el usage normalizado y su costo estimado."""
+    if usage is None:
+        return
+    metrics["usage"] = normalize_usage(usage)
+    metrics["cost_usd"] = call_cost(metrics["usage"])
+
+
+class DegenerateOutputError(Exception):
+    """La respuesta en streaming no puede terminar en un JSON util."""
+
+
+class _JsonStreamScanner:
+    """Sigue un objeto JSON que llega en fragmentos, sin parsearlo completo.
+
+    Lleva la profundidad de llaves (respetando strings y escapes) para saber
+    cuando el objeto cerro, y corta con DegenerateOutputError si hay texto
+    largo antes del '{', un string desbocado o demasiados caracteres.
+    Despues del cierre solo cuenta el texto sobrante (trailing).
+    """
+
+    # POR QUE: "```json" son 7 caracteres; mas que esto antes del '{' es prosa.
+    MAX_PREAMBLE = 32
+    # El valor mas largo legitimo (fabricante, raw_*) cabe holgado en 400.
+    MAX_STRING = 400
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.chars = 0
+        self.preamble = 0
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escape = False
+        self.string_len = 0
+        self.complete = False
+        self.trailing = 0
+        # Caracteres recibidos en total y posicion justo despues del '}' final
+        self.pos = 0
+        self.end: int | None = None
+
+    def feed(self, text: str) -> None:
+        for ch in text:
+            self.pos += 1
+            if self.complete:
+                if not ch.isspace():
+                    self.trailing += 1
+                continue
+            self.chars += 1
+            if self.chars > self.max_chars:
+                raise DegenerateOutputError(f"respuesta supera {self.max_chars} caracteres")
+
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    self.depth = 1
+                elif not ch.isspace():
+                    self.preamble += 1
+                    if self.preamble > self.MAX_PREAMBLE:
+                        raise DegenerateOutputError("texto fuera del objeto JSON")
+                continue
+
+            if self.in_string:
+                self.string_len += 1
+                if self.string_len > self.MAX_STRING:
+                    raise DegenerateOutputError(f"string de mas de {self.MAX_STRING} caracteres")
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+                self.string_len = 0
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.complete = True
+                    self.end = self.pos
+
+
+async def _stream_completion(
+    client: AsyncOpenAI, request: dict, estimated_tokens: int, metrics: dict,
+) -> tuple[str, str | None, str | None]:
+    """Ejecuta la llamada en streaming, validando el JSON a medida que llega.
+
+    Con el objeto JSON ya cerrado sigue leyendo solo para recibir finish_reason
+    y usage; si despues llega texto de mas, corta ahi (el JSON ya esta completo).
+    Registra ttft_seconds, usage y cost_usd en metrics. Si el stream se cierra
+    antes del chunk de usage (abortado o cortado), registra usage_estimate: prompt
+    estimado + texto recibido / 4, sin reasoning (cota inferior del costo real).
+
+    Returns:
+        Tupla (contenido, finish_reason, refusal).
+
+    Raises:
+        DegenerateOutputError si la salida es claramente inservible (se cierra el stream).
+    """
+    start = time.perf_counter()
+    scanner = _JsonStreamScanner(settings.OPENAI_STREAM_MAX_CHARS)
+    parts: list[str] = []
+    refusal_parts: list[str] = []
+    finish_reason = None
+
+    stream = await create_completion(
+        client, estimated_tokens, **request, stream=True, stream_options={"include_usage": True},
+    )
+    try:
+        async for chunk in stream:
+            if chunk.usage is not None:
+                _record_usage(metrics, chunk.usage)
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+            delta = choice.delta
+            if getattr(delta, "refusal", None):
+                refusal_parts.append(delta.refusal)
+            if delta.content:
+                if "ttft_seconds" not in metrics:
+                    metrics["ttft_seconds"] = round(time.perf_counter() - start, 2)
+                parts.append(delta.content)
+                scanner.feed(delta.content)
+                if scanner.trailing > scanner.MAX_PREAMBLE:
+                    logger.warning("LLM sigue generando despues del JSON, cortando stream")
+                    finish_reason = "json_complete"
+                    break
+    finally:
+        metrics["output_chars"] = scanner.chars
+        if "usage" not in metrics:
+            estimate = {
+                "prompt_tokens": estimated_tokens - request["max_completion_tokens"],
+                "completion_tokens": scanner.chars // 4,
+            }
+            metrics["usage_estimate"] = {**estimate, "cost_usd": call_cost(estimate)}
+        await stream.close()
+
+    content = "".join(parts)
+    if scanner.end is not None:
+        content = content[:scanner.end]
+    return content, finish_reason, "".join(refusal_parts) or None
+
+
 async def extract_with_llm(
-    images_b64: list[str], pdf_type: str
+    images: list[PageImage],
+    pdf_type: str,
+    client: AsyncOpenAI | None = None,
+    metrics: dict | None = None,
+    budget: dict | None = None,
 ) -> ExtractionResult:
     """Envia imagenes al LLM vision y retorna datos estructurados.
 
     Args:
-        images_b64: Lista de imagenes en base64.
+        images: Lista de imagenes de pagina (base64 + MIME type).
         pdf_type: 'TYPE_1' o 'TYPE_2'.
+        client: Cliente OpenAI a usar. None → cliente compartido.
+        metrics: Dict opcional que se llena con datos de la llamada: streamed,
+            ttft_seconds, total_seconds, finish_reason, aborted, usage (tokens),
+            cost_usd, usage_estimate (stream cerrado sin usage), el presupuesto usado, deadline_exceeded y hedge.
+        budget: Presupuesto de budgets.get_budget (max_completion_tokens,
+            reasoning_effort). None → OPENAI_MAX_TOKENS y esfuerzo default del modelo.
 
     Returns:
         ExtractionResult con los campos extraidos.
     """
-    if not settings.OPENAI_API_KEY:
-        raise RuntimeError("OPENAI_API_KEY no configurada")
-
-    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-    messages = _build_messages(images_b64, pdf_type)
-
-    response = await client.chat.completions.create(
-        model=settings.OPENAI_MODEL,
-        messages=messages,
-        max_completion_tokens=settings.OPENAI_MAX_TOKENS,
+    client = client or get_openai_client()
+    metrics = metrics if metrics is not None else {}
+    messages = _build_messages(images, pdf_type)
+
+    budget = budget or {}
+    request: dict = {
+        "model": settings.OPENAI_MODEL,
+        "messages": messages,
+        "max_completion_tokens": budget.get("max_completion_tokens") or settings.OPENAI_MAX_TOKENS,
+    }
+    if budget.get("reasoning_effort"):
+        request["reasoning_effort"] = budget["reasoning_effort"]
+    metrics["budget_key"] = budget.get("budget_key")
+    metrics["max_completion_tokens"] = request["max_completion_tokens"]
+    metrics["reasoning_effort"] = budget.get("reasoning_effort")
+    response_format = extraction_response_format()
+    if response_format:
+        request["response_format"] = response_format
+    estimated_tokens = _estimate_request_tokens(
+        messages, sum(img.tokens_estimate for img in images), request["max_completion_tokens"],
     )
 
-    choice = response.choices[0]
-    raw_content = choice.message.content or ""
+    deadline = settings.OPENAI_DEADLINE_SECONDS
+    start = time.perf_counter()
+    try:
+        async with asyncio.timeout(deadline or None):
+            return await _hedged(
+                lambda attempt_metrics: _extract_attempt(client, request, estimated_tokens, attempt_metrics),
+                await hedge_delay(metrics["budget_key"]),
+                metrics,
+                estimated_tokens - request["max_completion_tokens"],
+            )
+    except TimeoutError:
+        metrics["total_seconds"] = round(time.perf_counter() - start, 2)
+        metrics["deadline_exceeded"] = True
+        logger.error("LLM sin respuesta dentro del deadline de %gs", deadline)
+        return ExtractionResult(warnings=[f"El LLM no respondio en {deadline:g}s. Reintentar."])
+
+
+async def _extract_attempt(
+    client: AsyncOpenAI, request: dict, estimated_tokens: int, metrics: dict,
+) -> tuple[ExtractionResult, bool]:
+    """Una llamada de extraccion. Retorna (resultado, valido): no valido si la
+    respuesta se aborto, fue rechazada o vino vacia."""
+    start = time.perf_counter()
+    metrics["streamed"] = settings.OPENAI_STREAM
+    if settings.OPENAI_STREAM:
+        try:
+            raw_content, finish_reason, refusal = await _stream_completion(client, request, estimated_tokens, metrics)
+        except DegenerateOutputError as e:
+            metrics["total_seconds"] = round(time.perf_counter() - start, 2)
+            metrics["aborted"] = str(e)
+            logger.error("LLM stream abortado tras %.1fs: %s", metrics["total_seconds"], e)
+            return ExtractionResult(warnings=[f"Respuesta del LLM abortada ({e}). Reintentar."]), False
+    else:
+        response = await create_completion(client, estimated_tokens, **request)
+        choice = response.choices[0]
+        raw_content = choice.message.content or ""
+        finish_reason = choice.finish_reason
+        refusal = getattr(choice.message, "refusal", None)
+        _record_usage(metrics, response.usage)
+
+    metrics["total_seconds"] = round(time.perf_counter() - start, 2)
+    metrics["finish_reason"] = finish_reason
     logger.info(
-        "LLM response: %d chars, finish_reason=%s, usage=%s",
+        "LLM response: %d chars, finish_reason=%s, ttft=%ss, total=%ss, usage=%s",
         len(raw_content),
-        choice.finish_reason,
-        response.usage,
+        finish_reason,
+        metrics.get("ttft_seconds"),
+        metrics["total_seconds"],
+        metrics.get("usage"),
     )
 
+    if refusal:
+        logger.error("LLM refusal: %s", refusal[:300])
+        return ExtractionResult(warnings=[f"El LLM rechazo la solicitud: {refusal[:200]}"]), False
+
     if not raw_content:
-        logger.error("LLM returned empty response (finish_reason=%s)", choice.finish_reason)
+        logger.error("LLM returned empty response (finish_reason=%s)", finish_reason)
         return ExtractionResult(
-            warnings=[f"LLM devolvió respuesta vacía (finish_reason={choice.finish_reason}). Reintentar."]
-        )
+            warnings=[f"LLM devolvió respuesta vacía (finish_reason={finish_reason}). Reintentar."]
+        ), False
 
+    result = parse_extraction(raw_content)
+    if finish_reason == "length":
+        result.warnings.insert(0, "Respuesta truncada por limite de tokens (finish_reason=length)")
+    return result, True
+
+
+def parse_extraction(raw_content: str) -> ExtractionResult:
+    """Valida el JSON del LLM contra ExtractionResult y agrega warnings.
+
+    Con structured outputs el JSON ya cumple el schema; igual se validan tipos
+    (ej: fecha no ISO). Un campo invalido se descarta (null + warning) en vez
+    de perder toda la extraccion.
+    """
     clean_json = _clean_json_response(raw_content)
+    warnings: list[str] = []
 
     try:
-        data = json.loads(clean_json)
-    except json.JSONDecodeError as e:
-        logger.error("Failed to parse LLM JSON: %s\nRaw: %s", e, raw_content[:500])
-        return ExtractionResult(
-            warnings=[f"Error parseando respuesta del LLM: {str(e)}"]
-        )
+        result = ExtractionResult.model_validate_json(clean_json)
+    except ValidationError as e:
+        try:
+            data = json.loads(clean_json)
+        except json.JSONDecodeError as je:
+            logger.error("Failed to parse LLM JSON: %s\nRaw: %s", je, raw_content[:500])
+            return ExtractionResult(
+                warnings=[f"Error parseando respuesta del LLM: {str(je)}"]
+            )
+        if not isinstance(data, dict):
+            return ExtractionResult(warnings=["Respuesta del LLM no es un objeto JSON"])
+
+        for err in e.errors():
+            field = err["loc"][0] if err["loc"] else None
+            if field in data:
+                logger.warning("Campo invalido del LLM %s=%r: %s", field, data[field], err["msg"])
+                warnings.append(f"Campo '{field}' con valor invalido descartado: {data[field]!r}")
+                data[field] = None
+        data.pop("warnings", None)
+        try:
+            result = ExtractionResult.model_validate(data)
+        except ValidationError as e2:
+            logger.error("LLM JSON no valida contra ExtractionResult: %s", e2)
+            return ExtractionResult(warnings=[f"Respuesta del LLM no valida: {e2.error_count()} errores"])
 
-    warnings = []
     expected_fields = [
         "fabricante", "ano_fabricacion", "asme_code_edition", "mawp_psi",
         "hydro_test_pressure_psi", "material_cuerpo", "espesor_cuerpo_mm",
@@ -171,8 +595,7 @@ async def extract_with_llm(
         "espesor_cabezales_mm", "fecha_certificacion",
     ]
     for field in expected_fields:
-        if data.get(field) is None:
+        if getattr(result, field) is None:
             warnings.append(f"Campo '{field}' no encontrado en el PDF")
 
-    data["warnings"] = warnings
-    return ExtractionResult(**data)
+    return result.model_copy(update={"warnings": warnings})
@@ -0,0 +1,86 @@
+"""
+Cliente AsyncOpenAI compartido por toda la app.
+- Finalidad: Un solo cliente (y un solo pool httpx) para todas las llamadas al LLM,
+  creado en el lifespan y cerrado al apagar. Reutiliza conexiones keep-alive entre
+  extracciones (sin handshake TLS por llamada en un batch de cientos de PDFs).
+  Pool dimensionado segun MAX_CONCURRENT_EXTRACTIONS, timeouts configurables y HTTP/2
+  si el paquete h2 esta instalado. Sin reintentos del SDK (los maneja rate_limiter.py).
+- Consume: config.py (OPENAI_API_KEY, OPENAI_*_TIMEOUT_SECONDS, OPENAI_HTTP2,
+  OPENAI_MAX_CONNECTIONS, MAX_CONCURRENT_EXTRACTIONS)
+- Consumido por: main.py (start/close en lifespan), llm_extractor.py (get_openai_client)
+"""
+
+import importlib.util
+import logging
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+_client: AsyncOpenAI | None = None
+
+
+def _build_client() -> AsyncOpenAI:
+    """Crea el cliente con su pool httpx dedicado."""
+    http2 = settings.OPENAI_HTTP2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("OPENAI_HTTP2=true pero el paquete h2 no esta instalado, usando HTTP/1.1")
+        http2 = False
+
+    # POR QUE: Cada extraccion puede tener 2 llamadas en vuelo (vision + extraccion,
+    # o extraccion + retry en batch solapado); por eso el doble del semaforo.
+    max_connections = settings.OPENAI_MAX_CONNECTIONS or settings.MAX_CONCURRENT_EXTRACTIONS * 2
+    http_client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_SECONDS,
+        ),
+        timeout=httpx.Timeout(
+            settings.OPENAI_TIMEOUT_SECONDS,
+            connect=settings.OPENAI_CONNECT_TIMEOUT_SECONDS,
+        ),
+    )
+    logger.info(
+        "Cliente OpenAI creado: max_connections=%d, http2=%s, timeout=%ss",
+        max_connections, http2, settings.OPENAI_TIMEOUT_SECONDS,
+    )
+    # POR QUE: max_retries=0 porque los reintentos los hace rate_limiter.py; los
+    # del SDK reenviarian un 429 sin pasar por el presupuesto compartido.
+    return AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=http_client, max_retries=0)
+
+
+def start_openai_client() -> None:
+    """Crea el cliente compartido (idempotente). Sin API key no hace nada."""
+    global _client
+    if _client is not None or not settings.OPENAI_API_KEY:
+        return
+    _client = _build_client()
+
+
+async def close_openai_client() -> None:
+    """Cierra el cliente compartido y su pool de conexiones."""
+    global _client
+    if _client is None:
+        return
+    await _client.close()
+    _client = None
+    logger.info("Cliente OpenAI cerrado")
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Cliente compartido. Fuera de la app (scripts) se crea al primer uso.
+
+    Raises:
+        RuntimeError si OPENAI_API_KEY no esta configurada.
+    """
+    if not settings.OPENAI_API_KEY:
+        raise RuntimeError("OPENAI_API_KEY no configurada")
+    if _client is None:
+        start_openai_client()
+    return _client
@@ -0,0 +1,202 @@
+"""
+Cache en disco de imagenes de pagina renderizadas, direccionado por contenido.
+- Finalidad: Evita re-renderizar paginas de PDFs ya vistos (re-runs de /batch/extract,
+  reintentos desde Glide). Clave = sha256(PDF) + pagina + variante de render/encoding
+  (DPI, adaptativo, ROI, formato, calidad, color). Limitado por bytes totales con
+  eviccion LRU (recencia = mtime del archivo, sobrevive reinicios del contenedor).
+  Contadores de hits/misses/evictions para /cache/stats.
+  Las funciones hacen I/O de disco sincrono: desde el event loop se llaman con
+  asyncio.to_thread (get_pages/put_pages agrupan las paginas de un render en un
+  solo salto de thread). El indice LRU esta protegido por un lock.
+- Consume: config.py (PAGE_CACHE_DIR, PAGE_CACHE_MAX_MB), pdf_to_images.py (PageImage)
+- Consumido por: pdf_to_images.py (render_pages: get_pages, put_pages), router.py (/cache/stats)
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from app.config import get_settings
+
+if TYPE_CHECKING:
+    from app.features.extraction.pdf_to_images import PageImage
+
+logger = logging.getLogger(__name__)
+
+_settings = get_settings()
+PAGE_CACHE_DIR = Path(_settings.PAGE_CACHE_DIR)
+PAGE_CACHE_MAX_BYTES = _settings.PAGE_CACHE_MAX_MB * 1024 * 1024
+
+# POR QUE: Cambiar este valor invalida todo el cache cuando cambia la logica de
+# render (ej: nuevo algoritmo de recorte) sin que cambien los settings.
+RENDER_VERSION = 2
+
+# Indice LRU en memoria: nombre de archivo → tamano. Se construye lazy desde disco.
+_index: OrderedDict[str, int] | None = None
+_total_bytes = 0
+# POR QUE: get/put corren en threads (asyncio.to_thread) de requests concurrentes
+_lock = threading.RLock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "errors": 0}
+
+
+def _enabled() -> bool:
+    return PAGE_CACHE_MAX_BYTES > 0
+
+
+def _load_index() -> OrderedDict[str, int]:
+    """Escanea el directorio del cache ordenando por mtime (mas antiguo primero)."""
+    global _index, _total_bytes
+    with _lock:
+        if _index is not None:
+            return _index
+        return _scan_index()
+
+
+def _scan_index() -> OrderedDict[str, int]:
+    global _index, _total_bytes
+    entries = []
+    try:
+        PAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        for path in PAGE_CACHE_DIR.glob("*.img"):
+            st = path.stat()
+            entries.append((st.st_mtime, path.name, st.st_size))
+    except OSError as e:
+        logger.warning("No se pudo leer el cache de paginas: %s", e)
+
+    entries.sort()
+    _index = OrderedDict((name, size) for _, name, size in entries)
+    _total_bytes = sum(_index.values())
+    logger.info("Cache de paginas: %d entradas, %.1f MB", len(_index), _total_bytes / 1024 / 1024)
+    return _index
+
+
+def _entry_name(pdf_sha256: str, page: int, variant: str) -> str:
+    key = f"{pdf_sha256}:{page}:{variant}:v{RENDER_VERSION}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest() + ".img"
+
+
+def get_page(pdf_sha256: str, page: int, variant: str) -> "PageImage | None":
+    """Busca una pagina en el cache. Un hit la marca como usada recientemente."""
+    if not _enabled():
+        return None
+    from app.features.extraction.pdf_to_images import PageImage
+
+    index = _load_index()
+    name = _entry_name(pdf_sha256, page, variant)
+    with _lock:
+        if name not in index:
+            _stats["misses"] += 1
+            return None
+
+    path = PAGE_CACHE_DIR / name
+    try:
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            data = f.read()
+        os.utime(path)
+    except (OSError, ValueError) as e:
+        logger.warning("Entrada de cache ilegible %s: %s", name, e)
+        with _lock:
+            _stats["errors"] += 1
+            _stats["misses"] += 1
+            _discard(name)
+        return None
+
+    with _lock:
+        if name in index:
+            index.move_to_end(name)
+        _stats["hits"] += 1
+    return PageImage(
+        page=page,
+        mime_type=header["mime_type"],
+        data_b64=base64.b64encode(data).decode("utf-8"),
+        nbytes=len(data),
+        width=header["width"],
+        height=header["height"],
+    )
+
+
+def put_page(pdf_sha256: str, variant: str, image: "PageImage") -> None:
+    """Guarda una pagina renderizada y aplica eviccion LRU si se excede el limite.
+
+    Si no puede escribir (permisos, disco lleno), solo loguea warning.
+    """
+    global _total_bytes
+    if not _enabled():
+        return
+
+    index = _load_index()
+    name = _entry_name(pdf_sha256, image.page, variant)
+    header = json.dumps(
+        {"mime_type": image.mime_type, "width": image.width, "height": image.height}
+    ).encode("utf-8")
+    payload = header + b"\n" + base64.b64decode(image.data_b64)
+
+    path = PAGE_CACHE_DIR / name
+    tmp_path = path.with_suffix(".tmp")
+    try:
+        tmp_path.write_bytes(payload)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("No se pudo escribir al cache de paginas: %s", e)
+        with _lock:
+            _stats["errors"] += 1
+        return
+
+    with _lock:
+        _total_bytes += len(payload) - index.pop(name, 0)
+        index[name] = len(payload)
+
+        while _total_bytes > PAGE_CACHE_MAX_BYTES and len(index) > 1:
+            oldest = next(iter(index))
+            _discard(oldest)
+            _stats["evictions"] += 1
+
+
+def get_pages(pdf_sha256: str, pages: list[int], variant: str) -> dict[int, "PageImage"]:
+    """get_page para varias paginas (un solo asyncio.to_thread). Solo incluye los hits."""
+    found = {}
+    for page in pages:
+        image = get_page(pdf_sha256, page, variant)
+        if image is not None:
+            found[page] = image
+    return found
+
+
+def put_pages(pdf_sha256: str, variant: str, images: list["PageImage"]) -> None:
+    """put_page para varias paginas (un solo asyncio.to_thread)."""
+    for image in images:
+        put_page(pdf_sha256, variant, image)
+
+
+def _discard(name: str) -> None:
+    """Elimina una entrada del indice y del disco. Llamar con _lock tomado."""
+    global _total_bytes
+    if _index is not None and name in _index:
+        _total_bytes -= _index.pop(name)
+    try:
+        (PAGE_CACHE_DIR / name).unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning("No se pudo borrar entrada de cache %s: %s", name, e)
+
+
+def cache_stats() -> dict:
+    """Contadores del cache de paginas (desde el arranque) y ocupacion actual."""
+    if not _enabled():
+        return {"enabled": False, **_stats}
+    index = _load_index()
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        "enabled": True,
+        **_stats,
+        "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else 0.0,
+        "entries": len(index),
+        "size_mb": round(_total_bytes / 1024 / 1024, 2),
+        "max_mb": _settings.PAGE_CACHE_MAX_MB,
+    }
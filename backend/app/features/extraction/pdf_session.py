@@ -0,0 +1,153 @@
+"""
+Sesion de documento PDF compartida por todo el pipeline de una extraccion.
+- Finalidad: Abre el PDF una sola vez por request (pypdfium2 y pdfplumber, ambos lazy)
+  y memoiza numero de paginas, texto por pagina e imagenes renderizadas por pagina.
+  Evita re-parsear los mismos bytes en deteccion de tipo, busqueda U-1A, paginas
+  escaneadas, brute force, retry y backlog. Acepta bytes o una ruta a archivo: con
+  ruta, pdfium y pdfplumber leen del archivo bajo demanda (sin copia completa en
+  memoria) y los procesos del pool (pdf_workers.py) abren la misma ruta. Con bytes,
+  se publican en shared memory para que el pool los lea sin pickling; el worker
+  abre la sesion sobre un memoryview de ese bloque y pdfium lee de ahi sin copiar.
+- Consume: nada interno (solo pypdfium2, pdfplumber, multiprocessing.shared_memory)
+- Consumido por: service.py (crea la sesion), validators.py (texto),
+  pdf_to_images.py (render), pdf_workers.py (sesion del lado del worker)
+"""
+
+import ctypes
+import hashlib
+import io
+import os
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING
+
+import pdfplumber
+import pypdfium2 as pdfium
+
+if TYPE_CHECKING:
+    from app.features.extraction.pdf_to_images import PageImage
+
+
+class PdfDocumentSession:
+    """PDF abierto una vez por request, con caches perezosos por pagina.
+
+    Los handles se abren solo si alguna etapa los necesita: pdfplumber solo se
+    abre si el backend de texto es "pdfplumber" (o como fallback de pdfium).
+    source puede ser bytes, una ruta (str/PathLike; la sesion no borra el archivo) o
+    un memoryview escribible (shared memory en pdf_workers.py; no se copia y debe
+    seguir mapeado mientras la sesion este abierta).
+    Usar como context manager o llamar close() al terminar.
+    """
+
+    def __init__(self, source: bytes | memoryview | str | os.PathLike, text_backend: str | None = None):
+        if isinstance(source, memoryview):
+            self.pdf_bytes: bytes | memoryview | None = source
+            self.path: str | None = None
+        elif isinstance(source, (bytes, bytearray)):
+            self.pdf_bytes = bytes(source)
+            self.path = None
+        else:
+            self.pdf_bytes = None
+            self.path = os.fspath(source)
+        # Backend de texto (ver validators.TEXT_BACKENDS). None → settings.PDF_TEXT_BACKEND
+        self.text_backend = text_backend
+        self._pdfium_doc: pdfium.PdfDocument | None = None
+        self._plumber_doc: pdfplumber.PDF | None = None
+        self._page_count: int | None = None
+        self._sha256: str | None = None
+        self._shm: shared_memory.SharedMemory | None = None
+        # POR QUE: Memo por pagina. validators.py llena texts, pdf_to_images.py
+        # llena images; el retry reutiliza las paginas ya renderizadas.
+        # images va por (pagina, crop): la deteccion por vision renderiza la
+        # pagina 0 sin recorte y la extraccion puede pedirla recortada (ROI).
+        self.texts: dict[int, str] = {}
+        self.images: dict[tuple[int, bool], "PageImage"] = {}
+
+    @property
+    def pdfium_doc(self) -> pdfium.PdfDocument:
+        """Handle pypdfium2 (render, conteo de paginas y text page nativo)."""
+        if self._pdfium_doc is None:
+            data = self.pdf_bytes
+            if isinstance(data, memoryview):
+                # POR QUE: Array ctypes sobre el mismo buffer: pdfium carga el
+                # documento desde la shared memory sin copiarlo.
+                data = (ctypes.c_char * len(data)).from_buffer(data)
+            self._pdfium_doc = pdfium.PdfDocument(self.path or data)
+        return self._pdfium_doc
+
+    @property
+    def plumber_doc(self) -> pdfplumber.PDF:
+        """Handle pdfplumber (backend de texto alternativo).
+
+        Con un memoryview, BytesIO hace una copia: solo se paga si se usa pdfplumber.
+        """
+        if self._plumber_doc is None:
+            self._plumber_doc = pdfplumber.open(self.path or io.BytesIO(self.pdf_bytes))
+        return self._plumber_doc
+
+    @property
+    def sha256(self) -> str:
+        """Hash del contenido del PDF (clave de los caches), calculado una vez."""
+        if self._sha256 is None:
+            if self.path:
+                with open(self.path, "rb") as f:
+                    self._sha256 = hashlib.file_digest(f, "sha256").hexdigest()
+            else:
+                self._sha256 = hashlib.sha256(self.pdf_bytes).hexdigest()
+        return self._sha256
+
+    @sha256.setter
+    def sha256(self, value: str) -> None:
+        # Lo usa pdf_workers.py: el hash ya lo calculo la sesion del request.
+        self._sha256 = value
+
+    @property
+    def page_count(self) -> int:
+        """Numero total de paginas del PDF (memoizado)."""
+        if self._page_count is None:
+            self._page_count = len(self.pdfium_doc)
+        return self._page_count
+
+    @page_count.setter
+    def page_count(self, value: int) -> None:
+        # Lo usa pdf_workers.py para copiar el conteo calculado en un worker.
+        self._page_count = value
+
+    @property
+    def size(self) -> int:
+        """Tamano del PDF en bytes."""
+        return os.path.getsize(self.path) if self.path else len(self.pdf_bytes)
+
+    def share(self) -> tuple[str, int]:
+        """Copia los bytes a un bloque de shared memory (una vez por sesion).
+
+        Solo para sesiones con bytes; las sesiones con ruta se comparten por la ruta.
+
+        Returns:
+            Tupla (nombre_del_bloque, tamano_en_bytes) para adjuntarlo desde otro proceso.
+        """
+        if self.path:
+            raise ValueError("Sesion con ruta de archivo: compartir self.path, no shared memory")
+        size = len(self.pdf_bytes)
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+            self._shm.buf[:size] = self.pdf_bytes
+        return self._shm.name, size
+
+    def close(self) -> None:
+        """Cierra los handles abiertos. Los valores memoizados siguen disponibles."""
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        if self._pdfium_doc is not None:
+            self._pdfium_doc.close()
+            self._pdfium_doc = None
+        if self._plumber_doc is not None:
+            self._plumber_doc.close()
+            self._plumber_doc = None
+
+    def __enter__(self) -> "PdfDocumentSession":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,54 +1,397 @@
 """
-Convierte paginas de PDF a imagenes PNG usando pypdfium2.
-- Finalidad: Toma bytes de un PDF y convierte paginas especificas a imagenes
-  base64 PNG para enviar a GPT-4o vision.
-- Consume: config.py (PDF_DPI)
-- Consumido por: service.py (pipeline de extraccion)
+Convierte paginas de PDF a imagenes (PNG/JPEG/WebP) usando pypdfium2.
+- Finalidad: Toma la sesion del PDF y convierte paginas especificas a imagenes
+  base64 para enviar a GPT-4o vision. Las paginas ya renderizadas en la misma
+  sesion (ej: retry TYPE_2) se reutilizan sin volver a renderizar.
+  Encoding configurable: color (rgb/gray/bitonal), formato (png/jpeg/webp), calidad
+  y nivel de compresion PNG. Cada PageImage lleva su MIME type y tamano en bytes.
+  Resolucion adaptativa por pagina: renderiza a la escala efectiva que usa OpenAI
+  vision (detail=high) con el minimo de tiles de 512px, y estima tiles/tokens por pagina.
+  Recorte ROI opcional (por pdf_type): recorta la pagina a su contenido antes de renderizar,
+  usando los rects de texto de pdfium o, en paginas escaneadas, un trim de blancos.
+  Paginas escaneadas de una sola imagen JPEG se envian con el stream original del PDF
+  (sin render ni re-encode); solo se reducen si exceden la resolucion util de la API.
+  render_pages consulta primero el cache en disco (page_cache.py), reparte render + encode
+  de las paginas faltantes entre varios workers del pool (cada uno con su propio handle
+  pdfium) y retorna en orden de pagina.
+- Consume: config.py (PDF_DPI, PDF_ADAPTIVE_DPI, PDF_RENDER_MAX_PARALLEL, PDF_IMAGE_*,
+  PDF_ROI_CROP_TYPES, OPENAI_IMAGE_*_TOKENS), pdf_session.py (PdfDocumentSession),
+  pdf_workers.py (run_pdf_stage), page_cache.py (get_pages, put_pages)
+- Consumido por: service.py (pipeline de extraccion), llm_extractor.py (PageImage)
 """
 
+import asyncio
 import base64
 import io
+import logging
+import math
+from dataclasses import dataclass
 
 import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+from PIL import Image
 
 from app.config import get_settings
+from app.features.extraction import page_cache
+from app.features.extraction.pdf_session import PdfDocumentSession
+from app.features.extraction.pdf_workers import run_pdf_stage
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Formato configurado → (formato PIL, MIME type)
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
 
-def pdf_pages_to_base64(pdf_bytes: bytes, page_numbers: list[int]) -> list[str]:
+# --- OpenAI vision (detail=high) ---
+# La API reduce la imagen para que entre en 2048x2048, luego lleva el lado corto
+# a 768px, y cobra por cada tile de 512x512. Todo pixel renderizado por encima de
+# eso se descarta despues de haberlo codificado y subido.
+VISION_MAX_SIDE = 2048
+VISION_SHORT_SIDE = 768
+VISION_TILE_SIZE = 512
+# POR QUE: Se acepta reducir hasta 15% extra la resolucion si con eso la pagina
+# entra en una fila/columna de tiles menos (ej: 768x1040 → 756x1024 = 4 tiles, no 6).
+VISION_TILE_SNAP_TOLERANCE = 0.15
+
+# --- Recorte ROI ---
+ROI_MARGIN_PT = 18  # 1/4 de pulgada alrededor del contenido
+# POR QUE: Si el recorte ahorra menos del 10% del area no vale la pena: el
+# riesgo de cortar un sello o firma no compensa unos pocos pixeles.
+ROI_MIN_AREA_SAVING = 0.10
+ROI_PROBE_SCALE = 0.5  # 36 DPI, solo para ubicar la tinta en paginas escaneadas
+ROI_INK_THRESHOLD = 200  # gris < 200 se considera contenido (no papel)
+
+# --- Imagen embebida (paginas escaneadas) ---
+# La imagen debe cubrir al menos 90% de la pagina para considerarla "la pagina".
+EMBEDDED_MIN_COVERAGE = 0.90
+# POR QUE: Un JPEG hasta 1.5x el area util de la API se envia tal cual; la API lo
+# reduce sin costo extra de tiles y nos ahorramos decodificar + re-encodear.
+EMBEDDED_MAX_OVERSIZE = 1.5
+
+
+@dataclass(frozen=True)
+class PageImage:
+    """Imagen codificada de una pagina, lista para el LLM."""
+
+    page: int  # 0-indexed
+    mime_type: str
+    data_b64: str
+    nbytes: int  # tamano codificado (antes de base64)
+    width: int
+    height: int
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{self.data_b64}"
+
+    @property
+    def tiles(self) -> int:
+        return estimate_tiles(self.width, self.height)
+
+    @property
+    def tokens_estimate(self) -> int:
+        return settings.OPENAI_IMAGE_BASE_TOKENS + settings.OPENAI_IMAGE_TILE_TOKENS * self.tiles
+
+
+def _vision_resize(width: float, height: float) -> tuple[float, float]:
+    """Dimensiones a las que OpenAI reduce una imagen en detail=high (nunca amplia)."""
+    fit = min(1.0, VISION_MAX_SIDE / max(width, height))
+    width, height = width * fit, height * fit
+    short = min(1.0, VISION_SHORT_SIDE / min(width, height))
+    return width * short, height * short
+
+
+def estimate_tiles(width: int, height: int) -> int:
+    """Numero de tiles de 512px que OpenAI cobra por una imagen de width x height."""
+    w, h = _vision_resize(width, height)
+    return math.ceil(w / VISION_TILE_SIZE) * math.ceil(h / VISION_TILE_SIZE)
+
+
+def _adaptive_scale(width_pt: float, height_pt: float) -> float:
+    """Escala de render (pixeles por punto) para una pagina de width_pt x height_pt.
+
+    Parte de PDF_DPI como maximo, baja a la resolucion efectiva de la API y luego
+    ajusta a multiplos de tile si la reduccion extra es <= VISION_TILE_SNAP_TOLERANCE.
+    """
+    max_scale = settings.PDF_DPI / 72
+    w, h = _vision_resize(width_pt * max_scale, height_pt * max_scale)
+    scale = w / width_pt
+
+    best_scale, best_tiles = scale, estimate_tiles(round(w), round(h))
+    for side in (w, h):
+        full_tiles = math.floor(side / VISION_TILE_SIZE)
+        if full_tiles < 1:
+            continue
+        factor = full_tiles * VISION_TILE_SIZE / side
+        if factor >= 1 or factor < 1 - VISION_TILE_SNAP_TOLERANCE:
+            continue
+        tiles = estimate_tiles(math.floor(w * factor), math.floor(h * factor))
+        if tiles < best_tiles:
+            best_scale, best_tiles = scale * factor, tiles
+    return best_scale
+
+
+def roi_crop_enabled(pdf_type: str) -> bool:
+    """True si el recorte ROI esta activo para este tipo de PDF (PDF_ROI_CROP_TYPES)."""
+    return pdf_type in settings.PDF_ROI_CROP_TYPES
+
+
+def image_encoding_label(crop: bool = False) -> str:
+    """Etiqueta del encoding configurado para el backlog (ej: 'jpeg-q80-gray-adaptive-roi')."""
+    fmt = settings.PDF_IMAGE_FORMAT
+    if fmt == "png":
+        detail = f"c{settings.PDF_PNG_COMPRESS_LEVEL}"
+    else:
+        detail = f"q{settings.PDF_IMAGE_QUALITY}"
+    resolution = "adaptive" if settings.PDF_ADAPTIVE_DPI else f"{settings.PDF_DPI}dpi"
+    label = f"{fmt}-{detail}-{settings.PDF_IMAGE_COLOR}-{resolution}"
+    return f"{label}-roi" if crop else label
+
+
+def _encode_image(pil_image: Image.Image) -> tuple[bytes, str]:
+    """Codifica la imagen segun PDF_IMAGE_FORMAT. Returns (bytes, mime_type)."""
+    pil_format, mime_type = IMAGE_FORMATS.get(settings.PDF_IMAGE_FORMAT, IMAGE_FORMATS["png"])
+
+    buffer = io.BytesIO()
+    if pil_format == "PNG":
+        pil_image.save(buffer, format="PNG", compress_level=settings.PDF_PNG_COMPRESS_LEVEL)
+    else:
+        if pil_image.mode == "1":
+            pil_image = pil_image.convert("L")
+        pil_image.save(buffer, format=pil_format, quality=settings.PDF_IMAGE_QUALITY)
+    return buffer.getvalue(), mime_type
+
+
+def _content_box(page: pdfium.PdfPage) -> tuple[float, float, float, float] | None:
+    """Bounding box (left, bottom, right, top) del contenido de la pagina, en puntos.
+
+    Con texto: union de los rects de texto de pdfium y de las imagenes embebidas.
+    Sin texto (escaneada): trim de blancos sobre un render gris de baja resolucion.
+    """
+    textpage = page.get_textpage()
+    try:
+        boxes = [textpage.get_rect(i) for i in range(textpage.count_rects())]
+    finally:
+        textpage.close()
+
+    if boxes:
+        boxes.extend(
+            obj.get_pos()
+            for obj in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE], max_depth=1)
+        )
+        return (
+            min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes),
+        )
+
+    probe = page.render(scale=ROI_PROBE_SCALE, grayscale=True).to_pil()
+    ink = probe.point(lambda v: 255 if v < ROI_INK_THRESHOLD else 0).getbbox()
+    if ink is None:
+        return None
+    left, _, _, top = page.get_bbox()
+    x0, y0, x1, y1 = ink
+    return (
+        left + x0 / ROI_PROBE_SCALE, top - y1 / ROI_PROBE_SCALE,
+        left + x1 / ROI_PROBE_SCALE, top - y0 / ROI_PROBE_SCALE,
+    )
+
+
+def _roi_crop(page: pdfium.PdfPage) -> tuple[float, float, float, float]:
+    """Recorte (left, bottom, right, top) a aplicar en page.render, en puntos desde cada borde.
+
+    Retorna (0, 0, 0, 0) si la pagina esta rotada, no tiene contenido o el
+    recorte no ahorra al menos ROI_MIN_AREA_SAVING del area.
+    """
+    no_crop = (0, 0, 0, 0)
+    if page.get_rotation() % 360:
+        return no_crop
+    content = _content_box(page)
+    if content is None:
+        return no_crop
+
+    left, bottom, right, top = page.get_bbox()
+    crop = (
+        max(0.0, content[0] - ROI_MARGIN_PT - left),
+        max(0.0, content[1] - ROI_MARGIN_PT - bottom),
+        max(0.0, right - content[2] - ROI_MARGIN_PT),
+        max(0.0, top - content[3] - ROI_MARGIN_PT),
+    )
+    width, height = right - left, top - bottom
+    cropped_w, cropped_h = width - crop[0] - crop[2], height - crop[1] - crop[3]
+    if cropped_w <= 0 or cropped_h <= 0:
+        return no_crop
+    if cropped_w * cropped_h > (1 - ROI_MIN_AREA_SAVING) * width * height:
+        return no_crop
+    return crop
+
+
+def _embedded_page_image(page: pdfium.PdfPage, page_num: int) -> PageImage | None:
+    """Extrae el JPEG original de una pagina escaneada de una sola imagen.
+
+    Aplica solo si la pagina no tiene texto visible (una capa OCR invisible o
+    basura de texto oculto no cambia lo que se ve), tiene exactamente una imagen que la
+    cubre, sin rotacion/espejo, codificada en DCTDecode (JPEG) gris o RGB. Si el
+    JPEG excede EMBEDDED_MAX_OVERSIZE del area util de la API, se decodifica a
+    escala reducida (draft) y se re-encodea con el formato configurado.
+
+    Returns:
+        PageImage, o None si la pagina no califica (usar render normal).
+    """
+    if page.get_rotation() % 360:
+        return None
+    images = []
+    for obj in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE, pdfium_c.FPDF_PAGEOBJ_TEXT]):
+        if obj.type == pdfium_c.FPDF_PAGEOBJ_IMAGE:
+            images.append(obj)
+        # POR QUE: los escaneos con OCR traen el texto en modo invisible (3 Tr)
+        # encima de la imagen; solo el texto visible obliga a renderizar.
+        elif pdfium_c.FPDFTextObj_GetTextRenderMode(obj) != pdfium_c.FPDF_TEXTRENDERMODE_INVISIBLE:
+            return None
+    if len(images) != 1:
+        return None
+    image = images[0]
+    if image.get_filters() != ["DCTDecode"]:
+        return None
+    metadata = image.get_metadata()
+    if metadata.bits_per_pixel not in (8, 24) or metadata.colorspace == pdfium_c.FPDF_COLORSPACE_DEVICECMYK:
+        return None
+    a, b, c, d, _, _ = image.get_matrix().get()
+    if b or c or a <= 0 or d <= 0:
+        return None
+
+    left, bottom, right, top = page.get_bbox()
+    img_left, img_bottom, img_right, img_top = image.get_pos()
+    covered_w = min(right, img_right) - max(left, img_left)
+    covered_h = min(top, img_top) - max(bottom, img_bottom)
+    if covered_w * covered_h < EMBEDDED_MIN_COVERAGE * (right - left) * (top - bottom):
+        return None
+
+    data = bytes(image.get_data(decode_simple=False))
+    width, height = image.get_size()
+    target_w, target_h = _vision_resize(width, height)
+    if width * height <= EMBEDDED_MAX_OVERSIZE * target_w * target_h:
+        return PageImage(
+            page=page_num, mime_type="image/jpeg", data_b64=base64.b64encode(data).decode("utf-8"),
+            nbytes=len(data), width=width, height=height,
+        )
+
+    try:
+        pil_image = Image.open(io.BytesIO(data))
+        target = (round(target_w), round(target_h))
+        # POR QUE: draft() decodifica el JPEG directo a 1/2, 1/4 o 1/8 de escala
+        # (en el dominio DCT), mucho mas barato que decodificar completo y reducir.
+        pil_image.draft(pil_image.mode, target)
+        pil_image = pil_image.resize(target, Image.Resampling.LANCZOS)
+    except (OSError, ValueError) as e:
+        logger.warning("JPEG embebido ilegible en pagina %d (%s), usando render", page_num + 1, e)
+        return None
+    if settings.PDF_IMAGE_COLOR in ("gray", "bitonal") and pil_image.mode != "L":
+        pil_image = pil_image.convert("L")
+    if settings.PDF_IMAGE_COLOR == "bitonal":
+        pil_image = pil_image.convert("1", dither=Image.Dither.NONE)
+
+    encoded, mime_type = _encode_image(pil_image)
+    return PageImage(
+        page=page_num, mime_type=mime_type, data_b64=base64.b64encode(encoded).decode("utf-8"),
+        nbytes=len(encoded), width=pil_image.width, height=pil_image.height,
+    )
+
+
+def _render_page(pdf: PdfDocumentSession, page_num: int, crop: bool = False) -> PageImage:
+    """Renderiza y codifica una pagina con el DPI (o escala adaptativa) y encoding configurados.
+
+    Sin recorte ROI, las paginas escaneadas de una sola imagen JPEG usan el stream
+    embebido (_embedded_page_image) en vez de rasterizar la pagina.
+    """
+    color = settings.PDF_IMAGE_COLOR
+    page = pdf.pdfium_doc[page_num]
+    if not crop:
+        embedded = _embedded_page_image(page, page_num)
+        if embedded is not None:
+            return embedded
+    width_pt, height_pt = page.get_size()
+    crop_box = _roi_crop(page) if crop else (0, 0, 0, 0)
+    width_pt -= crop_box[0] + crop_box[2]
+    height_pt -= crop_box[1] + crop_box[3]
+
+    if settings.PDF_ADAPTIVE_DPI:
+        scale = _adaptive_scale(width_pt, height_pt)
+    else:
+        scale = settings.PDF_DPI / 72
+    # POR QUE: pdfium renderiza directo a 8 bits gris (1/3 de memoria que RGB);
+    # bitonal se umbraliza despues sobre el gris.
+    bitmap = page.render(scale=scale, crop=crop_box, grayscale=color in ("gray", "bitonal"))
+    pil_image = bitmap.to_pil()
+    if color == "bitonal":
+        pil_image = pil_image.convert("1", dither=Image.Dither.NONE)
+
+    data, mime_type = _encode_image(pil_image)
+    return PageImage(
+        page=page_num,
+        mime_type=mime_type,
+        data_b64=base64.b64encode(data).decode("utf-8"),
+        nbytes=len(data),
+        width=pil_image.width,
+        height=pil_image.height,
+    )
+
+
+def pdf_pages_to_base64(
+    pdf: PdfDocumentSession, page_numbers: list[int], crop: bool = False,
+) -> list[PageImage]:
     """Convierte paginas especificas de un PDF a imagenes base64.
 
     Args:
-        pdf_bytes: Contenido del PDF en bytes.
+        pdf: Sesion del PDF (memoiza las imagenes ya renderizadas, por pagina y crop).
         page_numbers: Lista de numeros de pagina (0-indexed).
+        crop: Si True, recorta cada pagina a su contenido (ROI) antes de renderizar.
 
     Returns:
-        Lista de strings base64 de las imagenes PNG.
+        Lista de PageImage (base64 + MIME type), en el orden pedido.
     """
-    pdf = pdfium.PdfDocument(pdf_bytes)
-    try:
-        images_b64 = []
-        for page_num in page_numbers:
-            if page_num >= len(pdf):
-                continue
-            page = pdf[page_num]
-            bitmap = page.render(scale=settings.PDF_DPI / 72)
-            pil_image = bitmap.to_pil()
-
-            buffer = io.BytesIO()
-            pil_image.save(buffer, format="PNG")
-            buffer.seek(0)
-            images_b64.append(base64.b64encode(buffer.read()).decode("utf-8"))
-        return images_b64
-    finally:
-        pdf.close()
+    images = []
+    for page_num in page_numbers:
+        if page_num >= pdf.page_count:
+            continue
+        image = pdf.images.get((page_num, crop))
+        if image is None:
+            image = _render_page(pdf, page_num, crop)
+            pdf.images[page_num, crop] = image
+        images.append(image)
+    return images
 
 
-def get_page_count(pdf_bytes: bytes) -> int:
-    """Retorna el numero total de paginas del PDF."""
-    pdf = pdfium.PdfDocument(pdf_bytes)
-    try:
-        return len(pdf)
-    finally:
-        pdf.close()
+async def render_pages(
+    pdf: PdfDocumentSession, page_numbers: list[int], crop: bool = False,
+) -> list[PageImage]:
+    """Version async de pdf_pages_to_base64 que renderiza en paralelo fuera del event loop.
+
+    Solo se renderizan las paginas que no estan en el memo de la sesion ni en el
+    cache en disco, repartidas en hasta PDF_RENDER_MAX_PARALLEL tareas del pool.
+    El resultado respeta el orden de page_numbers.
+    """
+    variant = f"{image_encoding_label(crop)}-{settings.PDF_DPI}"
+    wanted = [p for p in dict.fromkeys(page_numbers) if (p, crop) not in pdf.images]
+    # POR QUE: page_cache hace glob/stat/lecturas/escrituras de disco; en el
+    # event loop bloquearia a todos los requests mientras dura el I/O.
+    cached = await asyncio.to_thread(page_cache.get_pages, pdf.sha256, wanted, variant) if wanted else {}
+    missing = []
+    for p in wanted:
+        if p in cached:
+            pdf.images[p, crop] = cached[p]
+        else:
+            missing.append(p)
+
+    if missing:
+        # POR QUE: Reparto intercalado (0,4,8.. / 1,5,9..) para que cada worker
+        # reciba una mezcla de paginas y terminen a tiempos parecidos.
+        n_chunks = max(1, min(settings.PDF_RENDER_MAX_PARALLEL, len(missing)))
+        chunks = [missing[i::n_chunks] for i in range(n_chunks)]
+        await asyncio.gather(*(run_pdf_stage(pdf_pages_to_base64, pdf, c, crop) for c in chunks))
+        rendered = [pdf.images[p, crop] for p in missing if (p, crop) in pdf.images]
+        await asyncio.to_thread(page_cache.put_pages, pdf.sha256, variant, rendered)
+    return pdf_pages_to_base64(pdf, page_numbers, crop)
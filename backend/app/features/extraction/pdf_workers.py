@@ -0,0 +1,197 @@
+"""
+Pool de procesos para las etapas CPU-bound del pipeline PDF.
+- Finalidad: Ejecuta deteccion de tipo, seleccion de paginas y render fuera del event
+  loop, en un ProcessPoolExecutor con pypdfium2/pdfplumber/PIL ya importados en cada
+  worker. Si el PDF esta en archivo, el worker abre la misma ruta; si esta en
+  memoria, los bytes viajan por shared memory (PdfDocumentSession.share), no por
+  pickling, y pdfium los lee directo del bloque mapeado (sin copia; pdfplumber si
+  copia, solo si se usa ese backend de texto). Cada worker guarda sus sesiones por
+  sha256 del PDF y ruta (pocas, LRU): las etapas siguientes del mismo request no
+  vuelven a parsear el documento. Devuelve lo que memoizo en la etapa (texto,
+  imagenes, numero de paginas) para que la sesion del request lo reutilice, tambien
+  cuando la etapa lanza una excepcion.
+- Consume: config.py (PDF_WORKER_PROCESSES), pdf_session.py (PdfDocumentSession)
+- Consumido por: main.py (start/shutdown en lifespan), service.py (run_pdf_stage)
+"""
+
+import asyncio
+import atexit
+import functools
+import gc
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable
+
+from app.config import get_settings
+from app.features.extraction.pdf_session import PdfDocumentSession
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def _warm_worker() -> None:
+    """Initializer del worker: importa las librerias pesadas una sola vez por proceso."""
+    import pdfplumber  # noqa: F401
+    import PIL.Image
+    import pypdfium2  # noqa: F401
+
+    import app.features.extraction.service  # noqa: F401
+
+    PIL.Image.init()
+    # Cerrar las sesiones cacheadas antes de que el interprete libere los bloques
+    # de shared memory (si no, SharedMemory.__del__ falla con punteros exportados).
+    atexit.register(_close_worker_sessions)
+
+
+def start_pdf_pool() -> None:
+    """Crea el pool de procesos si PDF_WORKER_PROCESSES > 0."""
+    global _executor
+    if _executor is not None or settings.PDF_WORKER_PROCESSES <= 0:
+        return
+    # POR QUE: "spawn" en vez de fork: uvicorn ya tiene threads y un event loop
+    # corriendo, y hacer fork de un proceso con threads puede dejar locks tomados.
+    _executor = ProcessPoolExecutor(
+        max_workers=settings.PDF_WORKER_PROCESSES,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_warm_worker,
+    )
+    logger.info("Pool PDF iniciado: %d procesos", settings.PDF_WORKER_PROCESSES)
+
+
+def shutdown_pdf_pool() -> None:
+    """Detiene el pool de procesos (cancela tareas pendientes)."""
+    global _executor
+    if _executor is None:
+        return
+    _executor.shutdown(wait=True, cancel_futures=True)
+    _executor = None
+    logger.info("Pool PDF detenido")
+
+
+# POR QUE: Sesiones abiertas por worker, por contenido del PDF. Las etapas de un
+# mismo request (deteccion, seleccion de paginas, chunks de render) caen en los
+# mismos workers y reutilizan el documento ya parseado y sus memos. Pocas por
+# worker: cada una retiene el documento y las imagenes renderizadas.
+_WORKER_SESSIONS_MAX = 2
+# (sha256, ruta, text_backend) → (sesion, bloque de shared memory o None).
+# POR QUE: la ruta va en la clave porque los PDFs de uploads/descargas son
+# archivos temporales que se borran al terminar el request; una sesion de otro
+# request con el mismo contenido abriria pdfplumber sobre un archivo borrado.
+_worker_sessions: OrderedDict[tuple[str, str | None, str | None], tuple[PdfDocumentSession, Any]] = OrderedDict()
+
+
+def _worker_session(
+    sha256: str, path: str | None, shm: tuple[str, int] | None, text_backend: str | None,
+) -> PdfDocumentSession:
+    """Sesion del worker para este PDF: la cacheada o una nueva sobre la ruta o la shared memory."""
+    key = (sha256, path, text_backend)
+    cached = _worker_sessions.get(key)
+    if cached is not None:
+        _worker_sessions.move_to_end(key)
+        return cached[0]
+
+    block = None
+    if path:
+        pdf = PdfDocumentSession(path, text_backend=text_backend)
+    else:
+        shm_name, size = shm
+        # El bloque queda mapeado mientras la sesion este en cache; pdfium lee
+        # directo de el (sin copia). Si el padre ya hizo unlink, el mapeo sigue valido.
+        block = shared_memory.SharedMemory(name=shm_name)
+        pdf = PdfDocumentSession(block.buf[:size], text_backend=text_backend)
+    pdf.sha256 = sha256
+    _worker_sessions[key] = (pdf, block)
+
+    while len(_worker_sessions) > _WORKER_SESSIONS_MAX:
+        _, (old_pdf, old_block) = _worker_sessions.popitem(last=False)
+        _close_worker_session(old_pdf, old_block)
+    return pdf
+
+
+def _close_worker_session(pdf: PdfDocumentSession, block: Any) -> None:
+    buf = pdf.pdf_bytes
+    pdf.close()
+    pdf.pdf_bytes = None
+    if block is None:
+        return
+    # Paginas/objetos de pdfium en ciclos de referencias retienen el array ctypes
+    # que apunta al bloque; hay que recolectarlos antes de cerrarlo.
+    gc.collect()
+    try:
+        if isinstance(buf, memoryview):
+            buf.release()
+        block.close()
+    except BufferError:
+        # Algun objeto de pdfium aun referencia el buffer; el mapeo se libera
+        # cuando el garbage collector lo suelte.
+        logger.debug("Shared memory %s aun referenciada, se libera en gc", block.name)
+
+
+def _close_worker_sessions() -> None:
+    while _worker_sessions:
+        _, (pdf, block) = _worker_sessions.popitem()
+        _close_worker_session(pdf, block)
+
+
+def _run_stage(
+    func: Callable,
+    sha256: str,
+    path: str | None,
+    shm: tuple[str, int] | None,
+    text_backend: str | None,
+    known_texts: dict[int, str],
+    args: tuple,
+) -> tuple[Any, Exception | None, dict[int, str], dict[tuple[int, bool], Any], int | None]:
+    """Ejecuta func(sesion, *args) dentro del worker sobre el PDF (ruta o shared memory).
+
+    Una excepcion de func se retorna en vez de lanzarse, junto con lo memoizado
+    hasta ese punto (ej: detect_pdf_type lanza PDFTypeError despues de leer texto).
+
+    Returns:
+        Tupla (resultado, excepcion o None, textos_nuevos, imagenes_nuevas,
+        numero_de_paginas o None si fallo).
+    """
+    pdf = _worker_session(sha256, path, shm, text_backend)
+    pdf.texts.update(known_texts)
+    known_images = set(pdf.images)
+    result, error, page_count = None, None, None
+    try:
+        result = func(pdf, *args)
+        page_count = pdf.page_count
+    except Exception as e:
+        error = e
+    new_texts = {k: v for k, v in pdf.texts.items() if k not in known_texts}
+    new_images = {k: v for k, v in pdf.images.items() if k not in known_images}
+    return result, error, new_texts, new_images, page_count
+
+
+async def run_pdf_stage(func: Callable, pdf: PdfDocumentSession, *args) -> Any:
+    """Ejecuta una etapa sincrona func(pdf, *args) sin bloquear el event loop.
+
+    func debe ser una funcion de modulo (picklable). Excepciones de func
+    (ej: PDFTypeError) se propagan igual que en la llamada directa.
+    Sin pool (PDF_WORKER_PROCESSES=0 o fuera de la app) se ejecuta inline.
+    """
+    if _executor is None:
+        return func(pdf, *args)
+
+    shm = None if pdf.path else pdf.share()
+    loop = asyncio.get_running_loop()
+    result, error, texts, images, page_count = await loop.run_in_executor(
+        _executor,
+        functools.partial(
+            _run_stage, func, pdf.sha256, pdf.path, shm, pdf.text_backend, dict(pdf.texts), args,
+        ),
+    )
+    pdf.texts.update(texts)
+    pdf.images.update(images)
+    if page_count is not None:
+        pdf.page_count = page_count
+    if error is not None:
+        raise error
+    return result
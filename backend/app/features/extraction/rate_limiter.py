@@ -0,0 +1,248 @@
+"""
+Scheduler de llamadas a OpenAI segun los rate limits de la cuenta.
+- Finalidad: Todas las llamadas a chat.completions pasan por create_completion.
+  Lleva el presupuesto de requests (RPM) y tokens (TPM) que OpenAI informa en los
+  headers x-ratelimit-* de cada respuesta; antes de enviar una llamada estima sus
+  tokens (prompt + imagenes + max_completion_tokens, como los cuenta OpenAI) y la
+  hace esperar si no entra en lo que queda hasta el reset. Un 429 pausa a todas las
+  llamadas hasta el reset informado y se reintenta con backoff exponencial + jitter;
+  errores 5xx y de conexion se reintentan igual, sin pausa global.
+  Los reintentos del SDK estan desactivados (openai_client.py) para que no
+  salteen el scheduler.
+- Consume: config.py (OPENAI_MAX_RETRIES, OPENAI_RETRY_MAX_SECONDS)
+- Consumido por: llm_extractor.py (create_completion), router.py (/llm/rate-limits)
+"""
+
+import asyncio
+import logging
+import random
+import re
+import time
+
+import openai
+from openai import AsyncOpenAI
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+RETRY_BASE_SECONDS = 1.0
+
+# Ultimo estado informado por OpenAI. None = todavia sin headers (se admite todo).
+_limits: dict[str, dict] = {
+    "requests": {"limit": None, "remaining": None, "reset_at": 0.0},
+    "tokens": {"limit": None, "remaining": None, "reset_at": 0.0},
+}
+# Reservado por llamadas admitidas cuya respuesta (con headers) aun no llego
+_reserved = {"requests": 0, "tokens": 0}
+_paused_until = 0.0
+_cond: asyncio.Condition | None = None
+
+_stats = {
+    "calls": 0, "queued": 0, "queued_seconds": 0.0, "max_queued_seconds": 0.0,
+    "rate_limited": 0, "retries": 0, "failed": 0,
+}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: str | None) -> float | None:
+    """Convierte "1s", "6m0s", "20ms", "1h2m3.5s" a segundos."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts)
+
+
+def _parse_int(value: str | None) -> int | None:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _update_from_headers(headers) -> None:
+    """Actualiza limites/remanentes con los headers x-ratelimit-* de una respuesta."""
+    now = time.monotonic()
+    for kind in ("requests", "tokens"):
+        remaining = _parse_int(headers.get(f"x-ratelimit-remaining-{kind}"))
+        if remaining is None:
+            continue
+        state = _limits[kind]
+        state["limit"] = _parse_int(headers.get(f"x-ratelimit-limit-{kind}")) or state["limit"]
+        state["remaining"] = remaining
+        reset = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+        state["reset_at"] = now + reset if reset is not None else 0.0
+
+
+def _available(kind: str, now: float) -> int | None:
+    """Cuanto queda de requests/tokens descontando lo reservado. None = sin datos."""
+    state = _limits[kind]
+    if state["remaining"] is None:
+        return None
+    # Pasado el reset la ventana se repone (OpenAI repone gradualmente; asumir
+    # el limite completo es optimista pero un 429 lo corrige). Sin limite
+    # conocido (ej: solo headers de un 429) se vuelve a "sin datos".
+    if now >= state["reset_at"]:
+        if state["limit"] is None:
+            return None
+        return state["limit"] - _reserved[kind]
+    return state["remaining"] - _reserved[kind]
+
+
+def _wait_time(tokens: int) -> float:
+    """0 si la llamada entra ahora; si no, segundos hasta el proximo cambio esperable."""
+    now = time.monotonic()
+    if now < _paused_until:
+        return _paused_until - now
+
+    waits = []
+    requests_left = _available("requests", now)
+    if requests_left is not None and requests_left < 1:
+        waits.append(_limits["requests"]["reset_at"] - now)
+    tokens_left = _available("tokens", now)
+    if tokens_left is not None:
+        # POR QUE: Una llamada mas grande que todo el limite nunca entraria;
+        # se admite cuando la ventana esta completa y sin otras reservas.
+        needed = min(tokens, _limits["tokens"]["limit"] or tokens)
+        if tokens_left < needed:
+            waits.append(_limits["tokens"]["reset_at"] - now)
+    if not waits:
+        return 0.0
+    # Sin reset pendiente se espera a que termine alguna llamada en vuelo
+    return max(max(waits), 0.05)
+
+
+def _get_cond() -> asyncio.Condition:
+    global _cond
+    if _cond is None:
+        _cond = asyncio.Condition()
+    return _cond
+
+
+async def _admit(tokens: int) -> None:
+    """Espera hasta que la llamada entre en el presupuesto y la reserva."""
+    cond = _get_cond()
+    start = time.monotonic()
+    queued = False
+    async with cond:
+        while (wait := _wait_time(tokens)) > 0:
+            if not queued:
+                queued = True
+                _stats["queued"] += 1
+                logger.info("Rate limit: llamada de ~%d tokens en espera (%.1fs)", tokens, wait)
+            try:
+                await asyncio.wait_for(cond.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+        _reserved["requests"] += 1
+        _reserved["tokens"] += tokens
+    if queued:
+        waited = time.monotonic() - start
+        _stats["queued_seconds"] += waited
+        _stats["max_queued_seconds"] = max(_stats["max_queued_seconds"], waited)
+
+
+async def _release(tokens: int, headers=None) -> None:
+    """Libera la reserva (OpenAI ya la descuenta en los headers) y despierta a la cola."""
+    cond = _get_cond()
+    async with cond:
+        _reserved["requests"] -= 1
+        _reserved["tokens"] -= tokens
+        if headers is not None:
+            _update_from_headers(headers)
+        cond.notify_all()
+
+
+def _retry_delay(error: openai.APIError, attempt: int) -> float:
+    """Backoff exponencial con jitter; para 429 respeta retry-after / reset si es mayor."""
+    delay = RETRY_BASE_SECONDS * 2 ** attempt
+    response = getattr(error, "response", None)
+    if response is not None:
+        headers = response.headers
+        retry_after_ms = _parse_int(headers.get("retry-after-ms"))
+        if retry_after_ms:
+            delay = max(delay, retry_after_ms / 1000)
+        retry_after = _parse_int(headers.get("retry-after"))
+        if retry_after:
+            delay = max(delay, retry_after)
+        for kind in ("requests", "tokens"):
+            if headers.get(f"x-ratelimit-remaining-{kind}") == "0":
+                delay = max(delay, _parse_duration(headers.get(f"x-ratelimit-reset-{kind}")) or 0.0)
+    return min(delay, settings.OPENAI_RETRY_MAX_SECONDS) * random.uniform(1.0, 1.25)
+
+
+async def create_completion(client: AsyncOpenAI, estimated_tokens: int, **request):
+    """Ejecuta client.chat.completions.create(**request) bajo el scheduler.
+
+    Args:
+        client: Cliente OpenAI. Se usa with_raw_response para leer los headers.
+        estimated_tokens: Tokens que OpenAI descontara del TPM al admitir la
+            llamada (prompt estimado + max_completion_tokens).
+
+    Returns:
+        Lo mismo que create: ChatCompletion, o AsyncStream con stream=True.
+
+    Raises:
+        openai.APIError tras OPENAI_MAX_RETRIES reintentos, o de inmediato si no
+        es reintentable (400, 401, cuota agotada).
+    """
+    global _paused_until
+    raw_create = client.chat.completions.with_raw_response.create
+    attempt = 0
+    while True:
+        await _admit(estimated_tokens)
+        _stats["calls"] += 1
+        try:
+            raw = await raw_create(**request)
+        except openai.RateLimitError as e:
+            await _release(estimated_tokens, e.response.headers)
+            _stats["rate_limited"] += 1
+            # insufficient_quota tambien es 429 pero no se arregla esperando
+            if getattr(e, "code", None) == "insufficient_quota" or attempt >= settings.OPENAI_MAX_RETRIES:
+                _stats["failed"] += 1
+                raise
+            delay = _retry_delay(e, attempt)
+            _paused_until = max(_paused_until, time.monotonic() + delay)
+            logger.warning("OpenAI 429 (intento %d), pausando llamadas %.1fs: %s", attempt + 1, delay, e)
+        except (openai.InternalServerError, openai.APIConnectionError) as e:
+            await _release(estimated_tokens, getattr(getattr(e, "response", None), "headers", None))
+            if attempt >= settings.OPENAI_MAX_RETRIES:
+                _stats["failed"] += 1
+                raise
+            delay = _retry_delay(e, attempt)
+            logger.warning("OpenAI %s (intento %d), reintento en %.1fs", type(e).__name__, attempt + 1, delay)
+            await asyncio.sleep(delay)
+        except BaseException:
+            await _release(estimated_tokens)
+            _stats["failed"] += 1
+            raise
+        else:
+            await _release(estimated_tokens, raw.headers)
+            return raw.parse()
+        attempt += 1
+        _stats["retries"] += 1
+
+
+def rate_limit_stats() -> dict:
+    """Ultimos limites informados por OpenAI, reservas en curso y contadores de cola/429."""
+    now = time.monotonic()
+    return {
+        "limits": {
+            kind: {
+                "limit": state["limit"],
+                "remaining": state["remaining"],
+                "reserved": _reserved[kind],
+                "reset_in_seconds": round(max(state["reset_at"] - now, 0.0), 2),
+            }
+            for kind, state in _limits.items()
+        },
+        "paused_for_seconds": round(max(_paused_until - now, 0.0), 2),
+        **_stats,
+        "queued_seconds": round(_stats["queued_seconds"], 2),
+        "max_queued_seconds": round(_stats["max_queued_seconds"], 2),
+    }
@@ -0,0 +1,143 @@
+"""
+Cache persistente de resultados de extraccion, direccionado por contenido.
+- Finalidad: Evita repetir deteccion + render + llamada LLM para un PDF ya extraido
+  (re-runs de /batch/extract, Glide reenviando la misma URL). Clave = sha256(PDF) +
+  hash de los prompts (SYSTEM_PROMPT, TYPE_1_PROMPT, TYPE_2_PROMPT) y del
+  response_format (JSON schema) + OPENAI_MODEL +
+  firma del metodo de seleccion de paginas. Cambiar prompts, modelo o seleccion
+  invalida las entradas sin borrar nada a mano. Un JSON por entrada, con TTL.
+  Guarda el ExtractionResult y la metadata de paginas (tipo, metodo, paginas, tiles).
+- Consume: config.py (RESULT_CACHE_DIR, RESULT_CACHE_TTL_HOURS, OPENAI_MODEL),
+  prompts.py (prompts), llm_extractor.py (extraction_response_format),
+  schemas.py (ExtractionResult)
+- Consumido por: service.py (extract_from_pdf), router.py (/cache/stats)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.config import get_settings
+from app.features.extraction.llm_extractor import extraction_response_format
+from app.features.extraction.prompts import SYSTEM_PROMPT, TYPE_1_PROMPT, TYPE_2_PROMPT
+from app.schemas import ExtractionResult
+
+logger = logging.getLogger(__name__)
+
+_settings = get_settings()
+RESULT_CACHE_DIR = Path(_settings.RESULT_CACHE_DIR)
+RESULT_CACHE_TTL_SECONDS = _settings.RESULT_CACHE_TTL_HOURS * 3600
+
+# POR QUE: Hash corto de los prompts y del schema de respuesta. Cualquier edicion
+# de prompts.py o de ExtractionResult cambia la clave, asi un prompt mejorado no
+# devuelve resultados del prompt anterior.
+PROMPT_HASH = hashlib.sha256(
+    "\x00".join((
+        SYSTEM_PROMPT, TYPE_1_PROMPT, TYPE_2_PROMPT,
+        json.dumps(extraction_response_format(), sort_keys=True),
+    )).encode("utf-8")
+).hexdigest()[:16]
+
+_stats = {"hits": 0, "misses": 0, "expired": 0, "writes": 0, "errors": 0}
+
+
+def _enabled() -> bool:
+    return RESULT_CACHE_TTL_SECONDS > 0
+
+
+def cache_key(pdf_sha256: str, page_selection: str) -> str:
+    """Clave de cache para un PDF bajo los prompts, modelo y seleccion actuales."""
+    key = f"{pdf_sha256}:{PROMPT_HASH}:{_settings.OPENAI_MODEL}:{page_selection}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def get_result(key: str) -> dict | None:
+    """Busca un resultado cacheado.
+
+    Returns:
+        Dict con la metadata guardada por put_result, "result" (ExtractionResult)
+        y "cached_at" (ISO 8601), o None si no hay entrada vigente.
+    """
+    if not _enabled():
+        return None
+
+    path = RESULT_CACHE_DIR / f"{key}.json"
+    try:
+        age = time.time() - path.stat().st_mtime
+    except FileNotFoundError:
+        _stats["misses"] += 1
+        return None
+    except OSError as e:
+        logger.warning("No se pudo leer el cache de resultados: %s", e)
+        _stats["errors"] += 1
+        _stats["misses"] += 1
+        return None
+
+    if age > RESULT_CACHE_TTL_SECONDS:
+        _stats["expired"] += 1
+        _stats["misses"] += 1
+        path.unlink(missing_ok=True)
+        return None
+
+    try:
+        entry = json.loads(path.read_text(encoding="utf-8"))
+        entry["result"] = ExtractionResult.model_validate(entry.pop("extraction"))
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Entrada de cache de resultados ilegible %s: %s", path.name, e)
+        _stats["errors"] += 1
+        _stats["misses"] += 1
+        path.unlink(missing_ok=True)
+        return None
+
+    _stats["hits"] += 1
+    return entry
+
+
+def put_result(key: str, outcome: dict) -> None:
+    """Guarda el resultado de un pipeline (ver service._run_pipeline).
+
+    outcome["result"] (ExtractionResult) se serializa como JSON; el resto de
+    claves deben ser JSON-serializables. Si no puede escribir, solo loguea warning.
+    """
+    if not _enabled():
+        return
+
+    entry = {k: v for k, v in outcome.items() if k != "result"}
+    entry["extraction"] = outcome["result"].model_dump(mode="json")
+    entry["cached_at"] = datetime.now(timezone.utc).isoformat()
+
+    path = RESULT_CACHE_DIR / f"{key}.json"
+    tmp_path = path.with_suffix(".tmp")
+    try:
+        RESULT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("No se pudo escribir al cache de resultados: %s", e)
+        _stats["errors"] += 1
+        return
+    _stats["writes"] += 1
+
+
+def cache_stats() -> dict:
+    """Contadores del cache de resultados (desde el arranque) y entradas en disco."""
+    if not _enabled():
+        return {"enabled": False, **_stats}
+    try:
+        entries = sum(1 for _ in RESULT_CACHE_DIR.glob("*.json"))
+    except OSError:
+        entries = 0
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        "enabled": True,
+        **_stats,
+        "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else 0.0,
+        "entries": entries,
+        "ttl_hours": _settings.RESULT_CACHE_TTL_HOURS,
+        "prompt_hash": PROMPT_HASH,
+        "model": _settings.OPENAI_MODEL,
+    }
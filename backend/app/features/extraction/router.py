@@ -3,7 +3,8 @@ Endpoints API para extraccion ASME, guardado en Glide, gestion de tanques y back
 - Finalidad: Capa HTTP que recibe requests y delega a service.py, glide/repository.py y backlog.py.
   Endpoints: /extract, /extract-url (con auto_save + id_activo), /batch/extract (masivo async),
   /batch/status/{job_id}, /save, /tanques, /tanques/{serie}/check, /batch/process,
-  /backlog, /backlog/summary.
+  /backlog, /backlog/summary, /cache/stats, /glide/stats, /downloads/stats, /llm/budgets,
+  /llm/rate-limits.
   Proteccion "solo campos vacios": tanto /extract-url como /batch/extract verifican
   datos existentes en Glide antes de guardar, solo llenando campos que estan vacios.
   Batch async: respuesta inmediata con job_id, procesamiento paralelo en background,
@@ -11,8 +12,12 @@ Endpoints API para extraccion ASME, guardado en Glide, gestion de tanques y back
   Todos protegidos con API key via auth.py.
 - Consume: service.py (extract, save, check, expand_serial_range), schemas.py (request/response),
   validators.py (PDFTypeError), config.py (settings), auth.py (verify_api_key),
-  glide/repository.py (list, batch, get_tanque_by_row_id, get_all_tanques_by_row_id),
-  backlog.py (read_backlog, get_backlog_summary)
+  glide/repository.py (list, batch, get_tanque_by_row_id, get_tanque_row_ids_with_fields),
+  backlog.py (read_backlog, get_backlog_summary), page_cache.py (cache_stats),
+  result_cache.py (cache_stats), glide/client.py (glide_stats),
+  glide/table_cache.py (snapshot_stats), glide/mirror.py (mirror_stats),
+  downloads.py (download_pdf, spool_upload, download_stats), budgets.py (budget_overview),
+  llm_costs.py (tokens y costo acumulados por job de batch), rate_limiter.py (rate_limit_stats)
   extract-url expande rangos automaticamente: actualiza id_activo + crea/actualiza resto por serie.
 - Consumido por: main.py (registro de router)
 """
@@ -21,6 +26,7 @@ import asyncio
 import json
 import logging
 import math
+import os
 import time
 from urllib.parse import urlparse
 from uuid import uuid4
@@ -31,6 +37,17 @@ from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile
 from app.config import get_settings
 from app.features.extraction.auth import verify_api_key
 from app.features.extraction.backlog import get_backlog_summary, read_backlog
+from app.features.extraction.budgets import budget_overview
+from app.features.extraction.downloads import (
+    PDFTooLargeError,
+    download_pdf,
+    download_stats,
+    spool_upload,
+)
+from app.features.extraction.llm_costs import empty_usage, merge_usage
+from app.features.extraction.page_cache import cache_stats
+from app.features.extraction.rate_limiter import rate_limit_stats
+from app.features.extraction.result_cache import cache_stats as result_cache_stats
 from app.features.extraction.service import (
     check_duplicate,
     expand_serial_range,
@@ -38,13 +55,16 @@ from app.features.extraction.service import (
     save_to_glide,
 )
 from app.features.extraction.validators import PDFTypeError
+from app.features.glide.client import glide_stats
+from app.features.glide.mirror import mirror_stats
 from app.features.glide.repository import (
-    get_all_tanques_by_row_id,
-    get_documentos_by_tanque,
+    get_documentos_by_tanques,
     get_tanque_by_row_id,
+    get_tanque_row_ids_with_fields,
     get_tanques_sin_libro_digital,
     list_tanques,
 )
+from app.features.glide.table_cache import snapshot_stats
 from app.schemas import (
     BatchExtractRequest,
     DuplicateCheckResponse,
@@ -110,11 +130,6 @@ _EXTRACTION_FIELDS = [
 ]
 
 
-def _all_fields_filled(existing: dict) -> bool:
-    """Verifica si un tanque ya tiene TODOS los campos de extraccion llenos."""
-    return all(existing.get(field) for field in _EXTRACTION_FIELDS)
-
-
 # POR QUÉ: Dict en memoria para rastrear el progreso de batch jobs.
 # Cada job tiene status, progreso y resultados parciales. Se limpia automaticamente
 # despues de 1 hora para no acumular memoria indefinidamente.
@@ -123,24 +138,29 @@ _BATCH_JOB_TTL_SECONDS = 3600
 
 
 @router.post("/extract", response_model=ExtractionResponse)
-async def extract_pdf(file: UploadFile):
-    """Sube un PDF, auto-detecta tipo y extrae datos con Vision AI. NO guarda."""
+async def extract_pdf(file: UploadFile, bypass_cache: bool = False):
+    """Sube un PDF, auto-detecta tipo y extrae datos con Vision AI. NO guarda.
+
+    ?bypass_cache=true ignora el cache de resultados.
+    """
     logger.info("POST /extract — filename=%s, content_type=%s", file.filename, file.content_type)
 
     if not file.filename or not file.filename.lower().endswith(".pdf"):
         logger.warning("POST /extract rechazado: archivo no es PDF (%s)", file.filename)
         raise HTTPException(400, "Solo se aceptan archivos PDF")
 
-    pdf_bytes = await file.read()
-    max_size = settings.MAX_PDF_SIZE_MB * 1024 * 1024
-    logger.info("POST /extract — PDF size=%d bytes (max=%d)", len(pdf_bytes), max_size)
-
-    if len(pdf_bytes) > max_size:
-        logger.warning("POST /extract rechazado: PDF excede limite (%d > %d)", len(pdf_bytes), max_size)
+    try:
+        pdf_file = await spool_upload(file)
+    except PDFTooLargeError as e:
+        logger.warning("POST /extract rechazado: %s", e)
         raise HTTPException(400, f"PDF excede {settings.MAX_PDF_SIZE_MB}MB")
+    logger.info("POST /extract — PDF size=%d bytes", os.path.getsize(pdf_file.name))
 
     try:
-        result = await extract_from_pdf(pdf_bytes=pdf_bytes, filename=file.filename)
+        with pdf_file:
+            result = await extract_from_pdf(
+                pdf_source=pdf_file.name, filename=file.filename, use_cache=not bypass_cache,
+            )
     except PDFTypeError as e:
         logger.error("POST /extract PDFTypeError: %s", e)
         raise HTTPException(422, str(e))
@@ -177,15 +197,18 @@ async def extract_pdf_from_url(raw_request: Request):
         "POST /extract-url — pdf_url=%s, filename=%s, id_activo=%s, auto_save=%s, content_type=%s",
         request.pdf_url, request.filename, request.id_activo, request.auto_save, content_type,
     )
-    max_size = settings.MAX_PDF_SIZE_MB * 1024 * 1024
 
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.get(request.pdf_url)
-            response.raise_for_status()
+        pdf_file = await download_pdf(request.pdf_url)
+    except PDFTooLargeError as e:
+        logger.warning("POST /extract-url rechazado: %s", e)
+        return ExtractionResponse(status="error", error_message=f"El PDF excede el limite de {settings.MAX_PDF_SIZE_MB}MB")
     except httpx.TimeoutException:
         logger.error("POST /extract-url timeout descargando %s", request.pdf_url)
-        return ExtractionResponse(status="error", error_message="No se pudo descargar el PDF: tiempo de espera agotado (60s)")
+        return ExtractionResponse(
+            status="error",
+            error_message=f"No se pudo descargar el PDF: tiempo de espera agotado ({settings.DOWNLOAD_TIMEOUT_SECONDS:g}s)",
+        )
     except httpx.HTTPStatusError as e:
         logger.error("POST /extract-url HTTP error %d descargando %s", e.response.status_code, request.pdf_url)
         return ExtractionResponse(status="error", error_message=f"No se pudo descargar el PDF: error HTTP {e.response.status_code}")
@@ -193,12 +216,7 @@ async def extract_pdf_from_url(raw_request: Request):
         logger.error("POST /extract-url conexion error: %s", e)
         return ExtractionResponse(status="error", error_message="No se pudo descargar el PDF: error de conexion")
 
-    pdf_bytes = response.content
-    logger.info("POST /extract-url — PDF descargado: %d bytes", len(pdf_bytes))
-
-    if len(pdf_bytes) > max_size:
-        logger.warning("POST /extract-url rechazado: PDF excede limite (%d > %d)", len(pdf_bytes), max_size)
-        return ExtractionResponse(status="error", error_message=f"El PDF excede el limite de {settings.MAX_PDF_SIZE_MB}MB")
+    logger.info("POST /extract-url — PDF descargado: %d bytes", os.path.getsize(pdf_file.name))
 
     filename = request.filename
     if not filename:
@@ -208,7 +226,10 @@ async def extract_pdf_from_url(raw_request: Request):
             filename += ".pdf"
 
     try:
-        result = await extract_from_pdf(pdf_bytes=pdf_bytes, filename=filename)
+        with pdf_file:
+            result = await extract_from_pdf(
+                pdf_source=pdf_file.name, filename=filename, use_cache=not request.bypass_cache,
+            )
     except PDFTypeError as e:
         logger.error("POST /extract-url PDFTypeError: %s", e)
         return ExtractionResponse(
@@ -386,10 +407,21 @@ async def batch_process(tanque_row_ids: list[str]):
         logger.warning("POST /batch/process rechazado: lista vacia")
         raise HTTPException(400, "Debe seleccionar al menos un tanque")
 
+    # POR QUE: una sola descarga de TABLE_DOCUMENTOS para todos los tanques
+    # (antes era una por tanque).
+    try:
+        docs_by_tanque = await get_documentos_by_tanques(tanque_row_ids)
+        fetch_error = None
+    except Exception as e:
+        logger.error("  batch/process error consultando documentos: %s", e)
+        docs_by_tanque, fetch_error = {}, e
+
     results = []
     for row_id in tanque_row_ids:
         try:
-            docs = await get_documentos_by_tanque(row_id)
+            if fetch_error is not None:
+                raise fetch_error
+            docs = docs_by_tanque.get(row_id, [])
             pdf_urls = []
             for doc in docs:
                 urls = doc.get("pdf_urls", [])
@@ -465,6 +497,7 @@ async def batch_extract(raw_request: Request):
         "skipped": 0,
         "errors": 0,
         "results": [],
+        "llm_usage": empty_usage(),
         "started_at": time.time(),
         "estimated_seconds": estimated_seconds,
     }
@@ -493,19 +526,20 @@ async def _run_batch(job_id: str, items: list) -> None:
     """Orquesta el procesamiento paralelo de un batch con semaforo de concurrencia."""
     job = _batch_jobs[job_id]
 
-    # UNA sola query a Glide: obtener todos los tanques indexados por row_id
-    tanques_cache: dict[str, dict] = {}
+    # UNA sola lectura del snapshot de tanques: row_ids con todos los campos de
+    # extraccion llenos (filtro columnar, sin armar un dict por tanque)
+    complete_ids: set[str] = set()
     try:
-        tanques_cache = await get_all_tanques_by_row_id()
-        logger.info("batch[%s] cache de %d tanques cargado", job_id[:8], len(tanques_cache))
+        complete_ids = await get_tanque_row_ids_with_fields(_EXTRACTION_FIELDS)
+        logger.info("batch[%s] %d tanques con todos los campos llenos", job_id[:8], len(complete_ids))
     except Exception as e:
-        logger.warning("batch[%s] no se pudo cargar cache: %s", job_id[:8], e)
+        logger.warning("batch[%s] no se pudo cargar tanques: %s", job_id[:8], e)
 
     semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_EXTRACTIONS)
 
     async def _process_with_semaphore(index: int, item) -> None:
         async with semaphore:
-            await _process_batch_item(job_id, index, item, tanques_cache)
+            await _process_batch_item(job_id, index, item, complete_ids)
 
     tasks = [_process_with_semaphore(i, item) for i, item in enumerate(items)]
     await asyncio.gather(*tasks)
@@ -513,8 +547,9 @@ async def _run_batch(job_id: str, items: list) -> None:
     job["status"] = "completed"
     elapsed = round(time.time() - job["started_at"], 1)
     logger.info(
-        "batch[%s] DONE — %d total, %d ok, %d skipped, %d errors, %.1fs elapsed",
+        "batch[%s] DONE — %d total, %d ok, %d skipped, %d errors, %.1fs elapsed, %d LLM calls, ~$%.4f",
         job_id[:8], job["total"], job["ok"], job["skipped"], job["errors"], elapsed,
+        job["llm_usage"]["calls"], job["llm_usage"]["cost_usd"],
     )
 
     # POR QUÉ: Solo limpiar jobs COMPLETADOS con >1 hora de antiguedad.
@@ -530,19 +565,17 @@ async def _run_batch(job_id: str, items: list) -> None:
 
 
 async def _process_batch_item(
-    job_id: str, index: int, item, tanques_cache: dict[str, dict],
+    job_id: str, index: int, item, complete_ids: set[str],
 ) -> None:
     """Procesa un solo PDF del batch: early skip → descarga → extraccion → guardado."""
     job = _batch_jobs[job_id]
     item_result = {"pdf_url": item.pdf_url, "id_activo": item.id_activo}
-    max_size = settings.MAX_PDF_SIZE_MB * 1024 * 1024
 
     try:
         # EARLY SKIP: verificar si el tanque ya tiene todos los campos llenos
         # ANTES de descargar o llamar al LLM (ahorra tokens y tiempo)
         if item.auto_save and item.id_activo:
-            existing = tanques_cache.get(item.id_activo, {})
-            if existing and _all_fields_filled(existing):
+            if item.id_activo in complete_ids:
                 item_result["status"] = "skipped"
                 item_result["saved"] = False
                 item_result["message"] = "Todos los campos ya tienen valor"
@@ -552,13 +585,10 @@ async def _process_batch_item(
                 job["skipped"] += 1
                 return
 
-        # Descargar PDF
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.get(item.pdf_url)
-            response.raise_for_status()
-
-        pdf_bytes = response.content
-        if len(pdf_bytes) > max_size:
+        # Descargar PDF (streaming, corta al superar MAX_PDF_SIZE_MB)
+        try:
+            pdf_file = await download_pdf(item.pdf_url)
+        except PDFTooLargeError:
             item_result["status"] = "error"
             item_result["error"] = f"PDF excede {settings.MAX_PDF_SIZE_MB}MB"
             job["results"].append(item_result)
@@ -572,10 +602,16 @@ async def _process_batch_item(
         if not filename.lower().endswith(".pdf"):
             filename += ".pdf"
 
-        # Extraer datos con LLM
-        result = await extract_from_pdf(pdf_bytes=pdf_bytes, filename=filename)
+        # Extraer datos con LLM (el archivo temporal se borra al salir del with)
+        with pdf_file:
+            result = await extract_from_pdf(
+                pdf_source=pdf_file.name, filename=filename, use_cache=not item.bypass_cache,
+            )
         serie = result.get("extraction", {}).get("serial_number")
         item_result["pdf_type"] = result.get("pdf_type")
+        item_result["cache_hit"] = result.get("cache_hit", False)
+        item_result["llm_usage"] = result["llm_usage"]
+        merge_usage(job["llm_usage"], result["llm_usage"])
         item_result["serie_extraida"] = serie
         item_result["extraction"] = result.get("extraction")
 
@@ -589,7 +625,11 @@ async def _process_batch_item(
                 save_data = {k: v for k, v in save_data.items() if v is not None}
 
                 # Proteccion: solo llenar campos vacios
-                existing = tanques_cache.get(item.id_activo, {})
+                try:
+                    existing = await get_tanque_by_row_id(item.id_activo) or {}
+                except Exception as e:
+                    logger.warning("  batch[%d] no se pudo leer el tanque %s: %s", index, item.id_activo, e)
+                    existing = {}
                 if existing:
                     original_count = len(save_data)
                     save_data = _filter_empty_fields(save_data, existing)
@@ -684,7 +724,7 @@ async def batch_status(job_id: str):
     """Consulta el progreso de un batch en procesamiento.
 
     Retorna status (processing/completed), progreso, tiempo transcurrido,
-    estimado restante, y resultados parciales.
+    estimado restante, tokens y costo estimado del LLM acumulados, y resultados parciales.
     """
     job = _batch_jobs.get(job_id)
     if not job:
@@ -703,6 +743,7 @@ async def batch_status(job_id: str):
         "errors": job["errors"],
         "elapsed_seconds": elapsed,
         "estimated_remaining_seconds": round(remaining, 1),
+        "llm_usage": job["llm_usage"],
         "results": job["results"],
     }
 
@@ -729,3 +770,45 @@ async def get_backlog_stats():
     summary = get_backlog_summary()
     logger.info("GET /backlog/summary OK — %d entradas totales", summary["total"])
     return summary
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Hits/misses y ocupacion de los caches de imagenes de pagina, de resultados, de
+    los snapshots de tablas de Glide y del mirror SQLite."""
+    logger.info("GET /cache/stats")
+    return {
+        # El primer acceso al cache de paginas escanea el directorio
+        "page_images": await asyncio.to_thread(cache_stats),
+        "results": result_cache_stats(),
+        "glide_tables": snapshot_stats(),
+        "glide_mirror": mirror_stats(),
+    }
+
+
+@router.get("/glide/stats")
+async def get_glide_stats():
+    """Latencia de las llamadas a Glide por endpoint (queryTables, mutateTables)."""
+    logger.info("GET /glide/stats")
+    return glide_stats()
+
+
+@router.get("/downloads/stats")
+async def get_download_stats():
+    """Descargas de PDFs por URL: cantidad, MB, tiempos y rechazos por tamano."""
+    logger.info("GET /downloads/stats")
+    return download_stats()
+
+
+@router.get("/llm/budgets")
+async def get_llm_budgets():
+    """Presupuesto de tokens y reasoning effort vigente por u1a_method (config + auto-ajuste)."""
+    logger.info("GET /llm/budgets")
+    return await budget_overview()
+
+
+@router.get("/llm/rate-limits")
+async def get_llm_rate_limits():
+    """Ultimos rate limits informados por OpenAI, llamadas en cola, 429 y reintentos."""
+    logger.info("GET /llm/rate-limits")
+    return rate_limit_stats()
@@ -3,21 +3,38 @@ Orquestacion del pipeline de extraccion ASME y persistencia en Glide.
 - Finalidad: Coordina auto-deteccion de tipo, conversion PDF→imagenes, llamada LLM,
   verificacion de duplicados en Glide, y guardado de datos confirmados.
   Pipeline TYPE_2 de 3 niveles (texto → escaneado → brute force) con retry automatico.
+  El PDF se abre una sola vez por request (PdfDocumentSession) y se comparte por todas las etapas.
+  Las etapas CPU-bound (deteccion, seleccion de paginas, render) corren en el pool de procesos.
+  Resultados cacheados por contenido del PDF + prompts + modelo (result_cache.py).
 - Consume: validators.py (detect_pdf_type, find_u1a_page, find_scanned_pages),
-  pdf_to_images.py (pdf_pages_to_base64, get_page_count),
-  llm_extractor.py, schemas.py, backlog.py (log_extraction),
+  pdf_session.py (PdfDocumentSession), pdf_to_images.py (render_pages),
+  pdf_workers.py (run_pdf_stage), result_cache.py (get_result, put_result),
+  llm_extractor.py, budgets.py (get_budget), llm_costs.py (sum_usage), schemas.py,
+  backlog.py (log_extraction),
   glide/repository.py (create, update, get_tanque_by_serie, get_all_tanques_by_serie)
 - Consumido por: router.py
 """
 
+import asyncio
 import logging
+import os
 import re
 import time
 
+from app.config import get_settings
+from app.features.extraction import result_cache
 from app.features.extraction.backlog import log_extraction
+from app.features.extraction.budgets import get_budget
 from app.schemas import ExtractionResult
+from app.features.extraction.llm_costs import sum_usage
 from app.features.extraction.llm_extractor import detect_type_with_vision, extract_with_llm
-from app.features.extraction.pdf_to_images import get_page_count, pdf_pages_to_base64
+from app.features.extraction.pdf_session import PdfDocumentSession
+from app.features.extraction.pdf_to_images import (
+    image_encoding_label,
+    render_pages,
+    roi_crop_enabled,
+)
+from app.features.extraction.pdf_workers import run_pdf_stage
 from app.features.extraction.validators import (
     PDFTypeError,
     detect_pdf_type,
@@ -32,6 +49,7 @@ from app.features.glide.repository import (
 )
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 # POR QUE: 14 campos que el LLM debe extraer. Si muchos son null, la extraccion
 # se considera incompleta y se reintenta con mas paginas (solo TYPE_2).
@@ -69,7 +87,7 @@ def _get_pages_for_type1() -> list[int]:
     return [0, 1]
 
 
-def _get_pages_for_type2(pdf_bytes: bytes) -> tuple[list[int], str]:
+def _get_pages_for_type2(pdf: PdfDocumentSession) -> tuple[list[int], str]:
     """Paginas para Type 2 con pipeline de 3 niveles: texto → escaneado → brute force.
 
     Returns:
@@ -78,7 +96,7 @@ def _get_pages_for_type2(pdf_bytes: bytes) -> tuple[list[int], str]:
     pages = [1, 7]  # Pagina 2 = index 1 (DATOS DEL PRODUCTO), Pagina 8 = index 7 (FECHA INSPECCION)
 
     # Nivel 1: Buscar U-1A por texto extraible (mas preciso)
-    u1a_page = find_u1a_page(pdf_bytes)
+    u1a_page = find_u1a_page(pdf)
     if u1a_page is not None:
         pages.extend([u1a_page, u1a_page + 1])
         logger.info(
@@ -88,7 +106,7 @@ def _get_pages_for_type2(pdf_bytes: bytes) -> tuple[list[int], str]:
         return pages, "text"
 
     # Nivel 2: Buscar paginas escaneadas en la 2da mitad (fallback para U-1A sin texto)
-    scanned = find_scanned_pages(pdf_bytes)
+    scanned = find_scanned_pages(pdf)
     if scanned:
         pages.extend(scanned)
         logger.info(
@@ -98,7 +116,7 @@ def _get_pages_for_type2(pdf_bytes: bytes) -> tuple[list[int], str]:
         return pages, "scanned"
 
     # Nivel 3: Brute force — ultimas N paginas como red de seguridad
-    total = get_page_count(pdf_bytes)
+    total = pdf.page_count
     brute_pages = list(range(max(total - BRUTE_FORCE_LAST_PAGES, 0), total))
     for p in brute_pages:
         if p not in pages:
@@ -111,39 +129,165 @@ def _get_pages_for_type2(pdf_bytes: bytes) -> tuple[list[int], str]:
 
 
 async def extract_from_pdf(
-    pdf_bytes: bytes,
+    pdf_source: bytes | str | os.PathLike,
     filename: str,
+    use_cache: bool = True,
 ) -> dict:
     """Extrae datos de un PDF ASME sin guardar. Auto-detecta tipo.
 
+    pdf_source es una ruta a archivo (preferido: el PDF no se carga entero en
+    memoria) o los bytes del PDF.
+
+    Con use_cache=True reutiliza un resultado previo del mismo PDF bajo los
+    mismos prompts, modelo y seleccion de paginas (ver result_cache.py).
+    La verificacion de duplicados en Glide y el backlog se hacen siempre.
+
     Returns:
         Dict con: pdf_type, filename, extraction (datos extraidos),
-        duplicate_found, existing_data (si el serial ya existe en Glide).
+        duplicate_found, existing_data (si el serial ya existe en Glide), cache_hit,
+        llm_usage (tokens y costo estimado de las llamadas al LLM).
     """
     start_time = time.monotonic()
 
+    with PdfDocumentSession(pdf_source) as pdf:
+        # POR QUE: hashear el PDF (hasta 50 MB) y leer/escribir el cache de
+        # resultados es I/O de disco; en el event loop frenaria a los demas requests.
+        sha256 = await asyncio.to_thread(getattr, pdf, "sha256")
+        key = result_cache.cache_key(sha256, _page_selection_signature())
+        outcome = await asyncio.to_thread(result_cache.get_result, key) if use_cache else None
+        cache_hit = outcome is not None
+        if cache_hit:
+            logger.info("Cache de resultados: hit para %s (%s)", filename, outcome["cached_at"])
+        else:
+            outcome = await _run_pipeline(pdf, filename)
+
+    result: ExtractionResult = outcome["result"]
+    extracted_count, null_fields = _validate_extraction(result)
+    pages = outcome["pages"]
+    llm_calls = [] if cache_hit else outcome.get("llm_calls", [])
+
+    # POR QUE: Extracciones "failed" no se cachean: suelen ser errores
+    # transitorios del LLM y el usuario las reintenta esperando otro resultado.
+    if not cache_hit and extracted_count >= 5:
+        await asyncio.to_thread(result_cache.put_result, key, outcome)
+
+    response = {
+        "pdf_type": outcome["pdf_type"],
+        "filename": filename,
+        "extraction": result.model_dump(),
+        "duplicate_found": False,
+        "existing_data": None,
+        "u1a_method": outcome["u1a_method"],
+        "pages_sent": [p + 1 for p in pages],
+        "fields_extracted": extracted_count,
+        "fields_null": null_fields,
+        "retry_used": outcome["retry_used"],
+        "image_tiles": outcome["image_tiles"],
+        "image_tokens_estimate": outcome["image_tokens_estimate"],
+        "cache_hit": cache_hit,
+        "cached_at": outcome.get("cached_at"),
+        # Un cache hit no llamo al LLM: costo 0, no el del run original
+        "llm_usage": sum_usage(llm_calls),
+    }
+
+    if result.serial_number:
+        serials = expand_serial_range(result.serial_number)
+        if len(serials) > 1:
+            response["is_range"] = True
+            response["range_count"] = len(serials)
+            response["range_serials"] = serials
+            logger.info("Rango detectado: %s → %d tanques", result.serial_number, len(serials))
+        else:
+            existing = await get_tanque_by_serie(result.serial_number)
+            if existing:
+                response["duplicate_found"] = True
+                response["existing_data"] = existing
+                logger.info(
+                    "Duplicado encontrado: serie=%s, rowID=%s",
+                    result.serial_number,
+                    existing.get("row_id"),
+                )
+
+    # POR QUE: Registrar cada extraccion en el backlog para analisis posterior.
+    # Categorias: ok (10+ campos), incomplete (5-9), failed (<5).
+    elapsed = round(time.monotonic() - start_time, 2)
+    if extracted_count >= 10:
+        category = "ok"
+    elif extracted_count >= 5:
+        category = "incomplete"
+    else:
+        category = "failed"
+
+    log_extraction({
+        "filename": filename,
+        "pdf_type": outcome["pdf_type"],
+        "total_pages": outcome["total_pages"],
+        "u1a_method": outcome["u1a_method"],
+        "pages_sent": [p + 1 for p in pages],
+        "fields_extracted": extracted_count,
+        "fields_null": null_fields,
+        "retry_used": outcome["retry_used"],
+        "category": category,
+        "extraction_time_seconds": elapsed,
+        "serial_number": result.serial_number,
+        "cache_hit": cache_hit,
+        "image_encoding": outcome["image_encoding"],
+        "roi_crop": outcome["roi_crop"],
+        "image_bytes": outcome["image_bytes"],
+        "image_tiles": outcome["image_tiles"],
+        "image_tokens_estimate": outcome["image_tokens_estimate"],
+        "llm_calls": llm_calls,
+    })
+
+    return response
+
+
+def _page_selection_signature() -> str:
+    """Firma de la configuracion que decide que paginas ve el LLM (parte de la clave de cache)."""
+    return (
+        f"{settings.PDF_TEXT_BACKEND}:bf{BRUTE_FORCE_LAST_PAGES}"
+        f":null{MAX_NULL_FIELDS_THRESHOLD}"
+    )
+
+
+async def _run_pipeline(pdf: PdfDocumentSession, filename: str) -> dict:
+    """Deteccion de tipo, seleccion de paginas, render y LLM (con retry) sobre un PDF abierto.
+
+    Returns:
+        Dict con result (ExtractionResult), pdf_type, u1a_method, pages (0-indexed),
+        retry_used, total_pages, metadata de imagenes y llm_calls (metricas por
+        llamada al LLM: detect, extract, retry). Es lo que guarda result_cache.
+    """
+    # Metricas por llamada al LLM (ttft, duracion, finish_reason, tokens, costo) para el backlog
+    llm_calls: list[dict] = []
+
     try:
-        pdf_type = detect_pdf_type(pdf_bytes)
+        pdf_type = await run_pdf_stage(detect_pdf_type, pdf)
         logger.info("Auto-detected PDF type: %s for %s (text)", pdf_type, filename)
     except PDFTypeError:
         logger.warning("Text detection failed for %s, falling back to vision AI", filename)
-        page1_images = pdf_pages_to_base64(pdf_bytes, [0])
+        page1_images = await render_pages(pdf, [0])
         if not page1_images:
             raise ValueError("No se pudo convertir la pagina 1 a imagen")
-        pdf_type = await detect_type_with_vision(page1_images[0])
+        llm_calls.append({"stage": "detect"})
+        pdf_type = await detect_type_with_vision(page1_images[0], metrics=llm_calls[-1])
         logger.info("Auto-detected PDF type: %s for %s (vision)", pdf_type, filename)
 
     if pdf_type == "TYPE_1":
         pages = _get_pages_for_type1()
         u1a_method = "direct"
     else:
-        pages, u1a_method = _get_pages_for_type2(pdf_bytes)
+        pages, u1a_method = await run_pdf_stage(_get_pages_for_type2, pdf)
 
-    images_b64 = pdf_pages_to_base64(pdf_bytes, pages)
-    if not images_b64:
+    crop = roi_crop_enabled(pdf_type)
+    images = await render_pages(pdf, pages, crop)
+    if not images:
         raise ValueError("No se pudieron extraer imagenes del PDF")
 
-    result: ExtractionResult = await extract_with_llm(images_b64, pdf_type)
+    llm_calls.append({"stage": "extract"})
+    result: ExtractionResult = await extract_with_llm(
+        images, pdf_type, metrics=llm_calls[-1], budget=await get_budget(u1a_method),
+    )
     extracted_count, null_fields = _validate_extraction(result)
 
     # POR QUE: Retry solo para TYPE_2 cuando la extraccion es incompleta y aun
@@ -159,12 +303,18 @@ async def extract_from_pdf(
             "Extraccion incompleta (%d/%d campos null: %s), reintentando con brute force",
             len(null_fields), len(EXPECTED_FIELDS), null_fields,
         )
-        total = get_page_count(pdf_bytes)
+        total = pdf.page_count
         brute_pages = list(range(max(total - BRUTE_FORCE_LAST_PAGES, 0), total))
         retry_pages = sorted(set(pages + brute_pages))
-        retry_images = pdf_pages_to_base64(pdf_bytes, retry_pages)
+        # POR QUE: Las paginas ya enviadas en el primer intento salen del memo
+        # de la sesion; solo se renderizan las paginas nuevas del brute force.
+        retry_images = await render_pages(pdf, retry_pages, crop)
         if retry_images:
-            retry_result: ExtractionResult = await extract_with_llm(retry_images, pdf_type)
+            llm_calls.append({"stage": "retry"})
+            retry_result: ExtractionResult = await extract_with_llm(
+                retry_images, pdf_type, metrics=llm_calls[-1],
+                budget=await get_budget("retry_brute_force"),
+            )
             retry_count, retry_nulls = _validate_extraction(retry_result)
             retry_used = True
             if retry_count > extracted_count:
@@ -172,6 +322,7 @@ async def extract_from_pdf(
                 extracted_count = retry_count
                 null_fields = retry_nulls
                 pages = retry_pages
+                images = retry_images
                 u1a_method = "retry_brute_force"
                 logger.info(
                     "Retry mejoro extraccion: %d/%d campos",
@@ -189,63 +340,21 @@ async def extract_from_pdf(
             extracted_count, len(EXPECTED_FIELDS), null_fields,
         )
 
-    response = {
+    return {
+        "result": result,
         "pdf_type": pdf_type,
-        "filename": filename,
-        "extraction": result.model_dump(),
-        "duplicate_found": False,
-        "existing_data": None,
         "u1a_method": u1a_method,
-        "pages_sent": [p + 1 for p in pages],
-        "fields_extracted": extracted_count,
-        "fields_null": null_fields,
+        "pages": pages,
         "retry_used": retry_used,
+        "total_pages": pdf.page_count,
+        "image_encoding": image_encoding_label(crop),
+        "roi_crop": crop,
+        "image_bytes": [img.nbytes for img in images],
+        "image_tiles": [img.tiles for img in images],
+        "image_tokens_estimate": sum(img.tokens_estimate for img in images),
+        "llm_calls": llm_calls,
     }
 
-    if result.serial_number:
-        serials = expand_serial_range(result.serial_number)
-        if len(serials) > 1:
-            response["is_range"] = True
-            response["range_count"] = len(serials)
-            response["range_serials"] = serials
-            logger.info("Rango detectado: %s → %d tanques", result.serial_number, len(serials))
-        else:
-            existing = await get_tanque_by_serie(result.serial_number)
-            if existing:
-                response["duplicate_found"] = True
-                response["existing_data"] = existing
-                logger.info(
-                    "Duplicado encontrado: serie=%s, rowID=%s",
-                    result.serial_number,
-                    existing.get("row_id"),
-                )
-
-    # POR QUE: Registrar cada extraccion en el backlog para analisis posterior.
-    # Categorias: ok (10+ campos), incomplete (5-9), failed (<5).
-    elapsed = round(time.monotonic() - start_time, 2)
-    if extracted_count >= 10:
-        category = "ok"
-    elif extracted_count >= 5:
-        category = "incomplete"
-    else:
-        category = "failed"
-
-    log_extraction({
-        "filename": filename,
-        "pdf_type": pdf_type,
-        "total_pages": get_page_count(pdf_bytes),
-        "u1a_method": u1a_method,
-        "pages_sent": [p + 1 for p in pages],
-        "fields_extracted": extracted_count,
-        "fields_null": null_fields,
-        "retry_used": retry_used,
-        "category": category,
-        "extraction_time_seconds": elapsed,
-        "serial_number": result.serial_number,
-    })
-
-    return response
-
 
 def expand_serial_range(serial: str) -> list[str]:
     """Expande un rango de seriales como 'M1744629-M1744662' en una lista.
@@ -319,32 +428,49 @@ async def save_to_glide(data: dict, row_id: str | None = None) -> dict:
     # POR QUE: Cargamos TODOS los tanques de Glide en 1 sola llamada HTTP.
     # Sin cache, un rango de 34 seriales haria 34 queries (cada una trae la tabla
     # entera). Con cache: 1 query + dict lookup instantaneo por serie.
-    tanques_cache: dict[str, dict] = {}
+    lookup_errors: set[str] = set()
     try:
         tanques_cache = await get_all_tanques_by_serie()
         logger.info("  Rango: cache de %d tanques cargado", len(tanques_cache))
     except Exception as e:
         logger.warning("  Rango: no se pudo cargar cache, consultando uno a uno: %s", e)
+        # POR QUE: Secuencial, antes de las mutaciones: sin snapshot vigente cada
+        # consulta descarga la tabla completa, y cientos en paralelo agotarian
+        # las conexiones a Glide (GLIDE_MAX_CONNECTIONS).
+        tanques_cache = {}
+        for s in serials:
+            try:
+                existing = await get_tanque_by_serie(s)
+            except Exception as e:
+                logger.error("  Rango: error en %s: %s", s, e)
+                lookup_errors.add(s)
+                continue
+            if existing:
+                tanques_cache[s] = existing
 
-    created = 0
-    updated = 0
-    errors = 0
-
-    for s in serials:
+    async def save_one(s: str) -> str:
+        if s in lookup_errors:
+            return "error"
         tanque_data = {**data, "serie": s}
         try:
-            existing = tanques_cache.get(s) if tanques_cache else await get_tanque_by_serie(s)
+            existing = tanques_cache.get(s)
             if existing:
                 await update_tanque(existing["row_id"], tanque_data)
                 logger.info("  Rango: actualizado %s (rowID=%s)", s, existing["row_id"])
-                updated += 1
-            else:
-                await create_tanque(tanque_data)
-                logger.info("  Rango: creado %s", s)
-                created += 1
+                return "updated"
+            await create_tanque(tanque_data)
+            logger.info("  Rango: creado %s", s)
+            return "created"
         except Exception as e:
             logger.error("  Rango: error en %s: %s", s, e)
-            errors += 1
+            return "error"
+
+    # POR QUE: Concurrentes para que la cola de mutaciones de glide/client.py
+    # las junte: un rango de 34 seriales sale en 1 mutateTables, no en 34.
+    outcomes = await asyncio.gather(*(save_one(s) for s in serials))
+    created = outcomes.count("created")
+    updated = outcomes.count("updated")
+    errors = outcomes.count("error")
 
     logger.info(
         "Rango %s completado: %d creados, %d actualizados, %d errores",
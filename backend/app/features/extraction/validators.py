@@ -1,18 +1,25 @@
 """
 Auto-deteccion de tipo de PDF y utilidades de texto para PDFs ASME.
-- Finalidad: Usa pdfplumber para leer texto de paginas, auto-detectar tipo de PDF
-  (TYPE_1 U-1A directo o TYPE_2 Certificado de Inspeccion), buscar U-1A embebido
-  por texto, y detectar paginas escaneadas (sin texto) como fallback para U-1A.
-- Consume: nada interno (solo pdfplumber)
+- Finalidad: Lee texto de paginas, auto-detecta tipo de PDF (TYPE_1 U-1A directo
+  o TYPE_2 Certificado de Inspeccion), busca U-1A embebido por texto, y detecta
+  paginas escaneadas (sin texto) como fallback para U-1A.
+  Backend de texto intercambiable (TEXT_BACKENDS): "pdfium" (text page nativo, default)
+  o "pdfplumber" (layout analysis en Python, fallback). El texto de cada pagina se
+  memoiza en la sesion del PDF (se extrae una sola vez).
+- Consume: config.py (PDF_TEXT_BACKEND), pdf_session.py (PdfDocumentSession)
 - Consumido por: service.py (auto-detect + busqueda U-1A + scanned pages), router.py (PDFTypeError)
 """
 
-import io
 import logging
+from typing import Callable
 
-import pdfplumber
+import pypdfium2 as pdfium
+
+from app.config import get_settings
+from app.features.extraction.pdf_session import PdfDocumentSession
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 # POR QUE: Paginas con menos de este umbral de caracteres se consideran
 # escaneadas (imagenes sin OCR). 50 chars filtra paginas con solo numeros
@@ -26,16 +33,61 @@ class PDFTypeError(Exception):
     pass
 
 
-def extract_text_from_page(pdf_bytes: bytes, page_number: int) -> str:
-    """Extrae texto de una pagina especifica del PDF."""
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        if page_number >= len(pdf.pages):
+def _pdfplumber_page_text(pdf: PdfDocumentSession, page_number: int) -> str:
+    """Texto via pdfplumber (layout analysis completo, lento en PDFs largos)."""
+    return pdf.plumber_doc.pages[page_number].extract_text() or ""
+
+
+def _pdfium_page_text(pdf: PdfDocumentSession, page_number: int) -> str:
+    """Texto via text page nativo de pdfium. Paginas sin caracteres retornan sin leer."""
+    page = pdf.pdfium_doc[page_number]
+    textpage = page.get_textpage()
+    try:
+        if textpage.count_chars() == 0:
             return ""
-        page = pdf.pages[page_number]
-        return page.extract_text() or ""
+        # POR QUE: pdfium separa lineas con \r\n; normalizamos a \n como pdfplumber.
+        return textpage.get_text_bounded().replace("\r\n", "\n")
+    finally:
+        textpage.close()
+
+
+TEXT_BACKENDS: dict[str, Callable[[PdfDocumentSession, int], str]] = {
+    "pdfium": _pdfium_page_text,
+    "pdfplumber": _pdfplumber_page_text,
+}
+
+
+def _page_text(pdf: PdfDocumentSession, page_number: int) -> str:
+    """Lee texto con el backend de la sesion; si pdfium falla, cae a pdfplumber."""
+    backend = pdf.text_backend or settings.PDF_TEXT_BACKEND
+    if backend not in TEXT_BACKENDS:
+        logger.warning("PDF_TEXT_BACKEND desconocido '%s', usando pdfplumber", backend)
+        backend = "pdfplumber"
+
+    if backend == "pdfium":
+        try:
+            return _pdfium_page_text(pdf, page_number)
+        except pdfium.PdfiumError as e:
+            logger.warning(
+                "pdfium no pudo leer texto de pagina %d (%s), usando pdfplumber",
+                page_number + 1, e,
+            )
+            return _pdfplumber_page_text(pdf, page_number)
+    return TEXT_BACKENDS[backend](pdf, page_number)
+
 
+def extract_text_from_page(pdf: PdfDocumentSession, page_number: int) -> str:
+    """Extrae texto de una pagina especifica del PDF (memoizado en la sesion)."""
+    text = pdf.texts.get(page_number)
+    if text is None:
+        if page_number >= pdf.page_count:
+            return ""
+        text = _page_text(pdf, page_number)
+        pdf.texts[page_number] = text
+    return text
 
-def detect_pdf_type(pdf_bytes: bytes) -> str:
+
+def detect_pdf_type(pdf: PdfDocumentSession) -> str:
     """Detecta si es TYPE_1 (U-1A directo) o TYPE_2 (Certificado de Inspeccion).
 
     Returns:
@@ -44,7 +96,7 @@ def detect_pdf_type(pdf_bytes: bytes) -> str:
     Raises:
         PDFTypeError si no se puede determinar el tipo.
     """
-    text_page1 = extract_text_from_page(pdf_bytes, 0)
+    text_page1 = extract_text_from_page(pdf, 0)
     text_upper = text_page1.upper()
     # POR QUE: Texto sin espacios para detectar palabras rotas por OCR
     # (ej: "CE RTIFICADO" -> "CERTIFICADO")
@@ -68,7 +120,7 @@ def detect_pdf_type(pdf_bytes: bytes) -> str:
     )
 
 
-def find_u1a_page(pdf_bytes: bytes) -> int | None:
+def find_u1a_page(pdf: PdfDocumentSession) -> int | None:
     """Busca la pagina que contiene el FORM U-1A embebido en PDFs tipo 2.
 
     Usa dos estrategias: texto normal y texto compacto (anti-OCR).
@@ -77,31 +129,31 @@ def find_u1a_page(pdf_bytes: bytes) -> int | None:
     Returns:
         Numero de pagina (0-indexed) o None si no se encuentra.
     """
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        start = min(5, len(pdf.pages))
-        for i in range(start, len(pdf.pages)):
-            text = (pdf.pages[i].extract_text() or "").upper()
-            compact = text.replace(" ", "")
-
-            has_u1a = (
-                "FORM U-1A" in text
-                or "MANUFACTURER'S DATA REPORT" in text
-                or "FORMU-1A" in compact
-                or ("MANUFACTURER" in compact and "DATAREPORT" in compact)
-            )
-            has_fields = (
-                "MAWP" in text
-                or "SHELL:" in text
-                or "HEADS:" in text
-                or "MAWP" in compact
-            )
-            if has_u1a and has_fields:
-                logger.info("find_u1a_page: encontrado en pagina %d (texto)", i + 1)
-                return i
+    total = pdf.page_count
+    start = min(5, total)
+    for i in range(start, total):
+        text = extract_text_from_page(pdf, i).upper()
+        compact = text.replace(" ", "")
+
+        has_u1a = (
+            "FORM U-1A" in text
+            or "MANUFACTURER'S DATA REPORT" in text
+            or "FORMU-1A" in compact
+            or ("MANUFACTURER" in compact and "DATAREPORT" in compact)
+        )
+        has_fields = (
+            "MAWP" in text
+            or "SHELL:" in text
+            or "HEADS:" in text
+            or "MAWP" in compact
+        )
+        if has_u1a and has_fields:
+            logger.info("find_u1a_page: encontrado en pagina %d (texto)", i + 1)
+            return i
     return None
 
 
-def find_scanned_pages(pdf_bytes: bytes) -> list[int]:
+def find_scanned_pages(pdf: PdfDocumentSession) -> list[int]:
     """Detecta paginas escaneadas (imagenes sin texto extraible) en la segunda mitad del PDF.
 
     Busca paginas con muy poco texto (< SCANNED_PAGE_TEXT_THRESHOLD chars).
@@ -111,15 +163,15 @@ def find_scanned_pages(pdf_bytes: bytes) -> list[int]:
         Lista de page indexes (0-indexed), maximo 4 elementos.
     """
     scanned = []
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        total = len(pdf.pages)
-        # POR QUE: Buscamos desde la mitad del PDF porque el U-1A embebido
-        # siempre esta en la segunda mitad (paginas finales del certificado)
-        start = total // 2
-        for i in range(start, total):
-            text = pdf.pages[i].extract_text() or ""
-            if len(text.strip()) < SCANNED_PAGE_TEXT_THRESHOLD:
-                scanned.append(i)
+    total = pdf.page_count
+    # POR QUE: Buscamos desde la mitad del PDF porque el U-1A embebido
+    # siempre esta en la segunda mitad (paginas finales del certificado).
+    # Las paginas ya leidas por find_u1a_page salen del memo de la sesion.
+    start = total // 2
+    for i in range(start, total):
+        text = extract_text_from_page(pdf, i)
+        if len(text.strip()) < SCANNED_PAGE_TEXT_THRESHOLD:
+            scanned.append(i)
 
     if scanned:
         logger.info(
@@ -2,11 +2,23 @@
 Cliente HTTP para Glide API (queryTables + mutateTables).
 - Finalidad: Encapsula las llamadas REST a Glide con retry, backoff y column mapping.
   Provee funciones genericas query/mutate que el repository consume.
-- Consume: config.py (GLIDE_APP_ID, GLIDE_API_TOKEN)
-- Consumido por: glide/repository.py
+  Un solo httpx.AsyncClient compartido (keep-alive, HTTP/2 si h2 esta instalado,
+  limite de conexiones), creado en el lifespan. Metricas de latencia por endpoint.
+  Cola de escritura: enqueue_mutation junta las mutaciones concurrentes (rangos,
+  items de batch en paralelo) durante GLIDE_MUTATION_LINGER_MS y las envia en
+  llamadas de hasta MAX_MUTATIONS_PER_CALL; cada llamador recibe su resultado
+  (rowID) o su propio error.
+- Consume: config.py (GLIDE_APP_ID, GLIDE_API_TOKEN, GLIDE_MAX_CONNECTIONS,
+  GLIDE_TIMEOUT_SECONDS, GLIDE_HTTP2, GLIDE_MUTATION_LINGER_MS)
+- Consumido por: glide/repository.py, main.py (start/close en lifespan),
+  router.py (/glide/stats)
 """
 
+import asyncio
+import importlib.util
 import logging
+import time
+from collections import deque
 from typing import Any
 
 import httpx
@@ -53,6 +65,103 @@ _TANQUE_COLUMNS_INV = {v: k for k, v in TANQUE_COLUMNS.items()}
 _DOCUMENTO_COLUMNS_INV = {v: k for k, v in DOCUMENTO_COLUMNS.items()}
 
 
+_client: httpx.AsyncClient | None = None
+
+# Metricas por endpoint (queryTables/mutateTables) desde el arranque.
+# latencies_ms guarda las ultimas 500 para percentiles.
+_metrics: dict[str, dict] = {}
+
+# Cola de mutaciones: (mutation, future del llamador) pendientes de envio
+_pending_mutations: list[tuple[dict, asyncio.Future]] = []
+_flush_task: asyncio.Task | None = None
+_queue_stats = {"mutations": 0, "calls": 0, "max_batch": 0, "splits": 0, "failed": 0}
+# Status que pueden deberse a una sola mutacion del lote
+_SPLITTABLE_STATUS = (400, 422)
+
+
+def start_glide_client() -> None:
+    """Crea el cliente HTTP compartido para Glide (idempotente)."""
+    global _client
+    if _client is not None:
+        return
+    http2 = settings.GLIDE_HTTP2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("GLIDE_HTTP2=true pero el paquete h2 no esta instalado, usando HTTP/1.1")
+        http2 = False
+    _client = httpx.AsyncClient(
+        base_url=GLIDE_API_BASE,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.GLIDE_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GLIDE_MAX_CONNECTIONS,
+        ),
+        timeout=settings.GLIDE_TIMEOUT_SECONDS,
+    )
+    logger.info(
+        "Cliente Glide creado: max_connections=%d, http2=%s",
+        settings.GLIDE_MAX_CONNECTIONS, http2,
+    )
+
+
+async def close_glide_client() -> None:
+    """Cierra el cliente compartido y sus conexiones."""
+    global _client
+    if _client is None:
+        return
+    # Mutaciones ya encoladas se envian antes de cerrar las conexiones
+    if _flush_task is not None and not _flush_task.done():
+        await _flush_task
+    await _client.aclose()
+    _client = None
+    logger.info("Cliente Glide cerrado")
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Cliente compartido. Fuera de la app (scripts) se crea al primer uso."""
+    if _client is None:
+        start_glide_client()
+    return _client
+
+
+def _record(endpoint: str, elapsed_ms: float, status: int | None) -> None:
+    """Registra la latencia de un POST (status None = error de conexion)."""
+    m = _metrics.setdefault(endpoint, {
+        "calls": 0, "errors": 0, "rate_limited": 0,
+        "total_ms": 0.0, "max_ms": 0.0, "latencies_ms": deque(maxlen=500),
+    })
+    m["calls"] += 1
+    if status is None or status >= 500:
+        m["errors"] += 1
+    elif status == 429:
+        m["rate_limited"] += 1
+    m["total_ms"] += elapsed_ms
+    m["max_ms"] = max(m["max_ms"], elapsed_ms)
+    m["latencies_ms"].append(elapsed_ms)
+
+
+def glide_stats() -> dict:
+    """Latencia por endpoint de Glide: llamadas, errores, promedio, p50/p95, max.
+    Incluye los contadores de la cola de mutaciones (mutation_queue)."""
+    stats = {}
+    for endpoint, m in _metrics.items():
+        latencies = sorted(m["latencies_ms"])
+        stats[endpoint] = {
+            "calls": m["calls"],
+            "errors": m["errors"],
+            "rate_limited": m["rate_limited"],
+            "avg_ms": round(m["total_ms"] / m["calls"], 1),
+            "p50_ms": round(latencies[len(latencies) // 2], 1),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95)], 1),
+            "max_ms": round(m["max_ms"], 1),
+        }
+    stats["mutation_queue"] = {
+        **_queue_stats,
+        "pending": len(_pending_mutations),
+        "avg_batch": round(_queue_stats["mutations"] / _queue_stats["calls"], 1) if _queue_stats["calls"] else None,
+    }
+    return stats
+
+
 def _headers() -> dict[str, str]:
     return {
         "Authorization": f"Bearer {settings.GLIDE_API_TOKEN}",
@@ -62,15 +171,20 @@ def _headers() -> dict[str, str]:
 
 async def _post_with_retry(endpoint: str, payload: dict) -> dict:
     """POST a Glide API con retry y backoff exponencial."""
-    import asyncio
-
-    url = f"{GLIDE_API_BASE}/{endpoint}"
+    client = _get_client()
     last_error = None
 
     for attempt in range(MAX_RETRIES):
+        start = time.perf_counter()
+        status = None
         try:
-            async with httpx.AsyncClient(timeout=30) as client:
-                response = await client.post(url, json=payload, headers=_headers())
+            try:
+                response = await client.post(endpoint, json=payload, headers=_headers())
+                status = response.status_code
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                _record(endpoint, elapsed_ms, status)
+            logger.debug("Glide %s → %d en %.0f ms", endpoint, status, elapsed_ms)
 
             if response.status_code == 429:
                 wait = RETRY_BACKOFF_BASE ** (attempt + 1)
@@ -168,6 +282,87 @@ async def mutate_table(mutations: list[dict]) -> list[dict]:
     return result
 
 
+async def enqueue_mutation(mutation: dict) -> Any:
+    """Encola una mutacion y espera su resultado.
+
+    Las mutaciones encoladas durante GLIDE_MUTATION_LINGER_MS se envian juntas
+    en un solo mutateTables (hasta MAX_MUTATIONS_PER_CALL).
+
+    Returns:
+        El resultado de Glide para esta mutacion (ej: {"rowID": ...} en add-row).
+
+    Raises:
+        RuntimeError / httpx.HTTPStatusError si Glide rechaza esta mutacion o
+        falla la llamada que la contenia.
+    """
+    global _flush_task
+    future = asyncio.get_running_loop().create_future()
+    _pending_mutations.append((mutation, future))
+    _queue_stats["mutations"] += 1
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_flush_mutations())
+    return await future
+
+
+async def _flush_mutations() -> None:
+    """Vacia la cola en llamadas de hasta MAX_MUTATIONS_PER_CALL."""
+    while _pending_mutations:
+        if len(_pending_mutations) < MAX_MUTATIONS_PER_CALL and settings.GLIDE_MUTATION_LINGER_MS > 0:
+            await asyncio.sleep(settings.GLIDE_MUTATION_LINGER_MS / 1000)
+        batch = _pending_mutations[:MAX_MUTATIONS_PER_CALL]
+        del _pending_mutations[:MAX_MUTATIONS_PER_CALL]
+        await _send_mutations(batch)
+
+
+async def _send_mutations(batch: list[tuple[dict, asyncio.Future]]) -> None:
+    # Llamadores cancelados antes del envio: su mutacion no sale
+    batch = [(m, f) for m, f in batch if not f.done()]
+    if not batch:
+        return
+    _queue_stats["calls"] += 1
+    _queue_stats["max_batch"] = max(_queue_stats["max_batch"], len(batch))
+    try:
+        results = await mutate_table([m for m, _ in batch])
+    except httpx.HTTPStatusError as e:
+        # POR QUE: un 400/422 rechaza la llamada completa por una sola mutacion
+        # invalida. Se parte el lote en mitades hasta aislarla, para que el
+        # error le llegue solo a su llamador (log2(500) ~ 9 niveles). 401/403/404
+        # (token, app ID) fallarian igual con cada mutacion: se falla el lote entero.
+        if e.response.status_code in _SPLITTABLE_STATUS and len(batch) > 1:
+            _queue_stats["splits"] += 1
+            mid = len(batch) // 2
+            await _send_mutations(batch[:mid])
+            await _send_mutations(batch[mid:])
+            return
+        _fail_mutations(batch, e)
+        return
+    except Exception as e:
+        _fail_mutations(batch, e)
+        return
+
+    if not isinstance(results, list) or len(results) != len(batch):
+        _fail_mutations(batch, RuntimeError(
+            f"Glide no retorno un resultado por mutacion ({len(batch)} enviadas): {results!r:.300}"
+        ))
+        return
+    for (_, future), result in zip(batch, results):
+        if future.done():
+            continue
+        if isinstance(result, dict) and result.get("error"):
+            _queue_stats["failed"] += 1
+            future.set_exception(RuntimeError(f"Glide rechazo la mutacion: {result['error']}"))
+        else:
+            future.set_result(result)
+
+
+def _fail_mutations(batch: list[tuple[dict, asyncio.Future]], error: Exception) -> None:
+    logger.error("Glide mutate: lote de %d mutaciones fallo: %s", len(batch), error)
+    for _, future in batch:
+        if not future.done():
+            _queue_stats["failed"] += 1
+            future.set_exception(error)
+
+
 def to_glide_columns(data: dict, column_map: dict) -> dict:
     """Convierte dict con nombres legibles a column codes de Glide.
 
@@ -0,0 +1,211 @@
+"""
+Mirror local en SQLite de las tablas de Glide (opcional).
+- Finalidad: Las native tables de Glide no tienen queries: cada refresco de los
+  snapshots de table_cache.py descargaba la tabla completa por la red. Con
+  GLIDE_MIRROR_SYNC_SECONDS > 0 una tarea de fondo descarga TABLE_TANQUES y
+  TABLE_DOCUMENTOS cada ese intervalo, compara el hash de cada row con el guardado
+  y aplica en SQLite solo los rows nuevos, cambiados o borrados. table_cache.py lee
+  del mirror (local, milisegundos) en lugar de Glide, y recarga su snapshot solo
+  cuando un sync aplico cambios (version). Las escrituras siguen yendo a Glide
+  (repository.py); el snapshot en memoria las refleja al instante y el mirror en
+  el siguiente sync. El archivo sobrevive reinicios: al arrancar se sirve lo ya
+  guardado mientras corre el primer sync. Una tabla cuyo ultimo sync exitoso supera
+  GLIDE_MIRROR_MAX_STALENESS_SECONDS deja de servirse (ready = False) y las
+  lecturas vuelven al camino de Glide con TTL hasta que un sync funcione.
+- Consume: config.py (GLIDE_MIRROR_PATH, GLIDE_MIRROR_SYNC_SECONDS,
+  GLIDE_MIRROR_MAX_STALENESS_SECONDS),
+  glide/client.py (query_table, TABLE_*)
+- Consumido por: glide/table_cache.py (ready, version, read_rows),
+  main.py (start/close en lifespan), extraction/router.py (/cache/stats)
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from app.config import get_settings
+from app.features.glide.client import TABLE_DOCUMENTOS, TABLE_TANQUES, query_table
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+MIRRORED_TABLES = (TABLE_TANQUES, TABLE_DOCUMENTOS)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    table_id TEXT NOT NULL,
+    row_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (table_id, row_id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    table_id TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL
+);
+"""
+
+_conn: sqlite3.Connection | None = None
+# POR QUE: la conexion se usa desde los threads de asyncio.to_thread
+_lock = threading.Lock()
+_sync_task: asyncio.Task | None = None
+# Epoch del ultimo sync exitoso por tabla (de esta ejecucion o de una anterior)
+_synced_at: dict[str, float] = {}
+# Se incrementa cuando un sync cambia la tabla; table_cache.py recarga al verlo
+_versions: dict[str, int] = {table: 0 for table in MIRRORED_TABLES}
+_stats: dict[str, dict] = {
+    table: {"syncs": 0, "sync_errors": 0, "inserted": 0, "updated": 0, "deleted": 0,
+            "last_sync_seconds": None, "last_synced_at": None}
+    for table in MIRRORED_TABLES
+}
+
+
+def enabled() -> bool:
+    return settings.GLIDE_MIRROR_SYNC_SECONDS > 0
+
+
+def start_mirror() -> None:
+    """Abre el mirror y lanza la tarea de sync (idempotente; no-op si esta desactivado)."""
+    global _conn, _sync_task
+    if not enabled() or _conn is not None:
+        return
+    path = Path(settings.GLIDE_MIRROR_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _conn = sqlite3.connect(path, check_same_thread=False)
+    _conn.execute("PRAGMA journal_mode=WAL")
+    _conn.executescript(_SCHEMA)
+    for table_id, synced_at in _conn.execute("SELECT table_id, synced_at FROM sync_state"):
+        if table_id in _versions:
+            _synced_at[table_id] = synced_at
+    _sync_task = asyncio.create_task(_sync_loop())
+    logger.info(
+        "Mirror Glide en %s: sync cada %.0fs, tablas ya sincronizadas=%d",
+        path, settings.GLIDE_MIRROR_SYNC_SECONDS, len(_synced_at),
+    )
+
+
+async def close_mirror() -> None:
+    """Detiene el sync y cierra la base."""
+    global _conn, _sync_task
+    if _sync_task is not None:
+        _sync_task.cancel()
+        try:
+            await _sync_task
+        except asyncio.CancelledError:
+            pass
+        _sync_task = None
+    if _conn is not None:
+        with _lock:
+            _conn.close()
+        _conn = None
+        _synced_at.clear()
+        logger.info("Mirror Glide cerrado")
+
+
+def ready(table: str) -> bool:
+    """True si el mirror esta activo y su ultimo sync de la tabla no supera la antiguedad maxima."""
+    if _conn is None or table not in _synced_at:
+        return False
+    # POR QUE: tras un reinicio con Glide caido (o token rotado) el archivo puede
+    # tener dias; sin este limite se serviria indefinidamente.
+    return time.time() - _synced_at[table] <= settings.GLIDE_MIRROR_MAX_STALENESS_SECONDS
+
+
+def version(table: str) -> int:
+    return _versions[table]
+
+
+async def read_rows(table: str) -> list[dict]:
+    """Rows de la tabla tal como los devolvio Glide en el ultimo sync."""
+    return await asyncio.to_thread(_read_rows, table)
+
+
+def _read_rows(table: str) -> list[dict]:
+    with _lock:
+        cursor = _conn.execute("SELECT data FROM rows WHERE table_id = ?", (table,))
+        return [json.loads(data) for (data,) in cursor]
+
+
+async def _sync_loop() -> None:
+    while True:
+        for table in MIRRORED_TABLES:
+            try:
+                await sync_table(table)
+            except Exception as e:
+                _stats[table]["sync_errors"] += 1
+                logger.warning("Mirror Glide: sync de %s fallo: %s", table, e)
+        await asyncio.sleep(settings.GLIDE_MIRROR_SYNC_SECONDS)
+
+
+async def sync_table(table: str) -> dict:
+    """Descarga la tabla de Glide y aplica al mirror solo las diferencias.
+
+    Returns:
+        Dict con inserted, updated y deleted de este sync.
+    """
+    started = time.monotonic()
+    rows = await query_table(table)
+    delta = await asyncio.to_thread(_apply_delta, table, rows)
+    stats = _stats[table]
+    stats["syncs"] += 1
+    for key, count in delta.items():
+        stats[key] += count
+    stats["last_sync_seconds"] = round(time.monotonic() - started, 2)
+    stats["last_synced_at"] = _synced_at[table] = time.time()
+    if any(delta.values()):
+        _versions[table] += 1
+        logger.info("Mirror Glide %s: %s", table, delta)
+    return delta
+
+
+def _apply_delta(table: str, rows: list[dict]) -> dict:
+    incoming: dict[str, tuple[str, str]] = {}
+    for row in rows:
+        row_id = row.get("$rowID")
+        if not row_id:
+            continue
+        data = json.dumps(row, sort_keys=True, ensure_ascii=False)
+        incoming[row_id] = (hashlib.sha1(data.encode("utf-8")).hexdigest(), data)
+
+    with _lock, _conn:
+        stored = dict(_conn.execute("SELECT row_id, hash FROM rows WHERE table_id = ?", (table,)))
+        changed = [
+            (table, row_id, row_hash, data)
+            for row_id, (row_hash, data) in incoming.items()
+            if stored.get(row_id) != row_hash
+        ]
+        deleted = [(table, row_id) for row_id in stored.keys() - incoming.keys()]
+        _conn.executemany(
+            "INSERT OR REPLACE INTO rows (table_id, row_id, hash, data) VALUES (?, ?, ?, ?)", changed,
+        )
+        _conn.executemany("DELETE FROM rows WHERE table_id = ? AND row_id = ?", deleted)
+        _conn.execute(
+            "INSERT OR REPLACE INTO sync_state (table_id, synced_at) VALUES (?, ?)", (table, time.time()),
+        )
+
+    inserted = sum(1 for _, row_id, _, _ in changed if row_id not in stored)
+    return {"inserted": inserted, "updated": len(changed) - inserted, "deleted": len(deleted)}
+
+
+def mirror_stats() -> dict:
+    """Estado del mirror por tabla: version, contadores de delta y ultimo sync."""
+    return {
+        "enabled": enabled(),
+        "path": settings.GLIDE_MIRROR_PATH if enabled() else None,
+        "sync_seconds": settings.GLIDE_MIRROR_SYNC_SECONDS,
+        "max_staleness_seconds": settings.GLIDE_MIRROR_MAX_STALENESS_SECONDS,
+        "tables": {
+            table: {
+                "ready": ready(table),
+                "version": _versions[table],
+                "age_seconds": round(time.time() - _synced_at[table], 1) if table in _synced_at else None,
+                **_stats[table],
+            }
+            for table in MIRRORED_TABLES
+        },
+    }
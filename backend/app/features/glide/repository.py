@@ -2,13 +2,24 @@
 Repositorio CRUD para tanques y documentos en Glide.
 - Finalidad: Operaciones de negocio sobre Glide (buscar por serie/row_id, crear, actualizar,
   listar tanques sin datos LIBRO DIGITAL, obtener documentos por tanque, bulk query).
-  Cache optimizado: get_all_tanques_by_serie() y get_all_tanques_by_row_id() para batch/rangos.
-- Consume: glide/client.py (query_table, mutate_table, column mapping, table IDs)
+  Cache optimizado: get_all_tanques_by_serie(), get_all_tanques_by_row_id() y
+  get_documentos_by_tanques() para batch/rangos. Listados y filtros de tanques usan
+  la tabla columnar del snapshot (tanque_table.py).
+  Las lecturas salen de los snapshots compartidos (table_cache.py, cargados de Glide
+  con TTL o del mirror SQLite de mirror.py si esta activo); las busquedas por serie,
+  row_id y tanque_row_id usan sus indices (O(1)).
+  create/update actualizan el snapshot de tanques apenas Glide confirma la mutacion.
+  Las mutaciones pasan por la cola de client.py (enqueue_mutation), que junta las
+  concurrentes en un solo mutateTables.
+- Consume: glide/client.py (enqueue_mutation, column mapping, table IDs),
+  glide/table_cache.py (get_rows, get_tanque_table, find, find_group, find_groups, apply_write),
+  glide/tanque_table.py (filled_mask, positions, records)
 - Consumido por: extraction/service.py, extraction/router.py
 """
 
 import logging
 
+from app.features.glide import table_cache, tanque_table
 from app.features.glide.client import (
     DOCUMENTO_COLUMNS,
     TABLE_DOCUMENTOS,
@@ -16,9 +27,8 @@ from app.features.glide.client import (
     TANQUE_COLUMNS,
     _DOCUMENTO_COLUMNS_INV,
     _TANQUE_COLUMNS_INV,
+    enqueue_mutation,
     from_glide_columns,
-    mutate_table,
-    query_table,
     to_glide_columns,
 )
 
@@ -31,11 +41,8 @@ async def get_tanque_by_row_id(row_id: str) -> dict | None:
     Returns:
         Dict con nombres legibles + row_id, o None si no existe.
     """
-    rows = await query_table(TABLE_TANQUES)
-    for row in rows:
-        if row.get("$rowID") == row_id:
-            return from_glide_columns(row, _TANQUE_COLUMNS_INV)
-    return None
+    row = await table_cache.find(TABLE_TANQUES, "$rowID", row_id)
+    return from_glide_columns(row, _TANQUE_COLUMNS_INV) if row is not None else None
 
 
 async def get_all_tanques_by_row_id() -> dict[str, dict]:
@@ -43,13 +50,20 @@ async def get_all_tanques_by_row_id() -> dict[str, dict]:
 
     Optimizado para batch: una sola query, retorna dict {row_id: datos}.
     """
-    rows = await query_table(TABLE_TANQUES)
-    result = {}
-    for row in rows:
-        rid = row.get("$rowID")
-        if rid:
-            result[rid] = from_glide_columns(row, _TANQUE_COLUMNS_INV)
-    return result
+    table = await table_cache.get_tanque_table()
+    rows = tanque_table.positions(tanque_table.filled_mask(table, ("row_id",)))
+    return {t["row_id"]: t for t in tanque_table.records(table, rows)}
+
+
+async def get_tanque_row_ids_with_fields(fields: list[str]) -> set[str]:
+    """row_ids de los tanques con todos los campos indicados (nombres legibles) con valor.
+
+    Filtro columnar sobre el snapshot: no arma un dict por tanque.
+    """
+    table = await table_cache.get_tanque_table()
+    mask = tanque_table.filled_mask(table, ("row_id", *fields))
+    row_ids = table["columns"]["row_id"]
+    return {row_ids[i] for i in tanque_table.positions(mask)}
 
 
 async def get_all_tanques_by_serie() -> dict[str, dict]:
@@ -57,13 +71,9 @@ async def get_all_tanques_by_serie() -> dict[str, dict]:
 
     Optimizado para rangos: una sola query, retorna dict {serie: datos}.
     """
-    rows = await query_table(TABLE_TANQUES)
-    result = {}
-    for row in rows:
-        serie = row.get("Name")
-        if serie:
-            result[serie] = from_glide_columns(row, _TANQUE_COLUMNS_INV)
-    return result
+    table = await table_cache.get_tanque_table()
+    rows = tanque_table.positions(tanque_table.filled_mask(table, ("serie",)))
+    return {t["serie"]: t for t in tanque_table.records(table, rows)}
 
 
 async def get_tanque_by_serie(serie: str) -> dict | None:
@@ -72,11 +82,8 @@ async def get_tanque_by_serie(serie: str) -> dict | None:
     Returns:
         Dict con nombres legibles + row_id, o None si no existe.
     """
-    rows = await query_table(TABLE_TANQUES)
-    for row in rows:
-        if row.get("Name") == serie:
-            return from_glide_columns(row, _TANQUE_COLUMNS_INV)
-    return None
+    row = await table_cache.find(TABLE_TANQUES, TANQUE_COLUMNS["serie"], serie)
+    return from_glide_columns(row, _TANQUE_COLUMNS_INV) if row is not None else None
 
 
 async def create_tanque(data: dict) -> str:
@@ -97,19 +104,19 @@ async def create_tanque(data: dict) -> str:
         "tableName": TABLE_TANQUES,
         "columnValues": glide_data,
     }
-    result = await mutate_table([mutation])
+    result = await enqueue_mutation(mutation)
 
-    first = result[0] if result else None
-    if isinstance(first, dict):
-        row_id = first.get("rowID")
-    elif isinstance(first, str):
-        row_id = first
+    if isinstance(result, dict):
+        row_id = result.get("rowID")
+    elif isinstance(result, str):
+        row_id = result
     else:
         row_id = None
 
     if not row_id:
         raise RuntimeError(f"Glide no retorno rowID al crear tanque: {result}")
 
+    table_cache.apply_write(TABLE_TANQUES, row_id, glide_data)
     logger.info("Tanque creado en Glide: serie=%s, rowID=%s", data.get("serie"), row_id)
     return row_id
 
@@ -135,7 +142,8 @@ async def update_tanque(row_id: str, data: dict) -> bool:
         "rowID": row_id,
         "columnValues": glide_data,
     }
-    await mutate_table([mutation])
+    await enqueue_mutation(mutation)
+    table_cache.apply_write(TABLE_TANQUES, row_id, glide_data)
     logger.info("Tanque actualizado en Glide: rowID=%s, campos=%s", row_id, list(glide_data.keys()))
     return True
 
@@ -146,21 +154,22 @@ async def list_tanques() -> list[dict]:
     Returns:
         Lista de dicts con nombres legibles + row_id.
     """
-    rows = await query_table(TABLE_TANQUES)
-    return [from_glide_columns(row, _TANQUE_COLUMNS_INV) for row in rows]
+    return tanque_table.records(await table_cache.get_tanque_table())
 
 
 async def get_tanques_sin_libro_digital() -> list[dict]:
     """Lista tanques que tienen serie pero campos LIBRO DIGITAL vacios.
 
     Un tanque sin libro digital es aquel donde el campo fabricante (iP4yR)
-    no tiene valor. Glide no retorna campos vacios, asi que filtramos en Python.
+    no tiene valor. Glide no retorna campos vacios, asi que filtramos en Python
+    (bitmaps de la tabla columnar; solo se arman dicts para los pendientes).
 
     Returns:
         Lista de dicts con nombres legibles + row_id.
     """
-    all_tanques = await list_tanques()
-    return [t for t in all_tanques if t.get("serie") and not t.get("fabricante")]
+    table = await table_cache.get_tanque_table()
+    mask = tanque_table.filled_mask(table, ("serie",), empty=("fabricante",))
+    return tanque_table.records(table, tanque_table.positions(mask))
 
 
 async def get_documentos_by_tanque(tanque_row_id: str) -> list[dict]:
@@ -172,10 +181,24 @@ async def get_documentos_by_tanque(tanque_row_id: str) -> list[dict]:
     Returns:
         Lista de dicts con pdf_urls y row_id.
     """
-    col_fk = DOCUMENTO_COLUMNS["tanque_row_id"]
-    rows = await query_table(TABLE_DOCUMENTOS)
-    filtered = [row for row in rows if row.get(col_fk) == tanque_row_id]
-    return [from_glide_columns(row, _DOCUMENTO_COLUMNS_INV) for row in filtered]
+    rows = await table_cache.find_group(TABLE_DOCUMENTOS, DOCUMENTO_COLUMNS["tanque_row_id"], tanque_row_id)
+    return [from_glide_columns(row, _DOCUMENTO_COLUMNS_INV) for row in rows]
+
+
+async def get_documentos_by_tanques(tanque_row_ids: list[str]) -> dict[str, list[dict]]:
+    """Obtiene los documentos de varios tanques.
+
+    Optimizado para batch: un solo snapshot de documentos (una query aun con
+    el cache desactivado) consultado por el indice de tanque_row_id, retorna
+    dict {tanque_row_id: [documentos]}.
+    """
+    groups = await table_cache.find_groups(
+        TABLE_DOCUMENTOS, DOCUMENTO_COLUMNS["tanque_row_id"], tanque_row_ids,
+    )
+    return {
+        row_id: [from_glide_columns(row, _DOCUMENTO_COLUMNS_INV) for row in rows]
+        for row_id, rows in groups.items()
+    }
 
 
 async def get_all_documentos() -> list[dict]:
@@ -184,5 +207,5 @@ async def get_all_documentos() -> list[dict]:
     Returns:
         Lista de dicts con tanque_row_id, pdf_urls, row_id.
     """
-    rows = await query_table(TABLE_DOCUMENTOS)
+    rows = await table_cache.get_rows(TABLE_DOCUMENTOS)
     return [from_glide_columns(row, _DOCUMENTO_COLUMNS_INV) for row in rows]
@@ -0,0 +1,253 @@
+"""
+Snapshots en memoria de las tablas de Glide, con indices por columna.
+- Finalidad: Las native tables de Glide no tienen filtros: cada busqueda descargaba
+  la tabla completa (paginada) y la recorria. Este modulo guarda una copia de los
+  rows de TABLE_TANQUES y TABLE_DOCUMENTOS con TTL (GLIDE_TABLE_CACHE_TTL_SECONDS)
+  compartida por todos los requests, junto con indices dict construidos una vez por
+  snapshot: unicos ($rowID y serie de tanques → row) y de grupo (tanque_row_id de
+  documentos → [rows]). Las busquedas por esas columnas son O(1).
+  Refresco single-flight: si varios requests encuentran el snapshot vencido,
+  esperan la misma descarga. Write-through: create/update de repository.py se
+  aplican al snapshot (y a sus indices) apenas Glide confirma la mutacion, y se
+  vuelven a aplicar sobre el snapshot que traiga un refresco en curso (Glide puede
+  devolver la tabla sin la mutacion recien hecha).
+  Con el mirror SQLite activo (mirror.py) los rows se cargan del mirror en vez de
+  Glide y el snapshot se recarga cuando un sync del mirror cambia la tabla, sin TTL.
+  El snapshot de tanques ademas guarda su version columnar (tanque_table.py),
+  construida al primer get_tanque_table y actualizada con cada escritura.
+- Consume: config.py (GLIDE_TABLE_CACHE_TTL_SECONDS),
+  glide/client.py (query_table, TABLE_*, *_COLUMNS), glide/mirror.py (ready, version, read_rows),
+  glide/tanque_table.py (build, apply)
+- Consumido por: glide/repository.py (get_rows, get_tanque_table, find, find_group, find_groups,
+  apply_write),
+  extraction/router.py (/cache/stats)
+"""
+
+import asyncio
+import logging
+import time
+
+from app.config import get_settings
+from app.features.glide import mirror, tanque_table
+from app.features.glide.client import (
+    DOCUMENTO_COLUMNS,
+    TABLE_DOCUMENTOS,
+    TABLE_TANQUES,
+    TANQUE_COLUMNS,
+    query_table,
+)
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# POR QUE: Glide puede tardar unos segundos en reflejar una mutacion en
+# queryTables; las escrituras de esta ventana se re-aplican tras cada refresco.
+WRITE_REPLAY_SECONDS = 60
+
+# Columnas indexadas por tabla (column codes de Glide).
+# unique: valor → primer row con ese valor (igual que el recorrido lineal anterior).
+# group: valor → lista de rows, en el orden de la tabla.
+_INDEXES = {
+    TABLE_TANQUES: {"unique": ("$rowID", TANQUE_COLUMNS["serie"]), "group": ()},
+    TABLE_DOCUMENTOS: {"unique": ("$rowID",), "group": (DOCUMENTO_COLUMNS["tanque_row_id"],)},
+}
+_NAMES = {TABLE_TANQUES: "tanques", TABLE_DOCUMENTOS: "documentos"}
+
+
+def _new_state() -> dict:
+    return {
+        # {"rows", "unique", "group", "source", "columnar"}, reemplazado entero en
+        # cada refresco. source: ("mirror", version) o ("glide", None);
+        # columnar: tanque_table (solo tanques, None hasta el primer uso)
+        "snapshot": None,
+        "loaded_at": 0.0,
+        "refresh_task": None,
+        # (monotonic, rowID, columnValues) de las escrituras recientes propias
+        "recent_writes": [],
+        "stats": {"hits": 0, "refreshes": 0, "joined_refreshes": 0, "refresh_errors": 0, "writes": 0},
+    }
+
+
+_state: dict[str, dict] = {table: _new_state() for table in _INDEXES}
+
+
+def _enabled() -> bool:
+    return settings.GLIDE_TABLE_CACHE_TTL_SECONDS > 0 or mirror.enabled()
+
+
+def _fresh(table: str, snapshot: dict | None, loaded_at: float) -> bool:
+    if snapshot is None:
+        return False
+    if mirror.ready(table):
+        return snapshot["source"] == ("mirror", mirror.version(table))
+    return time.monotonic() - loaded_at < settings.GLIDE_TABLE_CACHE_TTL_SECONDS
+
+
+def _build(table: str, rows: list[dict], source: tuple = ("glide", None)) -> dict:
+    """Snapshot con los indices de la tabla construidos en una pasada."""
+    spec = _INDEXES[table]
+    unique = {col: {} for col in spec["unique"]}
+    group = {col: {} for col in spec["group"]}
+    for row in rows:
+        _index_row(unique, group, row)
+    return {"rows": rows, "unique": unique, "group": group, "source": source, "columnar": None}
+
+
+def _index_row(unique: dict, group: dict, row: dict) -> None:
+    for col, index in unique.items():
+        value = row.get(col)
+        if value is not None:
+            index.setdefault(value, row)
+    for col, index in group.items():
+        value = row.get(col)
+        if value is not None:
+            index.setdefault(value, []).append(row)
+
+
+def _apply(snapshot: dict, row_id: str, glide_data: dict) -> None:
+    """Aplica columnValues a la fila row_id (la agrega si no existe) manteniendo los indices."""
+    unique, group = snapshot["unique"], snapshot["group"]
+    if snapshot["columnar"] is not None:
+        tanque_table.apply(snapshot["columnar"], row_id, glide_data)
+    row = unique["$rowID"].get(row_id)
+    if row is None:
+        row = {"$rowID": row_id, **glide_data}
+        snapshot["rows"].append(row)
+        _index_row(unique, group, row)
+        return
+
+    for col, index in unique.items():
+        if col in glide_data and glide_data[col] != row.get(col):
+            if index.get(row.get(col)) is row:
+                del index[row[col]]
+            if glide_data[col] is not None:
+                index.setdefault(glide_data[col], row)
+    for col, index in group.items():
+        if col in glide_data and glide_data[col] != row.get(col):
+            members = index.get(row.get(col))
+            if members is not None:
+                members.remove(row)
+                if not members:
+                    del index[row[col]]
+            if glide_data[col] is not None:
+                index.setdefault(glide_data[col], []).append(row)
+    row.update(glide_data)
+
+
+async def _refresh(table: str) -> dict:
+    state = _state[table]
+    started = time.monotonic()
+    try:
+        if mirror.ready(table):
+            source = ("mirror", mirror.version(table))
+            rows = await mirror.read_rows(table)
+        else:
+            source = ("glide", None)
+            rows = await query_table(table)
+    except Exception:
+        state["stats"]["refresh_errors"] += 1
+        raise
+    snapshot = _build(table, rows, source)
+    # Escrituras hechas durante la descarga o poco antes: la respuesta de Glide
+    # puede no incluirlas todavia. Re-aplicar es idempotente.
+    cutoff = started - WRITE_REPLAY_SECONDS
+    state["recent_writes"][:] = [w for w in state["recent_writes"] if w[0] >= cutoff]
+    for _, row_id, glide_data in state["recent_writes"]:
+        _apply(snapshot, row_id, glide_data)
+    state["snapshot"] = snapshot
+    state["loaded_at"] = time.monotonic()
+    state["stats"]["refreshes"] += 1
+    logger.info(
+        "Snapshot de %s actualizado desde %s: %d rows en %.2fs",
+        _NAMES[table], source[0], len(rows), state["loaded_at"] - started,
+    )
+    return snapshot
+
+
+async def _get_snapshot(table: str) -> dict:
+    state = _state[table]
+    if not _enabled():
+        # Sin cache: descarga en cada lectura; los indices igual evitan recorridos repetidos
+        return _build(table, await query_table(table))
+
+    snapshot = state["snapshot"]
+    if _fresh(table, snapshot, state["loaded_at"]):
+        state["stats"]["hits"] += 1
+        return snapshot
+
+    task = state["refresh_task"]
+    if task is None or task.done():
+        task = state["refresh_task"] = asyncio.create_task(_refresh(table))
+    else:
+        state["stats"]["joined_refreshes"] += 1
+    # POR QUE: shield para que un request cancelado (cliente desconectado) no
+    # cancele la descarga que estan esperando los demas.
+    return await asyncio.shield(task)
+
+
+async def get_rows(table: str) -> list[dict]:
+    """Rows de la tabla (column codes de Glide), desde el snapshot si esta vigente.
+
+    Los rows son compartidos: no modificarlos (repository.py los convierte con
+    from_glide_columns, que crea dicts nuevos).
+    """
+    return (await _get_snapshot(table))["rows"]
+
+
+async def get_tanque_table() -> dict:
+    """Tabla de tanques en formato columnar (tanque_table.py). Mismas reglas que get_rows."""
+    snapshot = await _get_snapshot(TABLE_TANQUES)
+    if snapshot["columnar"] is None:
+        snapshot["columnar"] = tanque_table.build(snapshot["rows"])
+    return snapshot["columnar"]
+
+
+async def find(table: str, column: str, value) -> dict | None:
+    """Primer row con column == value, via indice unico. Mismas reglas que get_rows."""
+    return (await _get_snapshot(table))["unique"][column].get(value)
+
+
+async def find_group(table: str, column: str, value) -> list[dict]:
+    """Rows con column == value, via indice de grupo. Mismas reglas que get_rows."""
+    return list((await _get_snapshot(table))["group"][column].get(value, ()))
+
+
+async def find_groups(table: str, column: str, values: list) -> dict:
+    """find_group para varios valores sobre un mismo snapshot: {valor: [rows]}."""
+    index = (await _get_snapshot(table))["group"][column]
+    return {value: list(index.get(value, ())) for value in values}
+
+
+def apply_write(table: str, row_id: str, glide_data: dict) -> None:
+    """Aplica al snapshot columnas recien escritas en Glide (write-through).
+
+    Sirve para add-row (row_id nuevo) y set-columns (row existente).
+    """
+    if not _enabled():
+        return
+    state = _state[table]
+    state["stats"]["writes"] += 1
+    state["recent_writes"].append((time.monotonic(), row_id, dict(glide_data)))
+    if state["snapshot"] is not None:
+        _apply(state["snapshot"], row_id, glide_data)
+
+
+def snapshot_stats() -> dict:
+    """Estado de cada snapshot: filas, claves indexadas, edad y contadores desde el arranque."""
+    now = time.monotonic()
+    result = {}
+    for table, state in _state.items():
+        snapshot = state["snapshot"]
+        result[_NAMES[table]] = {
+            "enabled": _enabled(),
+            "ttl_seconds": settings.GLIDE_TABLE_CACHE_TTL_SECONDS,
+            "source": snapshot["source"][0] if snapshot is not None else None,
+            "rows": len(snapshot["rows"]) if snapshot is not None else None,
+            "indexed_keys": {
+                col: len(index)
+                for col, index in (snapshot["unique"] | snapshot["group"]).items()
+            } if snapshot is not None else None,
+            "age_seconds": round(now - state["loaded_at"], 1) if snapshot is not None else None,
+            **state["stats"],
+        }
+    return result
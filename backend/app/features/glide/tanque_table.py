@@ -0,0 +1,111 @@
+"""
+Representacion columnar de la tabla de tanques.
+- Finalidad: list_tanques, /tanques/pendientes y el early skip del batch
+  convertian cada row del snapshot en un dict nuevo (from_glide_columns) en cada
+  request, aunque despues se descartara la mayoria. Aqui la tabla se guarda una
+  vez por snapshot como una lista por columna (nombres legibles, strings
+  internados: fabricantes y materiales se repiten) mas un bitmap por columna
+  (int de Python, bit i = row i con valor no vacio). Los filtros se evaluan con
+  operaciones de bits sobre toda la tabla y solo se arman dicts para los rows
+  que pasan. Los dicts resultantes son identicos a los de from_glide_columns.
+  table_cache.py la construye al primer uso y la actualiza en cada escritura.
+- Consume: glide/client.py (_TANQUE_COLUMNS_INV)
+- Consumido por: glide/table_cache.py (build, apply), glide/repository.py (filled_mask, positions, records)
+"""
+
+import sys
+
+from app.features.glide.client import _TANQUE_COLUMNS_INV
+
+# Marca de columna ausente en el row (from_glide_columns no incluye la clave)
+_ABSENT = object()
+
+_CODES = {"$rowID": "row_id", **_TANQUE_COLUMNS_INV}
+
+
+def _convert(value):
+    """Mismo valor que deja from_glide_columns, con strings internados."""
+    if value is None or isinstance(value, (list, dict)):
+        return value
+    return sys.intern(str(value))
+
+
+def build(rows: list[dict]) -> dict:
+    """Tabla columnar desde rows de Glide (column codes)."""
+    columns = {name: [] for name in _CODES.values()}
+    flags = {name: [] for name in _CODES.values()}
+    for row in rows:
+        for code, name in _CODES.items():
+            if code in row:
+                value = _convert(row[code])
+                flags[name].append("1" if value else "0")
+            else:
+                value = _ABSENT
+                flags[name].append("0")
+            columns[name].append(value)
+    # Bitmaps armados de una vez desde el string de bits (bit 0 = primer row);
+    # hacer |= por row copiaria el int entero en cada paso.
+    filled = {name: int("".join(reversed(bits)) or "0", 2) for name, bits in flags.items()}
+    return {
+        "size": len(rows),
+        "columns": columns,
+        "filled": filled,
+        "pos": {row_id: i for i, row_id in enumerate(columns["row_id"]) if row_id is not _ABSENT},
+    }
+
+
+def apply(table: dict, row_id: str, glide_data: dict) -> None:
+    """Aplica columnValues (column codes) al row row_id; lo agrega si no existe."""
+    i = table["pos"].get(row_id)
+    if i is None:
+        i = table["pos"][row_id] = table["size"]
+        table["size"] += 1
+        for name, column in table["columns"].items():
+            column.append(_ABSENT)
+        table["columns"]["row_id"][i] = row_id
+        table["filled"]["row_id"] |= 1 << i
+    bit = 1 << i
+    for code, value in glide_data.items():
+        name = _CODES.get(code)
+        if name is None:
+            continue
+        value = _convert(value)
+        table["columns"][name][i] = value
+        if value:
+            table["filled"][name] |= bit
+        else:
+            table["filled"][name] &= ~bit
+
+
+def filled_mask(table: dict, fields: list[str] | tuple[str, ...], empty: tuple[str, ...] = ()) -> int:
+    """Bitmap de rows con todos los fields con valor y todos los empty vacios."""
+    mask = (1 << table["size"]) - 1
+    for name in fields:
+        mask &= table["filled"][name]
+    for name in empty:
+        mask &= ~table["filled"][name]
+    return mask
+
+
+def positions(mask: int) -> list[int]:
+    """Indices de los bits en 1 del bitmap, en orden de la tabla."""
+    # POR QUE: bin() recorre el int una sola vez; extraer bit a bit con
+    # mask & -mask seria O(n) por cada row encontrado.
+    bits = bin(mask)[:1:-1]
+    return [i for i, bit in enumerate(bits) if bit == "1"]
+
+
+def records(table: dict, rows: list[int] | None = None) -> list[dict]:
+    """Dicts con nombres legibles (como from_glide_columns) de los rows indicados, o de todos."""
+    columns = list(table["columns"].items())
+    if rows is None:
+        rows = range(table["size"])
+    result = []
+    for i in rows:
+        record = {}
+        for name, column in columns:
+            value = column[i]
+            if value is not _ABSENT:
+                record[name] = value
+        result.append(record)
+    return result
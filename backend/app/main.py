@@ -2,7 +2,12 @@
 Punto de entrada de la aplicacion FastAPI (API-only, sin frontend).
 - Finalidad: Configura app, registra routers, maneja lifecycle.
   GET / redirige a /docs. GET /health (sin prefijo, sin auth) para monitoreo externo.
-- Consume: config.py (settings), features/extraction/router.py (endpoints API)
+- Consume: config.py (settings), features/extraction/router.py (endpoints API),
+  features/extraction/pdf_workers.py (pool de procesos PDF),
+  features/extraction/openai_client.py (cliente OpenAI compartido),
+  features/glide/client.py (cliente HTTP Glide compartido),
+  features/glide/mirror.py (sync del mirror SQLite de Glide),
+  features/extraction/downloads.py (cliente de descargas compartido)
 - Consumido por: Dockerfile (uvicorn app.main:app), docker-compose
 """
 
@@ -16,7 +21,12 @@ from fastapi.responses import JSONResponse, RedirectResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from app.config import get_settings
+from app.features.extraction.downloads import close_download_client, start_download_client
+from app.features.extraction.openai_client import close_openai_client, start_openai_client
+from app.features.extraction.pdf_workers import shutdown_pdf_pool, start_pdf_pool
 from app.features.extraction.router import router as extraction_router
+from app.features.glide.client import close_glide_client, start_glide_client
+from app.features.glide.mirror import close_mirror, start_mirror
 
 logging.basicConfig(
     level=logging.INFO,
@@ -29,8 +39,18 @@ settings = get_settings()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("ASME Extractor v%s starting...", settings.APP_VERSION)
+    start_pdf_pool()
+    start_openai_client()
+    start_glide_client()
+    start_mirror()
+    start_download_client()
     yield
     logger.info("Shutting down")
+    await close_openai_client()
+    await close_mirror()
+    await close_glide_client()
+    await close_download_client()
+    shutdown_pdf_pool()
 
 
 app = FastAPI(
@@ -48,12 +48,14 @@ class ExtractUrlRequest(BaseModel):
     Con auto_save=True, extrae y guarda automaticamente en Glide (flujo Glide).
     Con auto_save=False (default), solo extrae (flujo frontend con revision humana).
     id_activo permite especificar la fila exacta a actualizar en Glide.
+    bypass_cache=True ignora el cache de resultados y fuerza una extraccion nueva.
     """
 
     pdf_url: str
     filename: str | None = None
     auto_save: bool = False
     id_activo: str | None = None
+    bypass_cache: bool = False
 
     @model_validator(mode="before")
     @classmethod
@@ -71,22 +73,24 @@ class BatchExtractRequest(BaseModel):
     - Simple: {"pdf_urls": ["url1", "url2"], "auto_save": true}
     - Avanzado: {"items": [{"pdf_url": "url1", "id_activo": "row-id"}], "auto_save": true}
 
-    auto_save a nivel de batch se aplica a todos los items (default true).
+    auto_save y bypass_cache a nivel de batch se aplican a los items que no los definan.
     Cada item puede tener su propio id_activo opcional.
     """
 
     items: list[ExtractUrlRequest] = []
     pdf_urls: list[str] = []
     auto_save: bool = True
+    bypass_cache: bool = False
 
     @model_validator(mode="before")
     @classmethod
     def _build_items(cls, data: dict) -> dict:
-        """Convierte pdf_urls a items y aplica auto_save global."""
+        """Convierte pdf_urls a items y aplica auto_save y bypass_cache globales."""
         if not isinstance(data, dict):
             return data
 
         batch_auto_save = data.get("auto_save", True)
+        batch_bypass_cache = data.get("bypass_cache", False)
 
         # Si mandan pdf_urls (formato simple), convertir a items
         if "pdf_urls" in data and data["pdf_urls"]:
@@ -96,11 +100,12 @@ class BatchExtractRequest(BaseModel):
             for url in urls:
                 data["items"].append({"pdf_url": url, "auto_save": batch_auto_save})
 
-        # Aplicar auto_save global a items que no lo tengan explícito
+        # Aplicar auto_save y bypass_cache globales a items que no los tengan explícitos
         if "items" in data:
             for item in data["items"]:
-                if isinstance(item, dict) and "auto_save" not in item:
-                    item["auto_save"] = batch_auto_save
+                if isinstance(item, dict):
+                    item.setdefault("auto_save", batch_auto_save)
+                    item.setdefault("bypass_cache", batch_bypass_cache)
 
         return data
 
@@ -131,6 +136,12 @@ class ExtractionResponse(BaseModel):
     fields_extracted: int = 0
     fields_null: list[str] = []
     retry_used: bool = False
+    image_tiles: list[int] = []
+    image_tokens_estimate: int = 0
+    cache_hit: bool = False
+    cached_at: str | None = None
+    # Tokens (prompt/completion/reasoning/cached) y costo estimado USD de las llamadas al LLM
+    llm_usage: dict | None = None
 
 
 class SaveRequest(BaseModel):
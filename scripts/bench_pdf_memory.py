@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria pico por extraccion: PDF en bytes vs PDF por ruta de archivo.
+- Finalidad: Para cada PDF ejecuta deteccion de tipo + seleccion de paginas + render
+  (el pipeline de service.py sin la llamada LLM) en un subproceso nuevo por modo, y
+  reporta el pico de RSS sobre la base del proceso ya importado. "bytes" reproduce el
+  flujo anterior (PDF completo en memoria, pdfplumber sobre BytesIO); "path" es el
+  flujo actual (pdfium y pdfplumber leen del archivo bajo demanda).
+- Consume: backend/app/features/extraction (pdf_session.py, validators.py,
+  pdf_to_images.py, service.py)
+- Uso:
+    python scripts/bench_pdf_memory.py certificado1.pdf certificado2.pdf
+    python scripts/bench_pdf_memory.py --text-backend pdfplumber ../info_recibida/*.pdf
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+MODES = ("bytes", "path")
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss esta en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _child(mode: str, pdf_path: str) -> None:
+    """Corre el pipeline sin LLM en este proceso e imprime JSON con las mediciones."""
+    logging.basicConfig(level=logging.ERROR)
+    from app.features.extraction.pdf_session import PdfDocumentSession
+    from app.features.extraction.pdf_to_images import pdf_pages_to_base64, roi_crop_enabled
+    from app.features.extraction.service import _get_pages_for_type1, _get_pages_for_type2
+    from app.features.extraction.validators import PDFTypeError, detect_pdf_type
+
+    base = _peak_rss_mb()
+    start = time.perf_counter()
+    source = Path(pdf_path).read_bytes() if mode == "bytes" else pdf_path
+    with PdfDocumentSession(source) as pdf:
+        try:
+            pdf_type = detect_pdf_type(pdf)
+        except PDFTypeError:
+            pdf_type = "TYPE_2"
+        if pdf_type == "TYPE_1":
+            pages = _get_pages_for_type1()
+        else:
+            pages, _ = _get_pages_for_type2(pdf)
+        images = pdf_pages_to_base64(pdf, pages, roi_crop_enabled(pdf_type))
+        pdf.sha256  # noqa: B018 — la clave de cache tambien se calcula por request
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "pdf_type": pdf_type,
+        "pages": len(images),
+        "seconds": elapsed,
+        "peak_delta_mb": _peak_rss_mb() - base,
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Memoria pico por extraccion: bytes vs ruta")
+    parser.add_argument("pdfs", nargs="*", type=Path, help="PDFs a medir")
+    parser.add_argument("--text-backend", choices=("pdfium", "pdfplumber"), help="Override de PDF_TEXT_BACKEND")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PDF"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(*args.child)
+        return
+    if not args.pdfs:
+        parser.error("se requiere al menos un PDF")
+
+    env = dict(os.environ, PDF_WORKER_PROCESSES="0")
+    if args.text_backend:
+        env["PDF_TEXT_BACKEND"] = args.text_backend
+
+    print(f"{'PDF':40} {'MB':>7} {'modo':6} {'pags':>5} {'seg':>7} {'pico MB':>9}")
+    totals = {m: 0.0 for m in MODES}
+    for path in args.pdfs:
+        size_mb = path.stat().st_size / 1024 / 1024
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", mode, str(path)],
+                env=env, capture_output=True, text=True, check=True,
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            totals[mode] += r["peak_delta_mb"]
+            print(
+                f"{path.name[:40]:40} {size_mb:7.1f} {mode:6} {r['pages']:5d} "
+                f"{r['seconds']:7.2f} {r['peak_delta_mb']:9.1f}"
+            )
+
+    n = len(args.pdfs)
+    print()
+    for mode in MODES:
+        print(f"{mode:6} pico promedio por extraccion: {totals[mode] / n:8.1f} MB")
+    if totals["path"] > 0:
+        print(f"reduccion path vs bytes: {(1 - totals['path'] / totals['bytes']) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark de backends de texto (pdfium vs pdfplumber) en la deteccion de paginas.
+- Finalidad: Mide el tiempo de detect_pdf_type + find_u1a_page + find_scanned_pages
+  con cada backend de validators.TEXT_BACKENDS sobre PDFs reales, y reporta
+  ms por pagina leida y speedup de pdfium vs pdfplumber.
+- Consume: backend/app/features/extraction (validators.py, pdf_session.py)
+- Uso:
+    python scripts/bench_text_backends.py certificado1.pdf certificado2.pdf
+    python scripts/bench_text_backends.py --repeat 5 ../info_recibida/*.pdf
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.features.extraction.pdf_session import PdfDocumentSession  # noqa: E402
+from app.features.extraction.validators import (  # noqa: E402
+    TEXT_BACKENDS,
+    PDFTypeError,
+    detect_pdf_type,
+    find_scanned_pages,
+    find_u1a_page,
+)
+
+
+def _run_detection(pdf_bytes: bytes, backend: str) -> tuple[float, int, str]:
+    """Ejecuta las 3 funciones de deteccion con una sesion nueva.
+
+    Returns:
+        Tupla (segundos, paginas_leidas, resumen_resultado).
+    """
+    start = time.perf_counter()
+    with PdfDocumentSession(pdf_bytes, text_backend=backend) as pdf:
+        try:
+            pdf_type = detect_pdf_type(pdf)
+        except PDFTypeError:
+            pdf_type = "UNKNOWN"
+        u1a = find_u1a_page(pdf)
+        scanned = find_scanned_pages(pdf)
+        pages_read = len(pdf.texts)
+    elapsed = time.perf_counter() - start
+    summary = f"{pdf_type} u1a={u1a + 1 if u1a is not None else None} scanned={[p + 1 for p in scanned]}"
+    return elapsed, pages_read, summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark pdfium vs pdfplumber en validators.py")
+    parser.add_argument("pdfs", nargs="+", type=Path, help="PDFs a medir")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por PDF y backend (default 3)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    backends = list(TEXT_BACKENDS)
+    totals = {b: [0.0, 0] for b in backends}
+
+    print(f"{'PDF':40} {'backend':11} {'pags':>5} {'ms total':>10} {'ms/pag':>8}  resultado")
+    for path in args.pdfs:
+        pdf_bytes = path.read_bytes()
+        for backend in backends:
+            best = None
+            for _ in range(args.repeat):
+                elapsed, pages_read, summary = _run_detection(pdf_bytes, backend)
+                best = elapsed if best is None else min(best, elapsed)
+            totals[backend][0] += best
+            totals[backend][1] += pages_read
+            per_page = best * 1000 / max(pages_read, 1)
+            print(f"{path.name[:40]:40} {backend:11} {pages_read:5d} {best * 1000:10.1f} {per_page:8.2f}  {summary}")
+
+    print()
+    for backend, (secs, pages) in totals.items():
+        print(f"{backend:11} {pages:5d} paginas  {secs * 1000:10.1f} ms  {secs * 1000 / max(pages, 1):8.2f} ms/pag")
+    if totals["pdfium"][0] > 0:
+        print(f"speedup pdfium vs pdfplumber: {totals['pdfplumber'][0] / totals['pdfium'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()